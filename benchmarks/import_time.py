@@ -0,0 +1,80 @@
+"""
+Import time benchmark
+---------------------
+Measures how long importing the wbem modules and starting the CLI take, each in a fresh interpreter, and lists the
+modules that cost the most. Python 3.7+ reports the time per module with -X importtime, older versions only report
+the total.
+
+Usage:
+    python benchmarks/import_time.py [-n RUNS] [--top N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+targets = [
+    ('import wbem', ['-c', 'import wbem']),
+    ('import wbem.cim', ['-c', 'import wbem.cim']),
+    ('import wbem.client', ['-c', 'import wbem.client']),
+    ('from wbem import WBEMClient', ['-c', 'from wbem import WBEMClient']),
+    ('first request objects', ['-c', 'from wbem.cim import Methods, Class; Methods.EnumerateInstances(Class("C", "ns"))']),
+    ('cli.py --help', [os.path.join(root, 'cli.py'), '--help']),
+]
+
+
+def run(args, importtime=False):
+    """
+    Runs the interpreter once
+    :param args: Arguments after the interpreter
+    :param importtime: Add -X importtime and return its report
+    :return: (wall time in seconds, dictionary of module name to (self, cumulative) microseconds)
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    started = time.time()
+    process = subprocess.Popen(command + args, cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, err = process.communicate()
+    elapsed = time.time() - started
+
+    modules = dict()
+    for line in err.decode('utf-8', 'replace').splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative))
+    return elapsed, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures import and startup time in fresh interpreters')
+    parser.add_argument('-n', '--runs', type=int, default=10, help='Runs per target')
+    parser.add_argument('--top', type=int, default=8, help='Number of most expensive modules to list per target')
+    args = parser.parse_args()
+
+    importtime = sys.version_info >= (3, 7)
+    baseline = sorted(run(['-c', 'pass'])[0] for _ in range(args.runs))[args.runs // 2]
+    # modules every interpreter imports at startup are left out of the lists
+    startup_modules = set(run(['-c', 'pass'], importtime=True)[1]) if importtime else set()
+    print('interpreter startup: %.1f ms (subtracted below)' % (baseline * 1000))
+
+    for name, target in targets:
+        times = sorted(run(target)[0] for _ in range(args.runs))
+        print('\n%-28s median: %6.1f ms  min: %6.1f ms' % (
+            name, (times[len(times) // 2] - baseline) * 1000, (times[0] - baseline) * 1000
+        ))
+
+        if importtime:
+            _, modules = run(target, importtime=True)
+            modules = [item for item in modules.items() if item[0] not in startup_modules]
+            heavy = sorted(modules, key=lambda item: item[1][0], reverse=True)[:args.top]
+            for module, (own, cumulative) in heavy:
+                print('    %-36s self: %6.1f ms  cumulative: %6.1f ms' % (module, own / 1000.0, cumulative / 1000.0))
+
+
+if __name__ == '__main__':
+    main()
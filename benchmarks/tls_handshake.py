@@ -0,0 +1,149 @@
+"""
+TLS handshake benchmark
+-----------------------
+Measures the cost of opening an HTTPS connection against a local TLS stand-in CIMOM in three ways:
+
+    new context:    a new SSLContext for every connection (the old HTTPSConnection behavior)
+    shared context: one SSLContext, but a full handshake for every connection
+    resumed:        one SSLContext and TLS session resumption (the WBEMClient default)
+
+Usage:
+    python benchmarks/tls_handshake.py [-n REQUESTS] [--certfile cert.pem --keyfile key.pem]
+
+Without --certfile a self-signed certificate for localhost is generated with the openssl command.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from six.moves import BaseHTTPServer, socketserver
+
+from wbem import client as wbem_client
+from wbem.cim import Class, Methods
+from wbem.client import WBEMClient, create_ssl_context
+
+RESPONSE = (
+    b'<?xml version="1.0" encoding="utf-8" ?><CIM CIMVERSION="2.0" DTDVERSION="2.0"><MESSAGE ID="1001" '
+    b'PROTOCOLVERSION="1.0"><SIMPLERSP><IMETHODRESPONSE NAME="EnumerateInstanceNames"><IRETURNVALUE>'
+    b'<INSTANCENAME CLASSNAME="CIM_ComputerSystem"><KEYBINDING NAME="Name"><KEYVALUE VALUETYPE="string">'
+    b'host1</KEYVALUE></KEYBINDING></INSTANCENAME></IRETURNVALUE></IMETHODRESPONSE></SIMPLERSP></MESSAGE></CIM>'
+)
+
+
+REQUEST = Methods.EnumerateInstanceNames(Class('CIM_ComputerSystem', 'root/cimv2'))
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml; charset="utf-8"')
+        self.send_header('Content-Length', str(len(RESPONSE)))
+        self.send_header('CIMOperation', 'MethodResponse')
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def generate_certificate(directory):
+    certfile = os.path.join(directory, 'cert.pem')
+    keyfile = os.path.join(directory, 'key.pem')
+    subprocess.check_call([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+        '-addext', 'subjectAltName=DNS:localhost', '-keyout', keyfile, '-out', certfile
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+def start_server(certfile, keyfile):
+    import ssl
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile, keyfile)
+
+    server = Server(('localhost', 0), Handler)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    t = threading.Thread(target=server.serve_forever)
+    t.daemon = True
+    t.start()
+    return server
+
+
+def run(name, requests, make_client, before_request=None):
+    """
+    Times connect() (context setup and TLS handshake) separately from the whole request
+    """
+    handshakes = []
+    totals = []
+    reused = 0
+    for _ in range(requests):
+        if before_request:
+            before_request()
+        start = time.time()
+        c = make_client()
+        connection = c.connect()
+        handshakes.append(time.time() - start)
+        c.send(connection, REQUEST)
+        totals.append(time.time() - start)
+        reused += bool(c.last_session_reused)
+
+    handshake = sum(handshakes) / requests
+    print('%-15s handshake: %6.2f ms  request: %6.2f ms  resumed: %s/%s' % (
+        name, handshake * 1000, sum(totals) / requests * 1000, reused, requests
+    ))
+    return handshake
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares TLS handshake costs against a local server')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='Requests per mode')
+    parser.add_argument('--certfile', help='Server certificate for localhost')
+    parser.add_argument('--keyfile', help='Server private key')
+    args = parser.parse_args()
+
+    directory = None
+    certfile, keyfile = args.certfile, args.keyfile
+    if not certfile:
+        directory = tempfile.mkdtemp()
+        certfile, keyfile = generate_certificate(directory)
+
+    server = start_server(certfile, keyfile)
+    port = server.server_address[1]
+    shared = create_ssl_context(cafile=certfile)
+
+    try:
+        before = run(
+            'new context', args.requests,
+            lambda: WBEMClient('localhost', port, https=True, ssl_context=create_ssl_context(cafile=certfile))
+        )
+        run(
+            'shared context', args.requests,
+            lambda: WBEMClient('localhost', port, https=True, ssl_context=shared),
+            before_request=wbem_client.tls_sessions.clear
+        )
+        after = run('resumed', args.requests, lambda: WBEMClient('localhost', port, https=True, ssl_context=shared))
+        print('handshake speedup: %.1fx' % (before / after))
+    finally:
+        server.shutdown()
+        server.server_close()
+        if directory:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -30,11 +30,17 @@ SOFTWARE.
 """
 import argparse
 import codecs
+import csv
+import datetime
+import json
 import os
 import sys
+import threading
+import time
 
-from wbem.cim import InvalidClass
-from wbem.client import WBEMClient
+from six.moves import queue
+
+# the wbem modules are imported where they are used, so --help and argument errors don't pay for them
 
 # make sure to get the file's current path, even when compiled
 try:
@@ -100,19 +106,483 @@ def compile_exe():
     sys.exit(0)
 
 
+def json_value(value):
+    """
+    Converts a property value to something JSON can encode
+    :param value: The value
+    :return: JSON compatible value
+    """
+    from wbem.cim import Instance
+
+    if isinstance(value, list):
+        return [json_value(v) for v in value]
+    if isinstance(value, tuple):
+        # (value, valuetype) keybindings
+        return json_value(value[0])
+    if isinstance(value, Instance):
+        return value.tostring()
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    return value
+
+
+class Output(object):
+    """
+    Writes results to a stream as JSON lines or CSV, one record per instance. Every record is written as soon as
+    its instance was parsed, so a large enumeration is never held as a list. Writes from many threads are
+    serialized line by line and flushed per target.
+
+    CSV output is in long form (address, method, instance, property, value), so targets with different
+    properties can share one stream without knowing the columns up front.
+    """
+
+    def __init__(self, stream, output_format='json'):
+        self.stream = stream
+        self.format = output_format
+        self.lock = threading.Lock()
+        self.writer = None
+        if output_format == 'csv':
+            self.writer = csv.writer(stream)
+            self.writer.writerow(['address', 'method', 'instance', 'property', 'value'])
+
+    def write(self, target, result=None, error=None):
+        """
+        Writes the result of one target
+        :param target: Dictionary with address, method and name
+        :param result: Response object or an iterable of Instance objects (see call_streaming())
+        :param error: Error message if the target failed
+        :return:
+        """
+        if self.format == 'csv':
+            lines = self.csv_rows(target, result, error)
+            write = self.writer.writerow
+        else:
+            lines = (json.dumps(record, sort_keys=True) + '\n' for record in self.records(target, result, error))
+            write = self.stream.write
+
+        try:
+            # the instances are parsed outside of the lock, other targets keep writing meanwhile
+            for line in lines:
+                with self.lock:
+                    write(line)
+        finally:
+            with self.lock:
+                self.stream.flush()
+
+    @staticmethod
+    def records(target, result, error):
+        base = dict(address=target['address'], method=target['method'])
+        if error is not None:
+            base.update(name=target['name'], error=error)
+            yield base
+            return
+
+        for instance in getattr(result, 'instances', result):
+            record = dict(base, instance=instance.tostring())
+            if instance.properties:
+                record['properties'] = dict((k, json_value(v)) for k, v in instance.properties.items())
+            yield record
+
+        properties = getattr(result, 'properties', None)
+        if properties:
+            yield dict(base, instance=target['name'], properties=dict(
+                (k, json_value(v)) for k, v in properties.items()
+            ))
+
+    @staticmethod
+    def csv_rows(target, result, error):
+        address, method = target['address'], target['method']
+        if error is not None:
+            yield [address, method, target['name'], 'error', error]
+            return
+
+        for instance in getattr(result, 'instances', result):
+            name = instance.tostring()
+            if not instance.properties:
+                yield [address, method, name, '', '']
+            for k, v in sorted(instance.properties.items()):
+                yield [address, method, name, k, json_value(v)]
+
+        for k, v in sorted((getattr(result, 'properties', None) or dict()).items()):
+            yield [address, method, target['name'], k, json_value(v)]
+
+
+def read_targets(stream, defaults):
+    """
+    Reads batch targets, one per line. Lines are either JSON objects with address, method, name (and optionally
+    username, password) or "address method name" separated by whitespace. Blank lines and lines starting with #
+    are skipped.
+    :param stream: File object
+    :param defaults: Dictionary of values for keys missing on a line (ex: username)
+    :return: generator of dictionaries
+    """
+    for line in stream:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        if line.startswith('{'):
+            target = json.loads(line)
+        else:
+            parts = line.split(None, 2)
+            if len(parts) != 3:
+                raise ValueError('Expected "address method name": %s' % line)
+            target = dict(zip(('address', 'method', 'name'), parts))
+
+        for k, v in defaults.items():
+            target.setdefault(k, v)
+        yield target
+
+
+class Clients(object):
+    """
+    One WBEMClient per address and credentials, shared by every target that uses them
+    """
+
+    def __init__(self):
+        self.clients = dict()
+        self.lock = threading.Lock()
+
+    def get(self, address, username=None, password=None):
+        from wbem.client import WBEMClient
+
+        key = (address, username, password)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is None:
+                connect_info = parse_uri(address)
+                connect_info['username'] = username
+                connect_info['password'] = password
+                client = self.clients[key] = WBEMClient(**connect_info)
+            return client
+
+
+def call(client, method, name):
+    """
+    Calls a WBEMClient method on a class or instance name
+    :param client: WBEMClient
+    :param method: Method name (EnumerateInstances, GetInstance, etc)
+    :param name: The class name or instance string
+    :return: Response
+    """
+    if not hasattr(client, method):
+        raise ValueError('%s is not a valid method' % method)
+
+    if method == 'GetInstance':
+        obj = client.Instance(name)
+    else:
+        obj = client.Class(name)
+
+    return getattr(client, method)(obj)
+
+
+def call_streaming(client, method, name):
+    """
+    Same as call(), but enumerations are parsed one instance at a time while they are being written. The parsing
+    happens as the generator is consumed, so the parse and total times of client.last_timings don't include it.
+    :param client: WBEMClient
+    :param method: Method name (EnumerateInstances, GetInstance, etc)
+    :param name: The class name or instance string
+    :return: generator of Instance objects for enumerations, otherwise a Response
+    """
+    from wbem.cim import Methods, iter_instances
+
+    if method not in ('EnumerateInstances', 'EnumerateInstanceNames'):
+        return call(client, method, name)
+
+    obj = client.Class(name)
+    return client.imethodcall(
+        method, obj, getattr(Methods, method)(obj),
+        parser=lambda body, namespace: iter_instances(body, namespace, limits=client.limits)
+    )
+
+
+def run_batch(targets, output, workers=8):
+    """
+    Runs targets concurrently on a pool of threads, writing each result as soon as it is available
+    :param targets: Iterable of target dictionaries
+    :param output: Output object
+    :param workers: Number of threads
+    :return: Number of failed targets
+    """
+    clients = Clients()
+    pending = queue.Queue(workers * 2)
+    failed = [0]
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            target = pending.get()
+            if target is None:
+                return
+
+            try:
+                client = clients.get(target['address'], target.get('username'), target.get('password'))
+                output.write(target, call_streaming(client, target['method'], target['name']))
+            except Exception as ex:
+                # report every failure as a result, a dead worker would stall the batch
+                with lock:
+                    failed[0] += 1
+                output.write(target, error='%s: %s' % (ex.__class__.__name__, ex))
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    # the bounded queue keeps a huge target list from being read into memory at once
+    for target in targets:
+        pending.put(target)
+    for _ in threads:
+        pending.put(None)
+    for t in threads:
+        t.join()
+
+    return failed[0]
+
+
+def watch(client, method, name, interval, count=None, counters=None, output_format='text', stream=None):
+    """
+    Repeats an operation every interval seconds on one client and prints what changed since the previous
+    iteration: per-instance rates of counter properties if counters are given, changed properties otherwise.
+    Every iteration reports its latency.
+    :param client: WBEMClient, ideally with keep_alive=True
+    :param method: Method name
+    :param name: The class name or instance string
+    :param interval: Seconds between the start of two iterations
+    :param count: Number of iterations, unlimited if None
+    :param counters: List of counter property names for rates ('*' for every integer property), requires the
+        EnumerateInstances method
+    :param output_format: text or json
+    :param stream: File object to write to, defaults to stdout
+    :return:
+    """
+    from wbem.changes import ChangeDetector
+    from wbem.rates import RateEngine
+
+    if counters and method != 'EnumerateInstances':
+        raise ValueError('Counter rates are computed from EnumerateInstances, not %s' % method)
+
+    stream = stream or sys.stdout
+    if counters:
+        engine = RateEngine(None if counters == ['*'] else counters)
+    else:
+        detector = ChangeDetector()
+
+    iteration = 0
+    next_run = time.time()
+    while count is None or iteration < count:
+        iteration += 1
+        started = time.time()
+        try:
+            if counters:
+                result = client.EnumerateInstanceColumns(client.Class(name), counters if counters != ['*'] else None)
+            else:
+                result = call(client, method, name)
+        except Exception as ex:
+            record = dict(iteration=iteration, latency=time.time() - started, error='%s: %s' % (
+                ex.__class__.__name__, ex
+            ))
+            lines = [] if output_format == 'json' else ['[%s] error after %.3fs: %s' % (
+                time.strftime('%H:%M:%S'), record['latency'], record['error']
+            )]
+        else:
+            latency = time.time() - started
+            if counters:
+                record, lines = watch_rates(engine.update(result), len(result))
+            else:
+                if not result.instances and result.properties:
+                    # GetInstance returns the properties of the instance that was asked for
+                    instance = client.Instance(name)
+                    instance.properties = result.properties
+                    instances = [instance]
+                else:
+                    instances = result.instances
+                record, lines = watch_changes(detector.update(instances), len(instances), iteration == 1)
+            record.update(iteration=iteration, latency=latency)
+            lines.insert(0, '[%s] %s instances in %.3fs' % (time.strftime('%H:%M:%S'), record['instances'], latency))
+
+        if output_format == 'json':
+            stream.write(json.dumps(record, sort_keys=True) + '\n')
+        else:
+            stream.write('\n'.join(lines) + '\n')
+        stream.flush()
+
+        next_run += interval
+        delay = next_run - time.time()
+        if delay > 0:
+            if count is None or iteration < count:
+                time.sleep(delay)
+        else:
+            # the operation took longer than the interval, start over from now instead of bursting
+            next_run = time.time()
+
+
+def watch_rates(rates, instances):
+    record = dict(instances=instances, rates=dict())
+    lines = []
+    for i, key in enumerate(rates.keys):
+        values = dict(
+            (name, column[i]) for name, column in rates.columns.items()
+            if not (name in rates.nulls and rates.nulls[name][i])
+        )
+        if values:
+            record['rates'][key] = values
+            lines.append('  %s: %s' % (key, ', '.join('%s=%.2f/s' % item for item in sorted(values.items()))))
+
+    if not record['rates']:
+        lines.append('  waiting for the next sample')
+    return record, lines
+
+
+def watch_changes(changes, instances, first):
+    record = dict(
+        instances=instances,
+        added=[i.tostring() for i in changes.added],
+        removed=[i.tostring() for i in changes.removed],
+        modified=dict(
+            (i.tostring(), dict((n, json_value(i.properties.get(n))) for n in names)) for i, names in changes.modified
+        ),
+    )
+
+    lines = []
+    if first:
+        return record, lines
+
+    lines.extend('  + %s' % i for i in record['added'])
+    lines.extend('  - %s' % i for i in record['removed'])
+    for key, values in sorted(record['modified'].items()):
+        lines.append('  ~ %s: %s' % (key, ', '.join('%s=%s' % item for item in sorted(values.items()))))
+    return record, lines
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile of a list of values (nearest rank)
+    :param values: Sorted list of numbers
+    :param p: Percentile, 0 to 100
+    :return: number
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))]
+
+
+def timings(client, method, name, runs, profile=None, stream=None):
+    """
+    Runs an operation several times and prints how long each phase took (request build, connect, send, server,
+    transfer and parse) with percentiles, the response size and instances per second
+    :param client: WBEMClient
+    :param method: Method name
+    :param name: The class name or instance string
+    :param runs: Number of runs
+    :param profile: Optional file name for a cProfile dump of the runs
+    :param stream: File object to write to, defaults to stdout
+    :return:
+    """
+    stream = stream or sys.stdout
+    phases = ('build', 'connect', 'send', 'server', 'transfer', 'parse', 'total')
+    samples = dict((phase, []) for phase in phases)
+    sizes = []
+    instances = 0
+
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    for _ in range(runs):
+        if profiler:
+            profiler.enable()
+        started = time.time()
+        result = call(client, method, name)
+        elapsed = time.time() - started
+        if profiler:
+            profiler.disable()
+
+        # the request XML is built before the client starts its clock, count it as build time
+        last_timings = dict(client.last_timings)
+        last_timings['build'] += max(0.0, elapsed - last_timings['total'])
+        last_timings['total'] = elapsed
+        for phase in phases:
+            samples[phase].append(last_timings[phase])
+        sizes.append(last_timings['bytes'])
+        instances += len(result.instances) or int(bool(result.properties))
+
+    stream.write('%s %s, %s runs\n' % (method, name, runs))
+    stream.write('%-10s %9s %9s %9s %9s %9s\n' % ('phase (ms)', 'mean', 'p50', 'p90', 'p99', 'max'))
+    for phase in phases:
+        values = sorted(samples[phase])
+        stream.write('%-10s %9.3f %9.3f %9.3f %9.3f %9.3f\n' % (
+            phase, sum(values) / runs * 1000, percentile(values, 50) * 1000, percentile(values, 90) * 1000,
+            percentile(values, 99) * 1000, values[-1] * 1000
+        ))
+
+    total = sum(samples['total'])
+    stream.write('response size: %.0f bytes (mean), %s instances per run, %.1f instances/s\n' % (
+        sum(sizes) / float(runs), instances // runs, instances / total if total else 0.0
+    ))
+
+    if profiler:
+        import pstats
+        profiler.dump_stats(profile)
+        stream.write('\ncProfile dump written to %s, top functions by own time:\n' % profile)
+        pstats.Stats(profiler, stream=stream).sort_stats('tottime').print_stats(15)
+
+
+def print_result(result):
+    if result.instances:
+        print('Instance names:')
+        for i in result.instances:
+            print('  %s' % i)
+            if i.properties:
+                print('  Properties:')
+                for k, v in sorted(i.properties.items()):
+                    print('    %s: %s' % (k, v))
+    elif result.properties:
+        print('Properties')
+        for k, v in sorted(result.properties.items()):
+            print('  %s: %s' % (k, v))
+    else:
+        print('No results')
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--username')
     parser.add_argument('--password')
     parser.add_argument('--pass64', help='The base64 encoded password, replaces the --password option')
-    parser.add_argument('--address', help='The URL to the device, including namespace', required=True)
-    parser.add_argument('--method', help='The name of the method to call (EnumerateInstances, GetInstance, etc)', required=True)
-    parser.add_argument('--name', help='The class name (i.e. CIM_ComputerSystem) or the instance name', required=True)
+    parser.add_argument('--address', help='The URL to the device, including namespace')
+    parser.add_argument('--method', help='The name of the method to call (EnumerateInstances, GetInstance, etc)')
+    parser.add_argument('--name', help='The class name (i.e. CIM_ComputerSystem) or the instance name')
+    parser.add_argument('--batch', metavar='FILE',
+                        help='Run the targets listed in FILE ("-" for stdin) concurrently, one "address method name" '
+                             'or JSON object per line')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent requests in batch mode')
+    parser.add_argument('--format', choices=['text', 'json', 'csv'],
+                        help='Output format (default: text, json in batch mode)')
+    parser.add_argument('--watch', type=float, metavar='INTERVAL',
+                        help='Repeat the operation every INTERVAL seconds on one connection and print the changes')
+    parser.add_argument('--count', type=int, help='Number of iterations for --watch (default: until interrupted)')
+    parser.add_argument('--counters',
+                        help='With --watch, print per-instance rates of these comma separated counter properties '
+                             '("*" for every integer property) instead of changed properties')
+    parser.add_argument('--timings', type=int, metavar='N',
+                        help='Run the operation N times and report the latency breakdown with percentiles')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='With --timings, write a cProfile dump of the runs to FILE (10 runs if --timings is not '
+                             'given)')
     if '__file__' in globals() and sys.platform == 'win32':
         parser.add_argument('-c', help='Compile to EXE with py2exe', dest='compile')
 
     argv = parser.parse_args()
-    if argv.compile:
+
+    from wbem.cim import InvalidClass
+    from wbem.client import WBEMClient
+
+    if getattr(argv, 'compile', None):
         compile_exe()
 
     if argv.pass64:
@@ -120,10 +590,36 @@ if __name__ == '__main__':
     else:
         password = argv.password
 
+    if argv.batch:
+        output_format = argv.format or 'json'
+        if output_format == 'text':
+            parser.error('--format text is not supported in batch mode')
+
+        defaults = dict(username=argv.username, password=password)
+        for k in ('address', 'method', 'name'):
+            if getattr(argv, k):
+                defaults[k] = getattr(argv, k)
+
+        output = Output(sys.stdout, output_format)
+        try:
+            if argv.batch == '-':
+                failed = run_batch(read_targets(sys.stdin, defaults), output, argv.workers)
+            else:
+                with open(argv.batch) as stream:
+                    failed = run_batch(read_targets(stream, defaults), output, argv.workers)
+        except ValueError as ex:
+            print(ex)
+            sys.exit(1)
+        sys.exit(4 if failed else 0)
+
+    if not (argv.address and argv.method and argv.name):
+        parser.error('--address, --method and --name are required without --batch')
+
     try:
         connect_info = parse_uri(argv.address)
         connect_info['username'] = argv.username
         connect_info['password'] = password
+        connect_info['keep_alive'] = bool(argv.watch)
 
         c = WBEMClient(**connect_info)
     except ValueError as ex:
@@ -134,28 +630,35 @@ if __name__ == '__main__':
         print('%s is not a valid method' % argv.method)
         sys.exit(2)
 
-    if argv.method == 'GetInstance':
-        obj = c.Instance(argv.name)
-    else:
-        obj = c.Class(argv.name)
+    if argv.watch:
+        if argv.format == 'csv':
+            parser.error('--format csv is not supported with --watch')
+        if argv.counters and argv.method != 'EnumerateInstances':
+            parser.error('--counters requires --method EnumerateInstances')
+        counters = argv.counters.split(',') if argv.counters else None
+        try:
+            watch(c, argv.method, argv.name, argv.watch, argv.count, counters, argv.format or 'text')
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    if argv.timings or argv.profile:
+        try:
+            timings(c, argv.method, argv.name, argv.timings or 10, argv.profile)
+        except InvalidClass as ex:
+            print(ex)
+            sys.exit(3)
+        sys.exit(0)
 
     try:
-        result = getattr(c, argv.method)(obj)
+        result = call(c, argv.method, argv.name)
     except InvalidClass as ex:
         print(ex)
         sys.exit(3)
 
-    if result.instances:
-        print('Instance names:')
-        for i in result.instances:
-            print('  %s' % i)
-            if i.properties:
-                print('  Properties:')
-                for k, v in sorted(i.properties.items()):
-                    print('    %s: %s' % (k, v))
-    elif result.properties:
-        print('Properties')
-        for k, v in sorted(result.properties.items()):
-            print('  %s: %s' % (k, v))
+    if argv.format in ('json', 'csv'):
+        Output(sys.stdout, argv.format).write(
+            dict(address=argv.address, method=argv.method, name=argv.name), result
+        )
     else:
-        print('No results')
\ No newline at end of file
+        print_result(result)
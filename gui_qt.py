@@ -30,12 +30,13 @@ SOFTWARE.
 """
 import os
 import sys
+import time
 
 from gui_qt_mainwindow import Ui_MainWindow
-from PySide.QtCore import Slot
-from PySide.QtGui import QApplication, QMainWindow, QMessageBox, QTreeWidgetItem
-from wbem.cim import InvalidClass
-from wbem.client import WBEMClient
+from PySide.QtCore import QAbstractItemModel, QModelIndex, QThread, QTimer, Qt, Signal, Slot
+from PySide.QtGui import QApplication, QMainWindow, QMessageBox
+from wbem.cim import Methods, iter_instances
+from wbem.session import SessionManager
 
 # make sure to get the file's current path, even when compiled
 try:
@@ -98,16 +99,367 @@ def compile_exe():
     sys.exit(0)
 
 
+class QueryWorker(QThread):
+    """
+    Runs a WBEM operation off the UI thread. Results are emitted in batches of instances, which Qt queues to the
+    UI thread, so the window stays responsive while large enumerations run. Enumerations are parsed one instance
+    at a time, so batches arrive while the response is still being parsed.
+    """
+    streamed_operations = ('EnumerateInstances', 'EnumerateInstanceNames')
+    batch = Signal(object)
+    properties = Signal(object)
+    failed = Signal(str)
+    done = Signal()
+
+    def __init__(self, client, operation, obj, batch_size=500, parent=None):
+        super(QueryWorker, self).__init__(parent)
+        self.client = client
+        self.operation = operation
+        self.obj = obj
+        self.batch_size = batch_size
+        self.cancelled = False
+
+    def cancel(self):
+        # a request in flight can't be interrupted, but parsing stops at the next instance
+        self.cancelled = True
+
+    def run(self):
+        try:
+            if self.operation in self.streamed_operations:
+                self.stream()
+            else:
+                self.call()
+        except Exception as ex:
+            if not self.cancelled:
+                self.failed.emit(str(ex))
+            return
+
+        if not self.cancelled:
+            self.done.emit()
+
+    def call(self):
+        result = getattr(self.client, self.operation)(self.obj)
+        if result.instances:
+            for start in range(0, len(result.instances), self.batch_size):
+                if self.cancelled:
+                    return
+                self.emit_batch(result.instances[start:start + self.batch_size])
+        elif result.properties:
+            self.properties.emit(result.properties)
+
+    def stream(self):
+        client = self.client
+        instances = client.imethodcall(
+            self.operation, self.obj, getattr(Methods, self.operation)(self.obj),
+            parser=lambda body, namespace: iter_instances(body, namespace, client.lazy_properties, client.limits)
+        )
+
+        batch = []
+        for instance in instances:
+            if self.cancelled:
+                return
+            batch.append(instance)
+            if len(batch) >= self.batch_size:
+                self.emit_batch(batch)
+                batch = []
+        if batch:
+            self.emit_batch(batch)
+
+    def emit_batch(self, instances):
+        self.batch.emit(instances)
+        # let the UI thread take the batch before the next one is queued
+        self.yieldCurrentThread()
+
+
+class ResultRow(object):
+    """
+    One top-level row of the results: an instance, or a set of properties. The label and the property rows are
+    only built when the view first needs them.
+    """
+    __slots__ = ('item', 'properties', 'text', 'children', 'row')
+
+    def __init__(self, item=None, properties=None, text=None):
+        self.item = item
+        self.properties = properties
+        self.text = text
+        self.children = None
+        self.row = -1
+
+    @property
+    def label(self):
+        if self.text is None:
+            self.text = str(self.item)
+        return self.text
+
+    def matches(self, text):
+        """
+        Returns True if the label or one of the property names or values contains the text
+        :param text: Lowercase text
+        :return: bool
+        """
+        if text in self.label.lower():
+            return True
+        for k, v in (self.properties or dict()).items():
+            if text in k.lower() or text in str(v).lower():
+                return True
+        return False
+
+
+class ResultModel(QAbstractItemModel):
+    """
+    Tree model over the instances of a Response. Rows only hold a reference to their instance, labels are built
+    when a row is first displayed and property rows when it is first expanded, so adding 100k instances costs
+    about as much as the view has rows on screen. Instances can be added in batches while results arrive, and
+    sorting and filtering reorder the row list instead of widgets.
+
+    The view lays out every row it knows about whenever rows are inserted, so rows are handed to it fetch_size at
+    a time through canFetchMore()/fetchMore() as it scrolls to the end, instead of as soon as they arrive.
+    """
+    headers = ('Name', 'Value')
+    fetch_size = 1000
+
+    def __init__(self, parent=None):
+        super(ResultModel, self).__init__(parent)
+        # every row in arrival order, and the rows that pass the filter in display order
+        self.records = []
+        self.rows = []
+        # number of rows the view has fetched
+        self.exposed = 0
+        # views may ask for more rows while they handle a change, which must not start another one
+        self.busy = False
+        self.sort_order = None
+        self.filter_text = ''
+        # internal pointer of top-level indexes, property rows point to their ResultRow
+        self.root = object()
+
+    def clear(self):
+        self.busy = True
+        self.beginResetModel()
+        self.records = []
+        self.rows = []
+        self.exposed = 0
+        self.endResetModel()
+        self.busy = False
+
+    def add_instances(self, instances):
+        self.add_records([ResultRow(i, i.properties) for i in instances])
+
+    def add_properties(self, properties, text='Properties'):
+        self.add_records([ResultRow(properties=properties, text=text)])
+
+    def add_records(self, records):
+        self.records.extend(records)
+        if self.filter_text:
+            records = [r for r in records if r.matches(self.filter_text)]
+        if not records:
+            return
+
+        for n, record in enumerate(records, len(self.rows)):
+            record.row = n
+        self.rows.extend(records)
+
+        if self.sort_order is not None:
+            self.relayout()
+        if self.exposed < self.fetch_size:
+            # fill the first screens right away, the rest waits for the view to scroll there
+            self.expose(min(len(self.rows), self.fetch_size) - self.exposed)
+
+    def expose(self, count):
+        """
+        Hands the next rows to the view
+        :param count: Number of rows
+        :return:
+        """
+        if count <= 0 or self.busy:
+            return
+        self.busy = True
+        self.beginInsertRows(QModelIndex(), self.exposed, self.exposed + count - 1)
+        self.exposed += count
+        self.endInsertRows()
+        self.busy = False
+
+    def set_filter(self, text):
+        """
+        Only shows the rows whose label or properties contain the text (case insensitive)
+        :param text: The text, or an empty string to show all rows
+        :return:
+        """
+        self.busy = True
+        self.beginResetModel()
+        self.filter_text = text.lower()
+        if self.filter_text:
+            self.rows = [r for r in self.records if r.matches(self.filter_text)]
+        else:
+            self.rows = list(self.records)
+        if self.sort_order is not None:
+            self.rows.sort(key=lambda r: r.label, reverse=self.sort_order == Qt.DescendingOrder)
+        for n, record in enumerate(self.rows):
+            record.row = n
+        self.exposed = min(len(self.rows), self.fetch_size)
+        self.endResetModel()
+        self.busy = False
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # column -1 restores the order the instances arrived in
+        self.sort_order = order if column >= 0 else None
+        self.relayout()
+
+    def relayout(self):
+        """
+        Reorders the rows for the current sort order, keeping the expanded rows and the selection
+        :return:
+        """
+        self.busy = True
+        self.layoutAboutToBeChanged.emit()
+        old_rows = list(self.rows)
+        if self.sort_order is None:
+            order = dict((id(r), n) for n, r in enumerate(self.records))
+            self.rows.sort(key=lambda r: order[id(r)])
+        else:
+            self.rows.sort(key=lambda r: r.label, reverse=self.sort_order == Qt.DescendingOrder)
+        for n, record in enumerate(self.rows):
+            record.row = n
+
+        # child indexes point to their parent row object, so only top-level indexes move
+        for index in self.persistentIndexList():
+            if index.internalPointer() is self.root:
+                row = old_rows[index.row()].row
+                if row < self.exposed:
+                    self.changePersistentIndex(index, self.createIndex(row, index.column(), self.root))
+                else:
+                    self.changePersistentIndex(index, QModelIndex())
+            elif index.internalPointer().row >= self.exposed:
+                self.changePersistentIndex(index, QModelIndex())
+        self.layoutChanged.emit()
+        self.busy = False
+
+    def record(self, index):
+        """
+        Returns the ResultRow of a top-level index, or None for property rows
+        :param index: QModelIndex
+        :return: ResultRow
+        """
+        if index.isValid() and index.internalPointer() is self.root:
+            return self.rows[index.row()]
+        return None
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if parent.isValid():
+            return self.createIndex(row, column, self.rows[parent.row()])
+        return self.createIndex(row, column, self.root)
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+
+        record = index.internalPointer()
+        if record is self.root:
+            return QModelIndex()
+        return self.createIndex(record.row, 0, self.root)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return self.exposed
+        if parent.column() > 0:
+            return 0
+
+        record = self.record(parent)
+        if record is None or record.children is None:
+            return 0
+        return len(record.children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.headers)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return bool(self.rows)
+
+        record = self.record(parent)
+        return record is not None and parent.column() == 0 and bool(record.properties)
+
+    def canFetchMore(self, parent):
+        if not parent.isValid():
+            return self.exposed < len(self.rows)
+
+        record = self.record(parent)
+        return record is not None and record.children is None and bool(record.properties)
+
+    def fetchMore(self, parent):
+        if not parent.isValid():
+            self.expose(min(self.fetch_size, len(self.rows) - self.exposed))
+            return
+
+        record = self.record(parent)
+        if record is None or record.children is not None:
+            return
+
+        if self.busy:
+            return
+
+        children = [(k, str(v)) for k, v in sorted(record.properties.items())]
+        self.busy = True
+        self.beginInsertRows(parent, 0, len(children) - 1)
+        record.children = children
+        self.endInsertRows()
+        self.busy = False
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+
+        record = index.internalPointer()
+        if record is self.root:
+            return self.rows[index.row()].label if index.column() == 0 else None
+        return record.children[index.row()][index.column()]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+
 class MainWindow(QMainWindow):
+    # emitted from the prefetch thread, Qt queues it to the UI thread
+    classnames_ready = Signal(object)
+
     def __init__(self, parent=None):
         super(MainWindow, self).__init__(parent)
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.ui.txt_address.setFocus()
+        self.worker = None
+        # cancelled workers are kept until their thread ends, Qt aborts if a running QThread is deleted
+        self.workers = set()
+        self.received = 0
+        self.started = None
+        # warm clients per URI and credentials, and the one in use
+        self.sessions = SessionManager()
+        self.session = None
+
+        self.model = ResultModel(self)
+        self.ui.tree_results.setModel(self.model)
+        # start out in arrival order, sorting every batch as it arrives only happens once the user asks for it
+        self.ui.tree_results.header().setSortIndicator(-1, Qt.AscendingOrder)
+        self.ui.tree_results.setSortingEnabled(True)
+
+        # filter once typing pauses, not on every key
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
 
         # setup event handlers
         self.ui.btn_execute.clicked.connect(self.btn_execute_clicked)
-        self.ui.tree_results.itemDoubleClicked.connect(self.tree_results_itemDoubleClicked)
+        self.ui.btn_cancel.clicked.connect(self.btn_cancel_clicked)
+        # connect and fetch the class names once the connection details are complete, warming on every edit of
+        # the address or the user name would log in with half-entered credentials
+        self.ui.txt_password.editingFinished.connect(self.warm_session)
+        self.classnames_ready.connect(self.fill_classnames)
+        self.ui.tree_results.doubleClicked.connect(self.tree_results_doubleClicked)
+        self.ui.txt_filter.textChanged.connect(self.filter_timer.start)
+        self.filter_timer.timeout.connect(self.filter_results)
 
     def btn_execute_clicked(self):
         try:
@@ -115,47 +467,137 @@ class MainWindow(QMainWindow):
         except ValueError as ex:
             QMessageBox.critical(self, 'Execution Error', str(ex))
 
-    def execute_query(self):
-        class_or_instance = self.ui.cbo_class_or_instance.currentText()
-        if not class_or_instance:
-            raise ValueError('Requires class or instance name')
+    def btn_cancel_clicked(self):
+        if self.worker is None:
+            return
+
+        self.worker.cancel()
+        self.finish('Cancelled after %s instances' % self.received)
+
+    def warm_session(self):
+        if bool(self.ui.txt_username.text()) != bool(self.ui.txt_password.text()):
+            # a user name without a password (or the other way around) is still being entered
+            return
+
+        try:
+            self.get_session()
+        except ValueError:
+            # not a complete URI yet
+            pass
 
+    def get_session(self):
+        """
+        Returns the session for the connection details entered, which reuses the client of previous executions
+        unless the URI or the credentials changed
+        :return: Session
+        """
         connect_info = parse_uri(self.ui.txt_address.text())
         connect_info['username'] = self.ui.txt_username.text()
         connect_info['password'] = self.ui.txt_password.text()
 
-        c = WBEMClient(**connect_info)
+        session = self.sessions.get(**connect_info)
+        if session is not self.session:
+            self.session = session
+            session.on_classnames(self.classnames_ready.emit)
+        return session
+
+    @Slot(object)
+    def fill_classnames(self, session):
+        if session is not self.session or not session.classnames:
+            return
+
+        text = self.ui.cbo_class_or_instance.currentText()
+        self.ui.cbo_class_or_instance.clear()
+        self.ui.cbo_class_or_instance.addItems(session.classnames)
+        self.ui.cbo_class_or_instance.setEditText(text)
+
+    def execute_query(self):
+        class_or_instance = self.ui.cbo_class_or_instance.currentText()
+        if not class_or_instance:
+            raise ValueError('Requires class or instance name')
+
+        c = self.get_session().client
         operation = self.ui.cbo_operation.currentText()
         if operation == 'GetInstance':
             obj = c.Instance(class_or_instance)
         else:
             obj = c.Class(class_or_instance)
 
-        result = getattr(c, operation)(obj)
-        nodes = []
-        self.ui.tree_results.clear()
-        if result.instances:
-            for i in result.instances:
-                node = QTreeWidgetItem([str(i)])
-                if i.properties:
-                    for k, v in sorted(i.properties.items()):
-                        node.addChild(QTreeWidgetItem([k, str(v)]))
-                nodes.append(node)
-        elif result.properties:
-            node = QTreeWidgetItem(['Properties'])
-            for k, v in sorted(result.properties.items()):
-                node.addChild(QTreeWidgetItem([k, str(v)]))
-            nodes.append(node)
-        else:
-            nodes.append(QTreeWidgetItem(['No results']))
+        if self.worker is not None:
+            self.worker.cancel()
+
+        self.model.clear()
+        self.received = 0
+        self.started = time.time()
+        worker = self.worker = QueryWorker(c, operation, obj)
+        worker.batch.connect(self.worker_batch)
+        worker.properties.connect(self.worker_properties)
+        worker.failed.connect(self.worker_failed)
+        worker.done.connect(self.worker_done)
+        worker.finished.connect(self.worker_finished)
+        self.workers.add(worker)
+        worker.start()
 
-        self.ui.tree_results.addTopLevelItems(nodes)
+        self.ui.lbl_status.setText('Waiting for %s:%s...' % (c.hostname, c.port))
+        self.ui.btn_execute.setEnabled(False)
+        self.ui.btn_cancel.setEnabled(True)
+
+    def finish(self, status):
+        self.worker = None
+        self.ui.lbl_status.setText(status)
+        self.ui.btn_execute.setEnabled(True)
+        self.ui.btn_cancel.setEnabled(False)
+
+    @Slot(object)
+    def worker_batch(self, instances):
+        if self.sender() is not self.worker:
+            # cancelled, or replaced by a newer query
+            return
+
+        first = not self.received
+        self.received += len(instances)
+        self.model.add_instances(instances)
+        if first:
+            self.ui.tree_results.resizeColumnToContents(0)
+        self.ui.lbl_status.setText('Received %s instances...' % self.received)
+
+    @Slot(object)
+    def worker_properties(self, properties):
+        if self.sender() is not self.worker:
+            return
+
+        self.model.add_properties(properties)
         self.ui.tree_results.resizeColumnToContents(0)
 
-    @Slot(QTreeWidgetItem, int)
-    def tree_results_itemDoubleClicked(self, item, column):
-        text = item.text(0)
-        if text.startswith('$cn'):
+    @Slot(str)
+    def worker_failed(self, message):
+        if self.sender() is not self.worker:
+            return
+
+        self.finish('Failed')
+        QMessageBox.critical(self, 'Execution Error', message)
+
+    @Slot()
+    def worker_done(self):
+        if self.sender() is not self.worker:
+            return
+
+        if not self.model.records:
+            self.model.add_properties(None, 'No results')
+        self.finish('%s instances in %.2fs' % (self.received, time.time() - self.started))
+
+    @Slot()
+    def worker_finished(self):
+        self.workers.discard(self.sender())
+
+    @Slot()
+    def filter_results(self):
+        self.model.set_filter(self.ui.txt_filter.text())
+
+    @Slot(QModelIndex)
+    def tree_results_doubleClicked(self, index):
+        text = index.data()
+        if text and text.startswith('$cn'):
             QApplication.clipboard().setText(text)
 
 
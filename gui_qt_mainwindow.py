@@ -86,8 +86,16 @@ class Ui_MainWindow(object):
         self.verticalLayout.addLayout(self.gridLayout_4)
         self.horizontalLayout_4 = QtGui.QHBoxLayout()
         self.horizontalLayout_4.setObjectName("horizontalLayout_4")
+        self.lbl_status = QtGui.QLabel(self.centralwidget)
+        self.lbl_status.setText("")
+        self.lbl_status.setObjectName("lbl_status")
+        self.horizontalLayout_4.addWidget(self.lbl_status)
         spacerItem = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
         self.horizontalLayout_4.addItem(spacerItem)
+        self.btn_cancel = QtGui.QPushButton(self.centralwidget)
+        self.btn_cancel.setEnabled(False)
+        self.btn_cancel.setObjectName("btn_cancel")
+        self.horizontalLayout_4.addWidget(self.btn_cancel)
         self.btn_execute = QtGui.QPushButton(self.centralwidget)
         sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Fixed)
         sizePolicy.setHorizontalStretch(0)
@@ -100,7 +108,7 @@ class Ui_MainWindow(object):
         self.verticalLayout.addLayout(self.horizontalLayout_4)
         self.gridLayout_2 = QtGui.QGridLayout()
         self.gridLayout_2.setObjectName("gridLayout_2")
-        self.tree_results = QtGui.QTreeWidget(self.centralwidget)
+        self.tree_results = QtGui.QTreeView(self.centralwidget)
         self.tree_results.setUniformRowHeights(True)
         self.tree_results.setObjectName("tree_results")
         self.gridLayout_2.addWidget(self.tree_results, 5, 0, 1, 1)
@@ -109,6 +117,9 @@ class Ui_MainWindow(object):
         self.label_6 = QtGui.QLabel(self.centralwidget)
         self.label_6.setObjectName("label_6")
         self.horizontalLayout_2.addWidget(self.label_6)
+        self.txt_filter = QtGui.QLineEdit(self.centralwidget)
+        self.txt_filter.setObjectName("txt_filter")
+        self.horizontalLayout_2.addWidget(self.txt_filter)
         self.btn_collapse = QtGui.QPushButton(self.centralwidget)
         self.btn_collapse.setObjectName("btn_collapse")
         self.horizontalLayout_2.addWidget(self.btn_collapse)
@@ -146,9 +157,9 @@ class Ui_MainWindow(object):
         self.cbo_operation.setItemText(2, QtGui.QApplication.translate("MainWindow", "GetInstance", None, QtGui.QApplication.UnicodeUTF8))
         self.cbo_class_or_instance.setItemText(0, QtGui.QApplication.translate("MainWindow", "CIM_ComputerSystem", None, QtGui.QApplication.UnicodeUTF8))
         self.btn_execute.setText(QtGui.QApplication.translate("MainWindow", "            Execute            ", None, QtGui.QApplication.UnicodeUTF8))
-        self.tree_results.headerItem().setText(0, QtGui.QApplication.translate("MainWindow", "Name", None, QtGui.QApplication.UnicodeUTF8))
-        self.tree_results.headerItem().setText(1, QtGui.QApplication.translate("MainWindow", "Value", None, QtGui.QApplication.UnicodeUTF8))
+        self.btn_cancel.setText(QtGui.QApplication.translate("MainWindow", "Cancel", None, QtGui.QApplication.UnicodeUTF8))
         self.label_6.setText(QtGui.QApplication.translate("MainWindow", "Results (double-click an instance name to copy it to the clipboard)", None, QtGui.QApplication.UnicodeUTF8))
+        self.txt_filter.setPlaceholderText(QtGui.QApplication.translate("MainWindow", "Filter", None, QtGui.QApplication.UnicodeUTF8))
         self.btn_collapse.setText(QtGui.QApplication.translate("MainWindow", "Collapse All", None, QtGui.QApplication.UnicodeUTF8))
         self.btn_expand.setText(QtGui.QApplication.translate("MainWindow", "Expand All", None, QtGui.QApplication.UnicodeUTF8))
 
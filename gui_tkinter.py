@@ -30,17 +30,21 @@ SOFTWARE.
 """
 import os
 import sys
+import threading
+import time
 if sys.version[0] == '2':
     from Tkinter import *
     import tkMessageBox as messagebox
     import ttk
+    import Queue as queue
 else:
     from tkinter import *
     from tkinter import messagebox
     from tkinter import ttk
+    import queue
 
-from wbem.cim import InvalidClass
-from wbem.client import WBEMClient
+from wbem.cim import Methods, iter_instances
+from wbem.session import SessionManager
 
 
 # make sure to get the file's current path, even when compiled
@@ -50,7 +54,92 @@ except NameError:
     file_path = os.path.abspath(sys.argv[0])
 
 
+def matches(instance, text):
+    """
+    Returns True if the instance name or one of its property names or values contains the text
+    :param instance: Instance object
+    :param text: Lowercase text
+    :return: bool
+    """
+    if text in str(instance).lower():
+        return True
+    for k, v in instance.properties.items():
+        if text in k.lower() or text in str(v).lower():
+            return True
+    return False
+
+
+class QueryWorker(threading.Thread):
+    """
+    Runs a WBEM operation off the UI thread. Results are handed back through a queue in batches of instances, which
+    the UI thread picks up between events, so the window stays responsive while large enumerations run.
+    Enumerations are parsed one instance at a time, so batches arrive while the response is still being parsed.
+    """
+    streamed_operations = ('EnumerateInstances', 'EnumerateInstanceNames')
+
+    def __init__(self, client, operation, obj, batch_size=500):
+        super(QueryWorker, self).__init__()
+        self.daemon = True
+        self.client = client
+        self.operation = operation
+        self.obj = obj
+        self.batch_size = batch_size
+        self.results = queue.Queue()
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        # a request in flight can't be interrupted, but parsing stops at the next instance
+        self.cancelled.set()
+
+    def run(self):
+        try:
+            if self.operation in self.streamed_operations:
+                self.stream()
+            else:
+                self.call()
+        except Exception as ex:
+            self.results.put(('error', ex))
+            return
+
+        if not self.cancelled.is_set():
+            self.results.put(('done', None))
+
+    def call(self):
+        result = getattr(self.client, self.operation)(self.obj)
+        if result.instances:
+            for start in range(0, len(result.instances), self.batch_size):
+                if self.cancelled.is_set():
+                    return
+                self.results.put(('instances', result.instances[start:start + self.batch_size]))
+        elif result.properties:
+            self.results.put(('properties', result.properties))
+
+    def stream(self):
+        client = self.client
+        instances = client.imethodcall(
+            self.operation, self.obj, getattr(Methods, self.operation)(self.obj),
+            parser=lambda body, namespace: iter_instances(body, namespace, client.lazy_properties, client.limits)
+        )
+
+        batch = []
+        for instance in instances:
+            if self.cancelled.is_set():
+                return
+            batch.append(instance)
+            if len(batch) >= self.batch_size:
+                self.results.put(('instances', batch))
+                batch = []
+        if batch:
+            self.results.put(('instances', batch))
+
+
 class MainApplication(ttk.Frame, object):
+    # how often the UI thread checks for results, and how long it may spend on them before handling other events
+    poll_interval = 50
+    poll_budget = 0.05
+    # instances rendered at first, the rest are shown a page at a time with "Load more"
+    page_size = 1000
+
     @staticmethod
     def _pad_widgets(frame, padx=5, pady=5):
         for c in frame.winfo_children():
@@ -86,6 +175,19 @@ class MainApplication(ttk.Frame, object):
 
     def __init__(self, parent, *args, **kwargs):
         super(MainApplication, self).__init__(parent, *args, **kwargs)
+        self.worker = None
+        self.received = 0
+        self.started = None
+        # warm clients per URI and credentials, and the one in use
+        self.sessions = SessionManager()
+        self.session = None
+        # everything received, and the instances that match the search in the order they are shown
+        self.instances = []
+        self.view = self.instances
+        self.properties = None
+        self.search_text = ''
+        self.shown = 0
+        self.limit = self.page_size
 
         # set some global options
         parent.title('WBEM GUI')
@@ -120,6 +222,10 @@ class MainApplication(ttk.Frame, object):
         self.txt_username.grid(column=1, row=1, sticky=(E, W))
         self.txt_password.grid(column=2, row=1, sticky=(E, W))
 
+        # connect and fetch the class names once the connection details are complete, warming on every edit of
+        # the URI or the user name would log in with half-entered credentials
+        self.txt_password.bind('<FocusOut>', self.warm_session_evt)
+
         # configure grid
         self.frm_connect.columnconfigure(0, weight=3)
         self.frm_connect.columnconfigure(1, weight=1)
@@ -134,7 +240,12 @@ class MainApplication(ttk.Frame, object):
             self.frm_operations, state='readonly', textvariable=self.val_operation,
             values=('EnumerateInstances', 'EnumerateInstanceNames', 'GetInstance')
         )
-        self.txt_class_or_instance = ttk.Entry(self.frm_operations)
+        self.cbo_class_or_instance = ttk.Combobox(self.frm_operations)
+        self.val_status = StringVar(value='')
+        self.lbl_status = ttk.Label(self.frm_operations, textvariable=self.val_status)
+        self.btn_cancel = ttk.Button(
+            self.frm_operations, text='Cancel', command=self.btn_cancel_evt, state='disabled'
+        )
         self.btn_execute = ttk.Button(self.frm_operations, text='Execute', command=self.btn_execute_evt)
 
         # grid widgets
@@ -142,8 +253,12 @@ class MainApplication(ttk.Frame, object):
         ttk.Label(self.frm_operations, text='Operation').grid(column=0, row=0, sticky=W)
         ttk.Label(self.frm_operations, text='Class or instance').grid(column=0, row=2, sticky=W)
         self.cbo_operation.grid(column=0, row=1, sticky=W)
-        self.txt_class_or_instance.grid(column=0, row=3, sticky=(E, W))
-        self.btn_execute.grid(column=0, row=4, sticky=E)
+        self.cbo_class_or_instance.grid(column=0, row=3, sticky=(E, W))
+        self.lbl_status.grid(column=0, row=4, sticky=W)
+        self.btn_cancel.grid(column=1, row=4, sticky=E)
+        self.btn_execute.grid(column=2, row=4, sticky=E)
+        self.cbo_operation.grid_configure(columnspan=3)
+        self.cbo_class_or_instance.grid_configure(columnspan=3)
 
         # configure grid
         self.frm_operations.columnconfigure(0, weight=1)
@@ -152,16 +267,26 @@ class MainApplication(ttk.Frame, object):
     def _initialize_results_frame(self, row=2):
         # initialize widgets
         self.frm_results = ttk.Frame(self)
+        self.txt_search = ttk.Entry(self.frm_results)
+        self.txt_search.bind('<Return>', self.btn_search_evt)
+        self.btn_search = ttk.Button(self.frm_results, text='Search', command=self.btn_search_evt)
         self.txt_results = Text(self.frm_results)
         self.txt_results.insert(END, 'Waiting for execution...')
+        self.val_shown = StringVar(value='')
+        self.lbl_shown = ttk.Label(self.frm_results, textvariable=self.val_shown)
+        self.btn_more = ttk.Button(self.frm_results, text='Load more', command=self.btn_more_evt, state='disabled')
 
         # grid widgets
         self.frm_results.grid(column=0, row=row, sticky=(N, S, E, W))
-        self.txt_results.grid(column=0, row=0, sticky=(N, S, E, W))
+        self.txt_search.grid(column=0, row=0, sticky=(E, W))
+        self.btn_search.grid(column=1, row=0, sticky=E)
+        self.txt_results.grid(column=0, row=1, columnspan=2, sticky=(N, S, E, W))
+        self.lbl_shown.grid(column=0, row=2, sticky=W)
+        self.btn_more.grid(column=1, row=2, sticky=E)
 
         # configure grid
         self.frm_results.columnconfigure(0, weight=1)
-        self.frm_results.rowconfigure(0, weight=1)
+        self.frm_results.rowconfigure(1, weight=1)
         self._pad_widgets(self.frm_results)
 
     def btn_execute_evt(self, *args):
@@ -171,42 +296,176 @@ class MainApplication(ttk.Frame, object):
             messagebox.showerror(message=str(ex))
             raise
 
-    def execute_query(self):
-        class_or_instance = self.txt_class_or_instance.get()
-        if not class_or_instance:
-            raise ValueError('Requires class or instance name')
+    def btn_cancel_evt(self, *args):
+        if self.worker is None:
+            return
+
+        self.worker.cancel()
+        self._finish('Cancelled after %s instances' % self.received)
+
+    def warm_session_evt(self, *args):
+        if bool(self.txt_username.get()) != bool(self.txt_password.get()):
+            # a user name without a password (or the other way around) is still being entered
+            return
 
+        try:
+            self.get_session()
+        except ValueError:
+            # not a complete URI yet
+            pass
+
+    def get_session(self):
+        """
+        Returns the session for the connection details entered, which reuses the client of previous executions
+        unless the URI or the credentials changed
+        :return: Session
+        """
         connect_info = self.parse_uri(self.txt_uri.get())
         connect_info['username'] = self.txt_username.get() or None
         connect_info['password'] = self.txt_password.get() or None
 
-        c = WBEMClient(**connect_info)
+        session = self.sessions.get(**connect_info)
+        if session is not self.session:
+            self.session = session
+            self.cbo_class_or_instance.configure(values=())
+            self._poll_classnames(session)
+        return session
+
+    def _poll_classnames(self, session):
+        if session is not self.session:
+            return
+
+        if not session.ready.is_set():
+            self.after(self.poll_interval * 4, self._poll_classnames, session)
+        elif session.classnames:
+            self.cbo_class_or_instance.configure(values=session.classnames)
+
+    def btn_more_evt(self, *args):
+        self.limit += self.page_size
+        self.render()
+
+    def btn_search_evt(self, *args):
+        self.search_text = self.txt_search.get().strip().lower()
+        if self.search_text:
+            self.view = [i for i in self.instances if matches(i, self.search_text)]
+        else:
+            self.view = self.instances
+
+        self.txt_results.delete('1.0', END)
+        self.shown = 0
+        self.limit = self.page_size
+        if self.properties is not None:
+            self.show_properties(self.properties)
+        elif self.instances:
+            self.render()
+            if not self.view:
+                self.txt_results.insert(END, 'No matches')
+
+    def execute_query(self):
+        class_or_instance = self.cbo_class_or_instance.get()
+        if not class_or_instance:
+            raise ValueError('Requires class or instance name')
+
+        c = self.get_session().client
         operation = self.cbo_operation.get()
         if operation == 'GetInstance':
             obj = c.Instance(class_or_instance)
         else:
             obj = c.Class(class_or_instance)
 
-        try:
-            result = getattr(c, operation)(obj)
-        except InvalidClass as ex:
-            raise ValueError(str(ex))
+        if self.worker is not None:
+            self.worker.cancel()
 
         self.txt_results.delete('1.0', END)
-        if result.instances:
-            self.txt_results.insert(END, 'Instance names:\n')
-            for i in result.instances:
-                self.txt_results.insert(END, '  ' + str(i) + '\n')
+        self.received = 0
+        self.instances = []
+        self.view = self.instances
+        if self.search_text:
+            self.view = []
+        self.properties = None
+        self.shown = 0
+        self.limit = self.page_size
+        self.val_shown.set('')
+        self.btn_more.configure(state='disabled')
+        self.started = time.time()
+        self.worker = QueryWorker(c, operation, obj)
+        self.worker.start()
+
+        self.val_status.set('Waiting for %s:%s...' % (c.hostname, c.port))
+        self.btn_execute.configure(state='disabled')
+        self.btn_cancel.configure(state='normal')
+        self.after(self.poll_interval, self._poll_worker, self.worker)
+
+    def _poll_worker(self, worker):
+        if worker is not self.worker:
+            # cancelled, or replaced by a newer query
+            return
+
+        deadline = time.time() + self.poll_budget
+        while time.time() < deadline:
+            try:
+                kind, value = worker.results.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == 'instances':
+                self.show_instances(value)
+                self.val_status.set('Received %s instances...' % self.received)
+            elif kind == 'properties':
+                self.show_properties(value)
+            elif kind == 'error':
+                self._finish('Failed')
+                messagebox.showerror(message=str(value))
+                return
+            else:
+                if not self.instances and self.properties is None:
+                    self.txt_results.insert(END, 'No results')
+                self._finish('%s instances in %.2fs' % (self.received, time.time() - self.started))
+                return
+
+        self.after(self.poll_interval, self._poll_worker, worker)
+
+    def _finish(self, status):
+        self.worker = None
+        self.val_status.set(status)
+        self.btn_execute.configure(state='normal')
+        self.btn_cancel.configure(state='disabled')
+
+    def show_instances(self, instances):
+        self.received += len(instances)
+        self.instances.extend(instances)
+        if self.search_text:
+            self.view.extend(i for i in instances if matches(i, self.search_text))
+        self.render()
+
+    def show_properties(self, properties):
+        self.properties = properties
+        lines = ['Properties:\n']
+        for k, v in sorted(properties.items()):
+            line = '  %s: %s\n' % (k, v)
+            if not self.search_text or self.search_text in line.lower():
+                lines.append(line)
+        self.txt_results.insert(END, ''.join(lines))
+
+    def render(self):
+        """
+        Adds the instances of the view up to the page limit to the text box. Each Text.insert() is a round trip
+        to Tcl, so the text is built as one string and inserted with a single call.
+        :return:
+        """
+        chunk = self.view[self.shown:self.limit]
+        if chunk:
+            lines = [] if self.shown else ['Instance names:\n']
+            for i in chunk:
+                lines.append('  %s\n' % i)
                 if i.properties:
-                    self.txt_results.insert(END, '  Properties:\n')
-                    for k, v in sorted(i.properties.items()):
-                        self.txt_results.insert(END, '    %s: %s\n' % (k, v))
-        elif result.properties:
-            self.txt_results.insert(END, 'Properties:\n')
-            for k, v in sorted(result.properties.items()):
-                self.txt_results.insert(END, '  %s: %s\n' % (k, v))
-        else:
-            self.txt_results.insert(END, 'No results')
+                    lines.append('  Properties:\n')
+                    lines.extend('    %s: %s\n' % (k, v) for k, v in sorted(i.properties.items()))
+            self.txt_results.insert(END, ''.join(lines))
+            self.shown += len(chunk)
+
+        self.val_shown.set('Showing %s of %s instances' % (self.shown, len(self.view)))
+        self.btn_more.configure(state='normal' if self.shown < len(self.view) else 'disabled')
 
 
 def compile_exe():
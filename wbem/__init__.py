@@ -31,5 +31,25 @@ SOFTWARE.
 
 __version__ = '0.1'
 
-from .cim import Class, Instance
-from .client import WBEMClient
\ No newline at end of file
+import sys
+
+if sys.version_info >= (3, 7):
+    # the public names are imported on first use (PEP 562), so "import wbem" doesn't load the client, the XML
+    # parser or the HTTP stack until they are needed
+    _exports = dict(Class='.cim', Instance='.cim', Columns='.columns', WBEMClient='.client')
+
+    def __getattr__(name):
+        module = _exports.get(name)
+        if module is None:
+            raise AttributeError("module 'wbem' has no attribute '%s'" % name)
+
+        import importlib
+        value = globals()[name] = getattr(importlib.import_module(module, __name__), name)
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_exports))
+else:
+    from .cim import Class, Instance
+    from .columns import Columns
+    from .client import WBEMClient
@@ -0,0 +1,200 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import codecs
+import os
+import re
+import threading
+
+import six
+
+from .lazy import LazyModule
+
+# only needed once a server asks for Digest authentication or sets a cookie
+hashlib = LazyModule('hashlib')
+http_cookies = LazyModule('Cookie' if six.PY2 else 'http.cookies')
+
+
+def get_all(response, name):
+    """
+    Returns every value of a response header
+    :param response: HTTPResponse
+    :param name: Header name
+    :return: List of strings
+    """
+    if hasattr(response.msg, 'get_all'):
+        return response.msg.get_all(name) or []
+    return response.msg.getheaders(name)
+
+
+class BasicAuth(object):
+    """
+    HTTP Basic authentication. The header is encoded once and reused for every request.
+
+    Authentication objects provide two methods to WBEMClient:
+        headers(method, uri): Dictionary of headers to add to a request
+        challenge(response): Called on a 401 response, returns True if the request should be sent again
+    """
+
+    def __init__(self, username, password):
+        auth = '%s:%s' % (username, password)
+        auth64 = codecs.encode(auth.encode('utf-8'), 'base64').decode('utf-8').replace('\n', '')
+        self.header = dict(Authorization='Basic %s' % auth64)
+
+    def headers(self, method, uri):
+        return self.header
+
+    def challenge(self, response):
+        return False
+
+
+class DigestAuth(object):
+    """
+    HTTP Digest authentication (RFC 2617). The server nonce is kept and reused with an increasing nonce count,
+    so only the first request (or one after the server marks the nonce as stale) costs an extra round trip.
+    """
+
+    hashes = {
+        'MD5': 'md5',
+        'MD5-SESS': 'md5',
+        'SHA-256': 'sha256',
+        'SHA-256-SESS': 'sha256',
+    }
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.realm = None
+        self.nonce = None
+        self.opaque = None
+        self.qop = None
+        self.algorithm = 'MD5'
+        self.nc = 0
+        self._lock = threading.Lock()
+
+    def hash(self, value):
+        return getattr(hashlib, self.hashes[self.algorithm.upper()])(value.encode('utf-8')).hexdigest()
+
+    def headers(self, method, uri):
+        if self.nonce is None:
+            # no challenge seen yet, the first request gets a 401 with the nonce
+            return dict()
+
+        with self._lock:
+            self.nc += 1
+            nc = '%08x' % self.nc
+
+        cnonce = codecs.encode(os.urandom(8), 'hex').decode('ascii')
+        ha1 = self.hash('%s:%s:%s' % (self.username, self.realm, self.password))
+        if self.algorithm.upper().endswith('-SESS'):
+            ha1 = self.hash('%s:%s:%s' % (ha1, self.nonce, cnonce))
+        ha2 = self.hash('%s:%s' % (method, uri))
+
+        fields = [
+            'username="%s"' % self.username,
+            'realm="%s"' % self.realm,
+            'nonce="%s"' % self.nonce,
+            'uri="%s"' % uri,
+            'algorithm=%s' % self.algorithm,
+        ]
+        if self.qop:
+            response = self.hash('%s:%s:%s:%s:%s:%s' % (ha1, self.nonce, nc, cnonce, self.qop, ha2))
+            fields.extend(['qop=%s' % self.qop, 'nc=%s' % nc, 'cnonce="%s"' % cnonce])
+        else:
+            response = self.hash('%s:%s:%s' % (ha1, self.nonce, ha2))
+        fields.append('response="%s"' % response)
+        if self.opaque:
+            fields.append('opaque="%s"' % self.opaque)
+
+        return dict(Authorization='Digest %s' % ', '.join(fields))
+
+    def challenge(self, response):
+        for header in get_all(response, 'WWW-Authenticate'):
+            if 'digest' not in header.lower():
+                continue
+
+            params = dict(
+                (k.lower(), v1 or v2)
+                for k, v1, v2 in re.findall(r'(\w+)=(?:"([^"]*)"|([^,\s]*))', header[header.lower().index('digest'):])
+            )
+            algorithm = params.get('algorithm', 'MD5')
+            if algorithm.upper() not in self.hashes:
+                # servers may offer several algorithms, try the next one
+                continue
+
+            stale = params.get('stale', '').lower() == 'true'
+            if params.get('nonce') == self.nonce and not stale:
+                # the nonce was fine, so the credentials are wrong
+                return False
+
+            qops = [q.strip() for q in params.get('qop', '').split(',')]
+            with self._lock:
+                self.realm = params.get('realm', '')
+                self.nonce = params.get('nonce')
+                self.opaque = params.get('opaque')
+                self.qop = 'auth' if 'auth' in qops else None
+                self.algorithm = algorithm
+                self.nc = 0
+            return True
+
+        return False
+
+
+class SessionCookies(object):
+    """
+    Keeps cookies set by the CIMOM and sends them back, so servers with session cookies can skip authenticating
+    every request
+    """
+
+    def __init__(self):
+        self.cookies = dict()
+
+    def headers(self):
+        if not self.cookies:
+            return dict()
+        return dict(Cookie='; '.join('%s=%s' % item for item in sorted(self.cookies.items())))
+
+    def update(self, response):
+        for header in get_all(response, 'Set-Cookie'):
+            cookie = http_cookies.SimpleCookie()
+            try:
+                cookie.load(header)
+            except http_cookies.CookieError:
+                continue
+
+            for name, morsel in cookie.items():
+                if morsel['max-age'] == '0':
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+
+    def clear(self):
+        self.cookies = dict()
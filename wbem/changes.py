@@ -0,0 +1,182 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import math
+
+from .cim import Instance
+
+# marks a property that is missing on one side of a comparison
+missing = object()
+# stands in for NaN, which is not equal to itself and hashes by identity on Python 3.10+
+not_a_number = object()
+
+
+def freeze(value):
+    """
+    Converts a property value to something hashable
+    :param value: The value
+    :return: Hashable value
+    """
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, Instance):
+        return value.tostring()
+    if isinstance(value, float) and math.isnan(value):
+        return not_a_number
+    return value
+
+
+class Changes(object):
+    """
+    The difference between two polls
+    """
+
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.modified = []
+
+    def __len__(self):
+        """
+        Number of changed instances
+        :return: int
+        """
+        return len(self.added) + len(self.removed) + len(self.modified)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        """
+        String representation of the Changes
+        :return: string
+        """
+        return '<wbem.changes.Changes: added: %s, removed: %s, modified: %s>' % (
+            len(self.added), len(self.removed), len(self.modified)
+        )
+
+
+class ChangeDetector(object):
+    """
+    Compares successive enumerations and reports only the instances that were added, removed or modified.
+    Instances are matched by their instance name, and each one's properties are reduced to a hash so
+    unchanged instances cost one hash and one dictionary lookup. Property names are only compared for instances
+    whose hash changed.
+
+    Example:
+        detector = ChangeDetector(ignore=['StatisticTime'])
+        changes = detector.update(client.EnumerateInstances(client.Class('CIM_DiskDrive')))
+        for instance, names in changes.modified:
+            ...
+    """
+
+    def __init__(self, properties=None, ignore=None):
+        """
+        Initializer
+        :param properties: Optional list of property names to compare, all properties are compared by default
+        :param ignore: Optional list of property names that are never compared (ex: timestamps)
+        :return:
+        """
+        self.properties = set(properties) if properties else None
+        self.ignore = set(ignore) if ignore else set()
+        self.fingerprints = dict()
+        self.instances = dict()
+
+    def reset(self):
+        """
+        Forgets the previous poll, so the next one reports every instance as added
+        :return:
+        """
+        self.fingerprints = dict()
+        self.instances = dict()
+
+    def compared(self, properties):
+        """
+        Returns the (name, value) pairs of the properties that are compared, sorted by name
+        :param properties: Dictionary of properties
+        :return: List of (name, value)
+        """
+        return sorted(
+            (k, freeze(v)) for k, v in properties.items()
+            if k not in self.ignore and (self.properties is None or k in self.properties)
+        )
+
+    def fingerprint(self, instance):
+        """
+        Returns the hash of the compared properties of an instance
+        :param instance: Instance object
+        :return: int
+        """
+        return hash(tuple(self.compared(instance.properties)))
+
+    def update(self, response):
+        """
+        Feeds a new poll into the detector and returns the changes since the previous one
+        :param response: Response object or list of Instance objects
+        :return: Changes
+        """
+        instances = getattr(response, 'instances', response)
+        changes = Changes()
+        fingerprints = dict()
+        current = dict()
+
+        for instance in instances:
+            key = instance.tostring()
+            fingerprint = self.fingerprint(instance)
+            fingerprints[key] = fingerprint
+            current[key] = instance
+
+            previous = self.fingerprints.get(key)
+            if previous is None:
+                changes.added.append(instance)
+            elif previous != fingerprint:
+                changes.modified.append((instance, self.changed_names(self.instances[key], instance)))
+
+        for key, instance in self.instances.items():
+            if key not in current:
+                changes.removed.append(instance)
+
+        self.fingerprints = fingerprints
+        self.instances = current
+        return changes
+
+    def changed_names(self, before, after):
+        """
+        Returns the names of the compared properties that differ between two versions of an instance
+        :param before: The previous Instance
+        :param after: The current Instance
+        :return: Sorted list of property names
+        """
+        before = dict(self.compared(before.properties))
+        after = dict(self.compared(after.properties))
+        return sorted(k for k in set(before) | set(after) if before.get(k, missing) != after.get(k, missing))
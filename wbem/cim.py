@@ -30,22 +30,25 @@ SOFTWARE.
 """
 
 
+from io import BytesIO
+
 import six
 
-# choose the fastest XML implementation available
-try:
-    # attempt to use LXML, if available
-    import lxml.etree as ET
-except ImportError:
-    try:
-        # if no LXML, try to use cElementTree for Python 2.x (deprecated in Python 3.3)
-        from xml.etree import cElementTree as ET
-    except ImportError:
-        # if no cElementTree (not running in CPython or removed in Python 3.5+)
-        from xml.etree import ElementTree as ET
+from .lazy import LazyModule
+
+# choose the fastest XML implementation available: LXML if installed, then cElementTree (Python 2.x and
+# non-CPython platforms), then regular ElementTree. It is imported on first use to keep "import wbem" fast.
+ET = LazyModule('lxml.etree', 'xml.etree.cElementTree', 'xml.etree.ElementTree')
+re = LazyModule('re')
 
 import datetime
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    # Python 2.x
+    from collections import MutableMapping
+
 
 class CimError(Exception):
     """
@@ -90,6 +93,12 @@ class InvalidMethod(CimError):
     code = 17
 
 
+class LimitExceeded(CimError):
+    """
+    A response broke one of the ParserLimits or declared entities. Raised by the client, not the CIMOM.
+    """
+
+
 class Class(object):
     """
     Represents a CIM class.
@@ -130,6 +139,9 @@ class Instance(object):
         1) name=value
         2) name=(value, valuetype)
     Keybindings stored with #1 are auto-detected on toxml().
+
+    Properties follow the same rules for toinstancexml(), with two additions: lists are sent as arrays and
+    Instance values are sent as references.
     """
 
     default_namespace = 'root/cimv2'
@@ -241,6 +253,22 @@ class Instance(object):
 
         return Tags.instancename(children, self.classname)
 
+    def toinstancexml(self):
+        """
+        Format the Instance and its properties to an INSTANCE element
+        :return: Element
+        """
+        children = []
+        for name, val in sorted(self.properties.items()):
+            if isinstance(val, tuple):
+                if len(val) != 2:
+                    raise ValueError('Encountered sequence with invalid number of items while creating properties')
+                children.append(Tags.property(name, val[0], val[1]))
+            else:
+                children.append(Tags.property(name, val))
+
+        return Tags.instance(children, self.classname)
+
     def append(self, name, value, valuetype=None):
         """
         Append a keybinding. If valuetype is not given, it will be auto-detected
@@ -270,6 +298,74 @@ class Instance(object):
         return '<wbem.cim.Instance: %s>' % self.tostring()
 
 
+class LazyProperties(MutableMapping):
+    """
+    Instance properties that keep the raw VALUE text and CIM type of each property and only decode it when it is
+    accessed for the first time. The decoded value is cached, so later accesses cost a dictionary lookup.
+    Otherwise this behaves like a regular dictionary.
+    """
+
+    def __init__(self):
+        self.raw = dict()
+        self.values = dict()
+
+    def add_raw(self, name, text, valuetype):
+        """
+        Adds a property that is not decoded yet
+        :param name: Property name
+        :param text: The VALUE text, or a list of them for arrays
+        :param valuetype: The CIM type
+        :return:
+        """
+        self.values.pop(name, None)
+        self.raw[name] = (text, valuetype)
+
+    def __getitem__(self, name):
+        try:
+            return self.values[name]
+        except KeyError:
+            pass
+
+        try:
+            text, valuetype = self.raw[name]
+        except KeyError:
+            # another thread decoded it since values was checked, it stores the value before dropping the text
+            return self.values[name]
+
+        if isinstance(text, list):
+            value = [Response.parse_valuetype(t.strip(), valuetype) for t in text]
+        else:
+            value = Response.parse_valuetype(text.strip(), valuetype)
+
+        # two threads may decode the same property, both get the same value and the second pop finds nothing
+        self.values[name] = value
+        self.raw.pop(name, None)
+        return value
+
+    def __setitem__(self, name, value):
+        self.raw.pop(name, None)
+        self.values[name] = value
+
+    def __delitem__(self, name):
+        if self.raw.pop(name, None) is None:
+            del self.values[name]
+
+    def __contains__(self, name):
+        return name in self.values or name in self.raw
+
+    def __iter__(self):
+        for name in list(self.values):
+            yield name
+        for name in list(self.raw):
+            yield name
+
+    def __len__(self):
+        return len(self.values) + len(self.raw)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
 class Tags(object):
     """
     CIM-XML tag generator
@@ -357,6 +453,53 @@ class Tags(object):
             children
         )
 
+    @staticmethod
+    def methodcall(children=None, name='GetStatisticsCollection'):
+        """
+        METHODCALL element, for extrinsic methods
+        :param children: Child nodes to append
+        :param name: Name of the method to call
+        :return: Element
+
+        >>> ET.tostring(Tags.methodcall())
+        <METHODCALL NAME="GetStatisticsCollection"/>
+        """
+        return Tags.append_children(
+            ET.Element('METHODCALL', dict(NAME=name)),
+            children
+        )
+
+    @staticmethod
+    def localinstancepath(instance_obj):
+        """
+        LOCALINSTANCEPATH element
+        :param instance_obj: Instance object
+        :return: Element
+
+        >>> ET.tostring(Tags.localinstancepath(Instance('StorageDevice', namespace='root/cimv2')))
+        <LOCALINSTANCEPATH><LOCALNAMESPACEPATH>...</LOCALNAMESPACEPATH><INSTANCENAME CLASSNAME="StorageDevice"/>
+        </LOCALINSTANCEPATH>
+        """
+        return Tags.append_children(
+            ET.Element('LOCALINSTANCEPATH'),
+            [Tags.localnamespacepath(instance_obj.namespace), instance_obj.toxml()]
+        )
+
+    @staticmethod
+    def localclasspath(class_obj):
+        """
+        LOCALCLASSPATH element
+        :param class_obj: Class object
+        :return: Element
+
+        >>> ET.tostring(Tags.localclasspath(Class('StorageDevice', 'root/cimv2')))
+        <LOCALCLASSPATH><LOCALNAMESPACEPATH>...</LOCALNAMESPACEPATH><CLASSNAME NAME="StorageDevice"/></LOCALCLASSPATH>
+        """
+        return Tags.append_children(
+            ET.Element('LOCALCLASSPATH'),
+            [Tags.localnamespacepath(class_obj.namespace), Tags.classname(class_obj.name)]
+        )
+
     @staticmethod
     def localnamespacepath(namespace='root/cimv2'):
         """
@@ -405,6 +548,20 @@ class Tags(object):
         """
         return ET.Element('CLASSNAME', dict(NAME=name))
 
+    @staticmethod
+    def value(value):
+        """
+        VALUE element
+        :param value: The value, converted to text like property values
+        :return: Element
+
+        >>> ET.tostring(Tags.value(True))
+        <VALUE>TRUE</VALUE>
+        """
+        element = ET.Element('VALUE')
+        element.text = Tags.autodetect_valuetype(value)[0]
+        return element
+
     @staticmethod
     def instancename(children=None, classname=None):
         """
@@ -448,6 +605,104 @@ class Tags(object):
             children
         )
 
+    @staticmethod
+    def instance(children=None, classname=None):
+        """
+        INSTANCE element
+        :param children: Child nodes to append
+        :param classname: Name of the class
+        :return: Element
+
+        >>> ET.tostring(Tags.instance(classname='CIM_IndicationFilter'))
+        <INSTANCE CLASSNAME="CIM_IndicationFilter"/>
+        """
+        return Tags.append_children(
+            ET.Element('INSTANCE', dict(CLASSNAME=classname)),
+            children
+        )
+
+    @staticmethod
+    def property(name, value=None, value_type=None):
+        """
+        PROPERTY element, or PROPERTY.ARRAY for lists and PROPERTY.REFERENCE for Instance values
+        :param name: Name of the property
+        :param value: The value
+        :param value_type: TYPE of the property. Defaults to auto-detect
+        :return: Element
+
+        >>> ET.tostring(Tags.property(name='Name', value='The Value'))
+        <PROPERTY NAME="Name" TYPE="string"><VALUE>The Value</VALUE></PROPERTY>
+        """
+        if isinstance(value, Instance):
+            reference_element = Tags.append_children(ET.Element('VALUE.REFERENCE'), [value.toxml()])
+            return Tags.append_children(
+                ET.Element('PROPERTY.REFERENCE', dict(NAME=name, REFERENCECLASS=value.classname)),
+                [reference_element]
+            )
+
+        if isinstance(value, list):
+            array_element = ET.Element('VALUE.ARRAY')
+            for v in value:
+                text, detected_type = Tags.autodetect_valuetype(v)
+                value_type = value_type or detected_type
+                ET.SubElement(array_element, 'VALUE').text = text
+            return Tags.append_children(
+                ET.Element('PROPERTY.ARRAY', dict(NAME=name, TYPE=value_type or 'string')),
+                [array_element]
+            )
+
+        if value is None:
+            return ET.Element('PROPERTY', dict(NAME=name, TYPE=value_type or 'string'))
+
+        text, detected_type = Tags.autodetect_valuetype(value)
+        value_element = ET.Element('VALUE')
+        value_element.text = text
+        return Tags.append_children(
+            ET.Element('PROPERTY', dict(NAME=name, TYPE=value_type or detected_type)),
+            [value_element]
+        )
+
+    @staticmethod
+    def paramvalue(name, value=None, value_type=None):
+        """
+        PARAMVALUE element of an extrinsic method call. Lists are sent as arrays and Instance values as references
+        :param name: Name of the parameter
+        :param value: The value
+        :param value_type: PARAMTYPE of the parameter. Defaults to auto-detect
+        :return: Element
+
+        >>> ET.tostring(Tags.paramvalue('StatisticsFormat', 2, 'uint16'))
+        <PARAMVALUE NAME="StatisticsFormat" PARAMTYPE="uint16"><VALUE>2</VALUE></PARAMVALUE>
+        """
+        if isinstance(value, Instance):
+            reference_element = Tags.append_children(ET.Element('VALUE.REFERENCE'), [value.toxml()])
+            return Tags.append_children(
+                ET.Element('PARAMVALUE', dict(NAME=name, PARAMTYPE='reference')),
+                [reference_element]
+            )
+
+        if isinstance(value, list):
+            array_element = ET.Element('VALUE.ARRAY')
+            for v in value:
+                text, detected_type = Tags.autodetect_valuetype(v)
+                value_type = value_type or detected_type
+                ET.SubElement(array_element, 'VALUE').text = text
+            return Tags.append_children(
+                ET.Element('PARAMVALUE', dict(NAME=name, PARAMTYPE=value_type or 'string')),
+                [array_element]
+            )
+
+        if value is None:
+            return ET.Element('PARAMVALUE', dict(NAME=name, PARAMTYPE=value_type or 'string'))
+
+        text, detected_type = Tags.autodetect_valuetype(value)
+        value_element = ET.Element('VALUE')
+        value_element.text = text
+        return Tags.append_children(
+            ET.Element('PARAMVALUE', dict(NAME=name, PARAMTYPE=value_type or detected_type)),
+            [value_element]
+        )
+
     @staticmethod
     def autodetect_valuetype(value):
         """
@@ -469,15 +724,15 @@ class Tags(object):
 
             return value.strftime('%Y%m%d%H%M%S.%f')+offset, 'datetime'
         elif isinstance(value, datetime.timedelta):
-            hours = value.seconds / 3600
-            minutes = (value.seconds - hours * 3600) / 60
+            hours = value.seconds // 3600
+            minutes = (value.seconds - hours * 3600) // 60
             return '%08d%02d%02d%02d.%06d:000' % (
                 value.days, hours, minutes,
                 value.seconds - hours * 3600 - minutes * 60,
                 value.microseconds
-            )
+            ), 'datetime'
         elif isinstance(value, bool):
-            return 'TRUE', 'boolean' if value else 'FALSE', 'boolean'
+            return ('TRUE' if value else 'FALSE'), 'boolean'
         elif isinstance(value, float):
             # take best guess of value_type
             return str(value), 'real32'
@@ -497,42 +752,86 @@ class Helpers(object):
     """
 
     @staticmethod
-    def imethodcall(method, class_or_instance_obj):
+    def imethodcall(method, class_or_instance_obj, iparamvalue_name=None, params=None, options=None):
         """
         Generates an IMETHODCALL XML tree
         :param method: The name of the method to call
-        :param class_or_instance_obj: The Class or Instance object
+        :param class_or_instance_obj: The Class or Instance object. A Class without a name leaves out the ClassName
+            parameter, which starts at the root of the namespace for methods like EnumerateClassNames
+        :param iparamvalue_name: Name of the IPARAMVALUE, if overriding the default
+        :param params: Child elements of the IPARAMVALUE, if overriding the default
+        :param options: Optional list of (name, value) pairs for extra IPARAMVALUEs with a simple VALUE
         :return: XML string
         """
         if not isinstance(class_or_instance_obj, (Class, Instance)):
             raise ValueError('Must pass a Class or Instance object')
 
-        if isinstance(class_or_instance_obj, Class):
-            iparamvalue_name = 'ClassName'
-            params = [
-                Tags.classname(class_or_instance_obj.name)
-            ]
-        else:
-            iparamvalue_name = 'InstanceName'
-            params = class_or_instance_obj.toxml()
+        iparamvalues = []
+        if params is None:
+            if isinstance(class_or_instance_obj, Class) and not class_or_instance_obj.name:
+                iparamvalue_name = None
+            elif isinstance(class_or_instance_obj, Class):
+                iparamvalue_name = 'ClassName'
+                params = [
+                    Tags.classname(class_or_instance_obj.name)
+                ]
+            else:
+                iparamvalue_name = 'InstanceName'
+                params = [
+                    class_or_instance_obj.toxml()
+                ]
+
+        if iparamvalue_name is not None:
+            iparamvalues.append(Tags.iparamvalue(name=iparamvalue_name, children=params))
+        for name, value in options or []:
+            iparamvalues.append(Tags.iparamvalue(name=name, children=[Tags.value(value)]))
 
         return Tags.cim(
             Tags.message(
                 Tags.simplereq(
                     Tags.imethodcall(
                         name=method,
-                        children=[
-                            Tags.localnamespacepath(class_or_instance_obj.namespace),
-                            Tags.iparamvalue(
-                                name=iparamvalue_name,
-                                children=params
-                            )
-                        ]
+                        children=[Tags.localnamespacepath(class_or_instance_obj.namespace)] + iparamvalues
                     )
                 )
             )
         )
 
+    @staticmethod
+    def methodcall(method, class_or_instance_obj, params=None):
+        """
+        Generates a METHODCALL XML tree for an extrinsic method
+        :param method: The name of the method to call
+        :param class_or_instance_obj: The Instance object, or a Class object for static methods
+        :param params: Optional dictionary or list of (name, value) pairs. Values follow the rules of
+            Tags.paramvalue(), a (value, type) tuple gives the PARAMTYPE
+        :return: XML string
+        """
+        if isinstance(class_or_instance_obj, Instance):
+            children = [Tags.localinstancepath(class_or_instance_obj)]
+        elif isinstance(class_or_instance_obj, Class):
+            children = [Tags.localclasspath(class_or_instance_obj)]
+        else:
+            raise ValueError('Must pass a Class or Instance object')
+
+        if isinstance(params, dict):
+            params = sorted(params.items())
+        for name, value in params or []:
+            if isinstance(value, tuple):
+                if len(value) != 2:
+                    raise ValueError('Encountered sequence with invalid number of items while creating parameters')
+                children.append(Tags.paramvalue(name, value[0], value[1]))
+            else:
+                children.append(Tags.paramvalue(name, value))
+
+        return Tags.cim(
+            Tags.message(
+                Tags.simplereq(
+                    Tags.methodcall(name=method, children=children)
+                )
+            )
+        )
+
 
 class Methods(object):
     """
@@ -562,14 +861,18 @@ class Methods(object):
         )
 
     @staticmethod
-    def EnumerateClassNames(class_obj):
+    def EnumerateClassNames(class_obj, deep_inheritance=False):
         """
         Generates the XML required for a EnumerateClassNames method call
-        :param class_obj: Class object
+        :param class_obj: Class object, a Class without a name starts at the root of the namespace
+        :param deep_inheritance: Return all subclasses instead of only the direct ones
         :return: XML string
         """
         return ET.tostring(
-            Helpers.imethodcall('EnumerateClassNames', class_obj)
+            Helpers.imethodcall(
+                'EnumerateClassNames', class_obj,
+                options=[('DeepInheritance', True)] if deep_inheritance else None
+            )
         )
 
     @staticmethod
@@ -614,16 +917,30 @@ class Methods(object):
         raise NotImplementedError()
 
     @staticmethod
-    def CreateInstance():
-        raise NotImplementedError()
+    def CreateInstance(instance_obj):
+        """
+        Generates the XML required for a CreateInstance method call
+        :param instance_obj: Instance object, with the properties of the new instance
+        :return: XML string
+        """
+        return ET.tostring(
+            Helpers.imethodcall('CreateInstance', instance_obj, 'NewInstance', [instance_obj.toinstancexml()])
+        )
 
     @staticmethod
     def ModifyInstance():
         raise NotImplementedError()
 
     @staticmethod
-    def DeleteInstance():
-        raise NotImplementedError()
+    def DeleteInstance(instance_obj):
+        """
+        Generates the XML required for a DeleteInstance method call
+        :param instance_obj: Instance object
+        :return: XML string
+        """
+        return ET.tostring(
+            Helpers.imethodcall('DeleteInstance', instance_obj)
+        )
 
     @staticmethod
     def CreateClass():
@@ -680,97 +997,473 @@ class Methods(object):
     def EnumerateQualifiers():
         raise NotImplementedError()
 
+    @staticmethod
+    def OpenEnumerateInstances(class_obj, max_object_count=1000):
+        """
+        Generates the XML required for an OpenEnumerateInstances method call, which starts a pulled enumeration
+        :param class_obj: Class object
+        :param max_object_count: Most instances to return with the first page
+        :return: XML string
+        """
+        return ET.tostring(
+            Helpers.imethodcall(
+                'OpenEnumerateInstances', class_obj, options=[('MaxObjectCount', max_object_count)]
+            )
+        )
+
+    @staticmethod
+    def PullInstancesWithPath(class_obj, enumeration_context, max_object_count=1000):
+        """
+        Generates the XML required for a PullInstancesWithPath method call, which returns the next page
+        :param class_obj: Class object (for the namespace)
+        :param enumeration_context: The enumeration context of the previous page
+        :param max_object_count: Most instances to return
+        :return: XML string
+        """
+        return ET.tostring(
+            Helpers.imethodcall(
+                'PullInstancesWithPath', class_obj, 'EnumerationContext', [Tags.value(enumeration_context)],
+                options=[('MaxObjectCount', max_object_count)]
+            )
+        )
+
+    @staticmethod
+    def CloseEnumeration(class_obj, enumeration_context):
+        """
+        Generates the XML required for a CloseEnumeration method call, which ends a pulled enumeration early
+        :param class_obj: Class object (for the namespace)
+        :param enumeration_context: The enumeration context of the previous page
+        :return: XML string
+        """
+        return ET.tostring(
+            Helpers.imethodcall(
+                'CloseEnumeration', class_obj, 'EnumerationContext', [Tags.value(enumeration_context)]
+            )
+        )
+
+    @staticmethod
+    def InvokeMethod(class_or_instance_obj, method, params=None):
+        """
+        Generates the XML required for an extrinsic method call
+        :param class_or_instance_obj: The Instance object, or a Class object for static methods
+        :param method: The method name
+        :param params: Optional input parameters, see Helpers.methodcall()
+        :return: XML string
+        """
+        return ET.tostring(
+            Helpers.methodcall(method, class_or_instance_obj, params)
+        )
+
+
+def check_declarations(xml_string):
+    """
+    Refuses documents that declare entities, so none of the XML backends expands them. Encodings that are not
+    ASCII compatible are refused as well, since the declarations could hide from the byte search in them.
+    CIM-XML has no use for either.
+    :param xml_string: The XML string
+    :return:
+    """
+    if isinstance(xml_string, six.text_type):
+        if '<!ENTITY' in xml_string:
+            raise LimitExceeded('Entity declarations are not allowed')
+        return
+
+    head = xml_string[:256]
+    if head[:2] in (b'\xff\xfe', b'\xfe\xff') or b'\x00' in head[:4]:
+        raise LimitExceeded('Only UTF-8 documents are accepted')
+    if head.startswith(b'\xef\xbb\xbf'):
+        head = head[3:]
+    if head.startswith(b'<?xml'):
+        encoding = re.search(br'encoding\s*=\s*["\']([^"\']*)', head[:head.find(b'?>')])
+        if encoding and encoding.group(1).lower().replace(b'-', b'').replace(b'_', b'') not in (
+                b'utf8', b'usascii', b'ascii', b'iso88591', b'latin1'):
+            raise LimitExceeded('Only UTF-8 documents are accepted, not %s' % encoding.group(1).decode('ascii'))
+
+    if b'<!ENTITY' in xml_string:
+        raise LimitExceeded('Entity declarations are not allowed')
+
+
+class ParserLimits(object):
+    """
+    Limits on the responses a client reads, so a misbehaving CIMOM can't exhaust the memory of a collector.
+    max_bytes and max_instances are checked on the raw bytes while the body is read, so the read stops at the
+    chunk that broke them and nothing is parsed. max_depth is checked while the document is parsed, so parsing
+    stops at the first element nested too deep. A limit of None is not checked.
+
+    Counting is done with bytes.count(), and a regular expression for the pieces that hold references, which costs
+    a few percent of the parsing time. Bodies are read in one call when only max_bytes is set.
+
+    Example:
+        client = WBEMClient('the-host', limits=ParserLimits(max_bytes=256 * 1024 * 1024, max_instances=500000))
+    """
+
+    # size of the reads when instances are counted, must be longer than reference_window
+    chunk_size = 1024 * 1024
+    # a reference to an instance: VALUE.REFERENCE holding an INSTANCEPATH, LOCALINSTANCEPATH or INSTANCENAME
+    instance_reference = br'<VALUE\.REFERENCE\s*>\s*<(?:LOCALINSTANCEPATH|INSTANCEPATH|INSTANCENAME)[\s>]'
+    # bytes on either side of a read boundary searched for split references
+    reference_window = 256
+
+    def __init__(self, max_bytes=None, max_instances=None, max_depth=None):
+        """
+        Initializer
+        :param max_bytes: Largest response body in bytes
+        :param max_instances: Most instances (or instance names) in one response
+        :param max_depth: Deepest element nesting, the CIM element being 1. Valid responses stay below 20
+        :return:
+        """
+        self.max_bytes = max_bytes
+        self.max_instances = max_instances
+        self.max_depth = max_depth
+
+    def read(self, stream, length=None):
+        """
+        Reads a response body, stopping as soon as it breaks max_bytes or max_instances
+        :param stream: File-like object, ex: HTTPResponse
+        :param length: The length of the body if it was announced (Content-Length)
+        :return: bytes
+        """
+        if length is not None:
+            self.check_size(length)
+
+        if self.max_instances is None:
+            if self.max_bytes is None or length is not None:
+                return stream.read()
+
+            # chunked response, one byte more than allowed tells whether it is too large
+            body = stream.read(self.max_bytes + 1)
+            self.check_size(len(body))
+            return body
+
+        chunks = []
+        size = 0
+        instances = 0
+        previous = b''
+        while True:
+            chunk = stream.read(self.chunk_size)
+            if not chunk:
+                return b''.join(chunks)
+
+            size += len(chunk)
+            self.check_size(size)
+            instances += self.count_instances(chunk, previous)
+            if instances > self.max_instances:
+                raise LimitExceeded('The response has more than max_instances (%s) instances' % self.max_instances)
+
+            chunks.append(chunk)
+            previous = chunk
+
+    def check_size(self, size):
+        """
+        Raises LimitExceeded if a body of the given size breaks max_bytes
+        :param size: Size in bytes
+        :return:
+        """
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise LimitExceeded('The response is larger than max_bytes (%s bytes)' % self.max_bytes)
+
+    def parse(self, xml_string):
+        """
+        Parses a document into a tree. With max_depth, the document is parsed incrementally and LimitExceeded is
+        raised at the first element nested deeper, before the rest of the tree is built.
+        :param xml_string: The XML string
+        :return: The root element
+        """
+        if self.max_depth is None:
+            return ET.fromstring(xml_string)
+
+        if isinstance(xml_string, six.text_type):
+            xml_string = xml_string.encode('utf-8')
+
+        root = None
+        depth = 0
+        for event, elem in ET.iterparse(BytesIO(xml_string), events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth > self.max_depth:
+                    raise LimitExceeded('The response is nested deeper than max_depth (%s)' % self.max_depth)
+                if root is None:
+                    root = elem
+            else:
+                depth -= 1
+
+        return root
+
+    @staticmethod
+    def count_instances(data, previous=b''):
+        """
+        Counts the instances in a piece of a response. Every instance and instance name has one INSTANCENAME
+        element, and so does every reference to an instance, which is not counted. References to classes have
+        none. References are only searched for when the piece has any, so responses without them cost a
+        bytes.count() per tag.
+        :param data: Bytes of the response
+        :param previous: The bytes read before data, to count tags split between the two
+        :return: int
+        """
+        tag = b'<INSTANCENAME'
+        count = data.count(tag)
+        if previous:
+            n = len(tag) - 1
+            count += (previous[-n:] + data[:n]).count(tag)
+
+        reference = b'<VALUE.REFERENCE'
+        if reference in data:
+            count -= len(re.findall(ParserLimits.instance_reference, data))
+        if previous:
+            # references split between the two pieces, whitespace longer than the window is not expected
+            n = ParserLimits.reference_window
+            window = previous[-n:] + data[:n]
+            if reference in window:
+                tail = min(n, len(previous))
+                count -= sum(
+                    1 for m in re.finditer(ParserLimits.instance_reference, window)
+                    if m.start() < tail < m.end()
+                )
+
+        return count
+
+    def __repr__(self):
+        """
+        String representation of the ParserLimits
+        :return: string
+        """
+        return '<wbem.cim.ParserLimits: max_bytes: %s, max_instances: %s, max_depth: %s>' % (
+            self.max_bytes, self.max_instances, self.max_depth
+        )
+
 
 class Response(object):
-    def __init__(self, xml_string, namespace):
+    def __init__(self, xml_string, namespace, lazy=False, limits=None):
         """
         Parses the given XML string and determines the response
         :param xml_string: The XML string
         :param namespace: The namespace
+        :param lazy: Keep property values as raw text until they are accessed (see LazyProperties)
+        :param limits: Optional ParserLimits, only max_depth is checked here
         :return:
         """
-        root = ET.fromstring(xml_string)
+        check_declarations(xml_string)
+        if limits is not None:
+            root = limits.parse(xml_string)
+        else:
+            root = ET.fromstring(xml_string)
 
-        # find the IMETHODRESPONSE element
-        imethodresponse = root.find('MESSAGE').find('SIMPLERSP').find('IMETHODRESPONSE')
+        # find the IMETHODRESPONSE element, or the METHODRESPONSE of an extrinsic method (InvokeMethod)
+        simplersp = root.find('MESSAGE').find('SIMPLERSP')
+        imethodresponse = simplersp.find('IMETHODRESPONSE')
+        if imethodresponse is None:
+            imethodresponse = simplersp.find('METHODRESPONSE')
 
         # save the method name
         self.method = imethodresponse.attrib['NAME']
 
         # check for errors
         if imethodresponse.find('ERROR') is not None:
-            error_e = imethodresponse.find('ERROR')
-            error_code = error_e.attrib['CODE']
-            description = error_e.attrib['DESCRIPTION']
-            if error_code == '3':
-                raise InvalidNamespace(description)
-            if error_code == '5':
-                raise InvalidClass(description)
-            if error_code == '6':
-                raise NotFound(description)
-            if error_code == '7':
-                raise NotSupported(description)
-            if error_code == '12':
-                raise InvalidProperty(description)
-            if error_code == '13':
-                raise TypeMismatch(description)
-            if error_code == '15':
-                raise InvalidQuery(description)
-            if error_code == '17':
-                raise InvalidMethod(description)
-
-            raise CimError(description)
+            self.raise_error(imethodresponse.find('ERROR'))
 
-        # find and store instances with properties, if they exist (EnumerateInstances)
+        # methods like DeleteInstance have no return value
         self.instances = []
-        for i in imethodresponse.find('IRETURNVALUE').findall('VALUE.NAMEDINSTANCE'):
+        self.properties = dict()
+        self.classnames = []
+
+        # return value and output parameters of extrinsic methods
+        self.return_value = None
+        self.params = dict()
+        returnvalue_e = imethodresponse.find('RETURNVALUE')
+        if returnvalue_e is not None:
+            self.return_value = self.parse_paramvalue(returnvalue_e, namespace)
+        for p in imethodresponse.findall('PARAMVALUE'):
+            self.params[p.attrib['NAME']] = self.parse_paramvalue(p, namespace)
+
+        # output parameters of pulled enumerations (OpenEnumerateInstances, PullInstancesWithPath)
+        self.enumeration_context = self.params.get('EnumerationContext')
+        self.end_of_sequence = self.params.get('EndOfSequence')
+        if self.end_of_sequence is not None and not isinstance(self.end_of_sequence, bool):
+            self.end_of_sequence = self.end_of_sequence.upper() == 'TRUE'
+
+        ireturnvalue = imethodresponse.find('IRETURNVALUE')
+        if ireturnvalue is None:
+            return
+
+        # find and store instances with properties, if they exist (EnumerateInstances)
+        for i in ireturnvalue.findall('VALUE.NAMEDINSTANCE'):
             instance_name_tag = i.find('INSTANCENAME')
             instance = self.parse_instance(instance_name_tag, namespace)
             props_parent = i.find('INSTANCE')
-            instance.properties = self.parse_properties(props_parent)
+            instance.properties = self.parse_properties(props_parent, lazy)
             self.instances.append(instance)
 
-        # find and store instances, if they exist (EnumerateInstanceNames)
-        for i in imethodresponse.find('IRETURNVALUE').findall('INSTANCENAME'):
+        # find and store instances with their path, if they exist (OpenEnumerateInstances, PullInstancesWithPath)
+        for i in ireturnvalue.findall('VALUE.INSTANCEWITHPATH'):
+            instance_path_tag = i.find('INSTANCEPATH')
+            instance = self.parse_instance(
+                instance_path_tag.find('INSTANCENAME'), self.parse_namespace(instance_path_tag) or namespace
+            )
+            instance.properties = self.parse_properties(i.find('INSTANCE'), lazy)
+            self.instances.append(instance)
+
+        # find and store instances, if they exist (EnumerateInstanceNames, CreateInstance)
+        for i in ireturnvalue.findall('INSTANCENAME'):
             instance = self.parse_instance(i, namespace)
             self.instances.append(instance)
 
+        # find and store class names, if they exist (EnumerateClassNames, EnumerateClasses)
+        for c in ireturnvalue.findall('CLASSNAME'):
+            self.classnames.append(c.attrib['NAME'])
+        for c in ireturnvalue.findall('CLASS'):
+            self.classnames.append(c.attrib['NAME'])
+
         # find and store properties, if they exist (GetInstance)
-        props_parent = imethodresponse.find('IRETURNVALUE').find('INSTANCE')
-        self.properties = self.parse_properties(props_parent)
+        props_parent = ireturnvalue.find('INSTANCE')
+        self.properties = self.parse_properties(props_parent, lazy)
 
-    def parse_instance(self, instance_name_tag, namespace):
+    def columns(self, properties=None):
+        """
+        Returns the instances of this response in column-oriented form
+        :param properties: Optional list of property names to keep
+        :return: Columns
+        """
+        from .columns import Columns
+        return Columns.frominstances(self.instances, properties)
+
+    @staticmethod
+    def raise_error(error_e):
+        """
+        Raises the CimError subclass matching the CODE of an ERROR element
+        :param error_e: The ERROR element
+        :return:
+        """
+        error_code = error_e.attrib['CODE']
+        description = error_e.attrib['DESCRIPTION']
+        if error_code == '3':
+            raise InvalidNamespace(description)
+        if error_code == '5':
+            raise InvalidClass(description)
+        if error_code == '6':
+            raise NotFound(description)
+        if error_code == '7':
+            raise NotSupported(description)
+        if error_code == '12':
+            raise InvalidProperty(description)
+        if error_code == '13':
+            raise TypeMismatch(description)
+        if error_code == '15':
+            raise InvalidQuery(description)
+        if error_code == '17':
+            raise InvalidMethod(description)
+
+        raise CimError(description)
+
+    @staticmethod
+    def parse_instance(instance_name_tag, namespace):
         instance = Instance(instance_name_tag.attrib['CLASSNAME'], namespace=namespace)
         for kb in instance_name_tag.findall('KEYBINDING'):
             name = kb.attrib['NAME']
             keyvalue_e = kb.find('KEYVALUE')
             valuetype = keyvalue_e.attrib['VALUETYPE']
-            value = self.parse_valuetype(keyvalue_e.text.strip(), valuetype)
+            value = Response.parse_valuetype(keyvalue_e.text.strip(), valuetype)
             instance.append(name, value, valuetype)
 
         return instance
 
-    def parse_properties(self, instance_tag):
-        properties = dict()
+    @staticmethod
+    def parse_paramvalue(paramvalue_tag, namespace):
+        """
+        Parses the value of a PARAMVALUE or RETURNVALUE element, using its PARAMTYPE
+        :param paramvalue_tag: The PARAMVALUE or RETURNVALUE element
+        :param namespace: The namespace of references that don't name one
+        :return: Parsed value, a list for arrays, an Instance for references or None
+        """
+        valuetype = paramvalue_tag.attrib.get('PARAMTYPE', 'string')
+        value_e = paramvalue_tag.find('VALUE')
+        if value_e is not None:
+            return Response.parse_valuetype((value_e.text or '').strip(), valuetype)
+
+        value_array_e = paramvalue_tag.find('VALUE.ARRAY')
+        if value_array_e is not None:
+            return [Response.parse_valuetype((v.text or '').strip(), valuetype) for v in value_array_e.findall('VALUE')]
+
+        reference_e = paramvalue_tag.find('VALUE.REFERENCE')
+        if reference_e is not None:
+            return Response.parse_reference(reference_e, namespace)
+
+        refarray_e = paramvalue_tag.find('VALUE.REFARRAY')
+        if refarray_e is not None:
+            return [Response.parse_reference(v, namespace) for v in refarray_e.findall('VALUE.REFERENCE')]
+
+        return None
+
+    @staticmethod
+    def parse_reference(reference_tag, namespace):
+        """
+        Parses a VALUE.REFERENCE element that points to an instance
+        :param reference_tag: The VALUE.REFERENCE element
+        :param namespace: The namespace, if the reference doesn't name one
+        :return: Instance
+        """
+        instance_name_tag = reference_tag.find('.//INSTANCENAME')
+        if instance_name_tag is None:
+            raise ValueError('Only references to instances are supported')
+        return Response.parse_instance(instance_name_tag, Response.parse_namespace(reference_tag) or namespace)
+
+    @staticmethod
+    def parse_namespace(instance_path_tag):
+        """
+        Returns the namespace of an INSTANCEPATH element
+        :param instance_path_tag: The INSTANCEPATH element
+        :return: The namespace (ex: root/cimv2) or None
+        """
+        names = [n.attrib['NAME'] for n in instance_path_tag.iter('NAMESPACE')]
+        return '/'.join(names) or None
+
+    @staticmethod
+    def parse_properties(instance_tag, lazy=False):
+        """
+        Parses the properties of an INSTANCE element
+        :param instance_tag: The INSTANCE element or None
+        :param lazy: Return LazyProperties that decode values on first access instead of a dictionary
+        :return: Dictionary or LazyProperties
+        """
+        properties = LazyProperties() if lazy else dict()
         if instance_tag is not None:
             for p in instance_tag.findall('PROPERTY'):
                 key = p.attrib['NAME']
                 valuetype = p.attrib['TYPE']
                 value_e = p.find('VALUE')
                 if value_e is not None:
-                    value = self.parse_valuetype(value_e.text.strip(), valuetype)
-                    properties[key] = value
+                    if lazy:
+                        properties.add_raw(key, value_e.text, valuetype)
+                    else:
+                        properties[key] = Response.parse_valuetype(value_e.text.strip(), valuetype)
                 else:
                     value_array_e = p.find('VALUE.ARRAY')
                     if value_array_e:
-                        values = []
-                        for v in value_array_e.findall('VALUE'):
-                            values.append(self.parse_valuetype(v.text.strip(), valuetype))
+                        Response.parse_value_array(properties, key, value_array_e, valuetype, lazy)
 
-                        properties[key] = values
+            for p in instance_tag.findall('PROPERTY.ARRAY'):
+                value_array_e = p.find('VALUE.ARRAY')
+                if value_array_e is not None:
+                    Response.parse_value_array(properties, p.attrib['NAME'], value_array_e, p.attrib['TYPE'], lazy)
 
         return properties
 
+    @staticmethod
+    def parse_value_array(properties, name, value_array_tag, valuetype, lazy=False):
+        """
+        Parses a VALUE.ARRAY element into a property
+        :param properties: Dictionary or LazyProperties to add the property to
+        :param name: Property name
+        :param value_array_tag: The VALUE.ARRAY element
+        :param valuetype: The CIM type
+        :param lazy: Keep the raw text
+        :return:
+        """
+        texts = [v.text for v in value_array_tag.findall('VALUE')]
+        if lazy:
+            properties.add_raw(name, texts, valuetype)
+        else:
+            properties[name] = [Response.parse_valuetype(t.strip(), valuetype) for t in texts]
+
     @staticmethod
     def parse_valuetype(value, valuetype):
         """
@@ -826,3 +1519,48 @@ class Response(object):
         return '<wbem.cim.Response: %s, instances: %s, properties: %s>' % (
             self.method, len(self.instances), len(self.properties)
         )
+
+
+def iter_instances(xml_string, namespace, lazy=False, limits=None):
+    """
+    Parses the instances of an enumeration response one at a time. The XML is parsed incrementally and the
+    elements of every instance are dropped once it was yielded, so memory stays flat however large the response.
+    :param xml_string: The XML string
+    :param namespace: The namespace
+    :param lazy: Keep property values as raw text until they are accessed (see LazyProperties)
+    :param limits: Optional ParserLimits, only max_depth is checked here
+    :return: generator of Instance
+    """
+    if isinstance(xml_string, six.text_type):
+        xml_string = xml_string.encode('utf-8')
+    check_declarations(xml_string)
+    max_depth = limits.max_depth if limits is not None else None
+
+    stack = []
+    for event, elem in ET.iterparse(BytesIO(xml_string), events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            if max_depth is not None and len(stack) > max_depth:
+                raise LimitExceeded('The response is nested deeper than max_depth (%s)' % max_depth)
+            continue
+
+        stack.pop()
+        if elem.tag == 'VALUE.NAMEDINSTANCE':
+            instance = Response.parse_instance(elem.find('INSTANCENAME'), namespace)
+            instance.properties = Response.parse_properties(elem.find('INSTANCE'), lazy)
+        elif elem.tag == 'VALUE.INSTANCEWITHPATH':
+            instance_path_tag = elem.find('INSTANCEPATH')
+            instance = Response.parse_instance(
+                instance_path_tag.find('INSTANCENAME'), Response.parse_namespace(instance_path_tag) or namespace
+            )
+            instance.properties = Response.parse_properties(elem.find('INSTANCE'), lazy)
+        elif elem.tag == 'INSTANCENAME' and stack and stack[-1].tag == 'IRETURNVALUE':
+            instance = Response.parse_instance(elem, namespace)
+        elif elem.tag == 'ERROR':
+            Response.raise_error(elem)
+        else:
+            continue
+
+        elem.clear()
+        stack[-1].remove(elem)
+        yield instance
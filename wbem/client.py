@@ -29,18 +29,66 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import codecs
-import socket
+import collections
+import threading
+import time
+import weakref
 import six
 
-from .cim import CimError, Class, Instance, Methods, Response
+from .auth import BasicAuth, SessionCookies
+from .cim import CimError, Class, Instance, LimitExceeded, Methods, Response, Tags
+from .columns import Columns
 
+from .lazy import LazyModule
+
+# the HTTP and TLS stacks are imported on the first request
 if six.PY2:
-    import httplib as http_client
-    import urllib as urllib_parse
+    http_client = LazyModule('httplib')
+    urllib_parse = LazyModule('urllib')
 else:
-    import http.client as http_client
-    import urllib.parse as urllib_parse
+    http_client = LazyModule('http.client')
+    urllib_parse = LazyModule('urllib.parse')
+ssl = LazyModule('ssl')
+random = LazyModule('random')
+socket = LazyModule('socket')
+
+
+# TLS sessions per SSLContext and (hostname, port), so new connections can resume instead of a full handshake
+tls_sessions = weakref.WeakKeyDictionary()
+tls_lock = threading.Lock()
+_default_ssl_context = None
+
+
+def create_ssl_context(cafile=None, capath=None, certfile=None, keyfile=None, verify=True):
+    """
+    Creates an SSLContext for HTTPS clients. Create it once and pass it to every WBEMClient, so certificates are
+    loaded once and TLS sessions can be resumed across clients.
+    :param cafile: CA bundle file, the system CAs are used by default
+    :param capath: Directory of CA certificates
+    :param certfile: Client certificate file
+    :param keyfile: Client private key file, if not included in certfile
+    :param verify: Verify the server certificate and hostname. Disable only for self-signed test devices
+    :return: SSLContext
+    """
+    context = ssl.create_default_context(cafile=cafile, capath=capath)
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    if certfile:
+        context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+def default_ssl_context():
+    """
+    Returns the SSLContext shared by HTTPS clients that weren't given one
+    :return: SSLContext
+    """
+    global _default_ssl_context
+    with tls_lock:
+        if _default_ssl_context is None:
+            _default_ssl_context = create_ssl_context()
+        return _default_ssl_context
 
 
 class AuthenticationError(Exception):
@@ -51,9 +99,170 @@ class HttpError(Exception):
     pass
 
 
+class RequestTimeout(HttpError):
+    pass
+
+
+class CircuitOpen(HttpError):
+    pass
+
+
+class DeadlineReader(object):
+    """
+    Reads a response body a piece at a time and raises RequestTimeout once the deadline has passed. The socket
+    timeout only bounds each read, so a server trickling the body could otherwise hold a request long past it.
+    """
+
+    # most bytes taken by one read, a read returns what one recv() got anyway
+    piece_size = 64 * 1024
+
+    def __init__(self, response, sock, expires, read_timeout=None):
+        """
+        Initializer
+        :param response: HTTPResponse whose headers were read
+        :param sock: The socket of the connection
+        :param expires: Time the deadline passes
+        :param read_timeout: Longest wait for one read, if any
+        :return:
+        """
+        self.response = response
+        self.sock = sock
+        self.expires = expires
+        self.read_timeout = read_timeout
+        # read1() returns after one recv(), read() would wait for the whole piece
+        self._read = getattr(response, 'read1', response.read)
+
+    def read(self, size=None):
+        """
+        Reads size bytes, or up to the end of the body
+        :param size: Number of bytes, None for all
+        :return: bytes
+        """
+        pieces = []
+        length = 0
+        while size is None or length < size:
+            remaining = self.expires - time.time()
+            if remaining <= 0:
+                raise RequestTimeout('The deadline passed while reading the response')
+            self.sock.settimeout(min(self.read_timeout, remaining) if self.read_timeout else remaining)
+
+            piece = self._read(self.piece_size if size is None else min(self.piece_size, size - length))
+            if not piece:
+                break
+            pieces.append(piece)
+            length += len(piece)
+
+        return b''.join(pieces)
+
+
+class CircuitBreaker(object):
+    """
+    Fails requests to a host fast after repeated transport failures, so one dead CIMOM doesn't tie up every worker
+    of a poller. After reset_timeout seconds a single trial request is let through: if it succeeds the circuit
+    closes again, otherwise it stays open for another reset_timeout.
+
+    Breakers are shared by every WBEMClient talking to the same hostname and port.
+    """
+
+    breakers = dict()
+    lock = threading.Lock()
+
+    default_failure_threshold = 5
+    default_reset_timeout = 30
+
+    def __init__(self, failure_threshold=default_failure_threshold, reset_timeout=default_reset_timeout):
+        """
+        Initializer
+        :param failure_threshold: Consecutive failures that open the circuit
+        :param reset_timeout: Seconds the circuit stays open before a trial request
+        :return:
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    @classmethod
+    def get(cls, hostname, port, failure_threshold=None, reset_timeout=None):
+        """
+        Returns the breaker of a host, creating it if needed
+        :param hostname: The hostname
+        :param port: The port
+        :param failure_threshold: Consecutive failures that open the circuit. The breaker is shared, so a value
+            given here applies to every client of the host. None keeps the current (or default) value
+        :param reset_timeout: Seconds the circuit stays open before a trial request, None keeps the current value
+        :return: CircuitBreaker
+        """
+        with cls.lock:
+            breaker = cls.breakers.get((hostname, port))
+            if breaker is None:
+                breaker = cls.breakers[(hostname, port)] = cls()
+            if failure_threshold is not None:
+                breaker.failure_threshold = failure_threshold
+            if reset_timeout is not None:
+                breaker.reset_timeout = reset_timeout
+            return breaker
+
+    def check(self):
+        """
+        Raises CircuitOpen if requests to the host should not be attempted
+        :return: A token if the caller got the trial request, which must end with success(), failure() or
+            release(token). None otherwise
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return None
+            if self.trial or time.time() - self.opened_at < self.reset_timeout:
+                raise CircuitOpen('Too many failures, not sending requests for now')
+            self.trial = object()
+            return self.trial
+
+    def release(self, token):
+        """
+        Gives a trial back when it ended without telling whether the host is up, so the next request can try
+        :param token: The token check() returned
+        :return:
+        """
+        with self.lock:
+            if self.trial is token:
+                self.trial = False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+            self.trial = False
+
+
 class WBEMClient(object):
+    # responses with these statuses are retried
+    retry_statuses = (502, 503, 504)
+
+    # these methods are not safe to send twice, so they are only retried if the connection could not be made
+    # (a pull that reached the server moved the enumeration on, so sending it again would skip a page)
+    non_idempotent_methods = ('CreateInstance', 'ModifyInstance', 'DeleteInstance', 'CreateClass', 'ModifyClass',
+                              'DeleteClass', 'SetProperty', 'SetQualifier', 'DeleteQualifier',
+                              'PullInstancesWithPath')
+
+    # number of quoted header sets kept by imethod_headers()
+    header_cache_size = 1024
+
+    # most idle connections kept with keep_alive, one per thread that used the client at the same time is enough
+    max_idle_connections = 4
+
     def __init__(self, hostname, port=80, username=None, password=None,
-                 default_namespace='root/cimv2', debug=False, https=False):
+                 default_namespace='root/cimv2', debug=False, https=False,
+                 connect_timeout=30, read_timeout=300, deadline=None, max_attempts=5, backoff=0.5, max_backoff=30,
+                 auth=None, ssl_context=None, lazy_properties=False, keep_alive=False, limits=None,
+                 failure_threshold=None, reset_timeout=None):
         self.hostname = hostname
         self.port = port
         self.username = username
@@ -61,9 +270,29 @@ class WBEMClient(object):
         self.default_namespace = default_namespace
         self.debug = debug
         self.https = https
-        self.max_attempts = 5
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.circuit_breaker = CircuitBreaker.get(hostname, port, failure_threshold, reset_timeout)
+        self.auth = auth
+        if auth is None and username and password:
+            self.auth = BasicAuth(username, password)
+        self.cookies = SessionCookies()
+        self.ssl_context = ssl_context
+        self.lazy_properties = lazy_properties
+        self.keep_alive = keep_alive
+        self.limits = limits
+        # kept-alive connections that are not in use, any thread may take one for its next request
+        self._idle = collections.deque()
+        self.last_session_reused = None
+        self.header_cache = dict()
+        self._request_head = None
         self.last_request = None
         self.last_response = None
+        self.last_timings = None
 
     def Class(self, name, namespace=None):
         """
@@ -83,57 +312,99 @@ class WBEMClient(object):
         :return: Instance
         """
         if classname_or_instance_string.startswith('$cn=') or classname_or_instance_string.startswith('classname='):
-            return Instance.fromstring(classname_or_instance_string)
+            instance = Instance.fromstring(classname_or_instance_string)
+            if instance.namespace is None:
+                # tostring() leaves out the namespace when it is the default
+                instance.namespace = namespace or self.default_namespace
+            return instance
         else:
             return Instance(classname_or_instance_string, keybindings, namespace or self.default_namespace)
 
-    def request(self, xml, headers=None):
+    def request(self, xml, headers=None, idempotent=True):
+        """
+        Sends a request, retrying transport errors and busy servers with exponential backoff
+        :param xml: The XML string
+        :param headers: Dictionary of extra headers, a list of already quoted (name, value) pairs or an encoded
+            header block
+        :param idempotent: If False, the request is only retried when the connection could not be made
+        :return: The response body
+        """
         self.last_request = xml
         if self.debug:
             print(xml)
 
-        http_class = http_client.HTTPConnection
-        if self.https:
-            http_class = http_client.HTTPSConnection
-
-        c = http_class(self.hostname, port=self.port)
-
+        started = time.time()
+        timings = self.last_timings = dict(
+            build=0.0, connect=0.0, send=0.0, server=0.0, transfer=0.0, parse=0.0, total=0.0, bytes=0, attempts=0
+        )
         attempts = 0
-        while attempts < self.max_attempts:
-            attempts += 1
-
-            c.putrequest('POST', '/cimom')
-            c.putheader('Content-type', 'application/xml; charset="utf-8"')
-            c.putheader('Content-length', str(len(xml)))
-
-            if self.username and self.password:
-                auth = '%s:%s' % (self.username, self.password)
-                auth64 = codecs.encode(auth.encode('utf-8'), 'base64').decode('utf-8').replace('\n', '')
-                c.putheader('Authorization', 'Basic %s' % auth64)
-
-            if headers:
-                for k, v in headers.items():
-                    if six.PY2 and isinstance(k, six.text_type):
-                        k = k.encode('utf-8')
-                    if six.PY2 and isinstance(v, six.text_type):
-                        v = v.encode('utf-8')
-                    c.putheader(urllib_parse.quote(k), urllib_parse.quote(v))
-
-            try:
-                c.endheaders()
-
+        challenged = False
+        reconnect = False
+        trial = None
+        try:
+            while True:
+                attempts += 1
+                if not reconnect:
+                    trial = self.circuit_breaker.check() or trial
+                reconnect = False
+
+                connected = False
+                reused = False
+                timings['attempts'] += 1
                 try:
-                    c.send(xml)
-                except socket.error as ex:
-                    raise HttpError(str(ex))
-
-                response = c.getresponse()
-                body = response.read()
+                    c = self.kept_connection()
+                    if c is None:
+                        t = time.time()
+                        c = self.connect(self.remaining(started))
+                        timings['connect'] += time.time() - t
+                    else:
+                        reused = True
+                    connected = True
+                    response, body = self.send(c, xml, headers, self.remaining(started))
+                except LimitExceeded:
+                    # the server answered, it's the response that isn't accepted
+                    self.circuit_breaker.success()
+                    raise
+                except RequestTimeout:
+                    # the deadline passed, there is no time left for another attempt
+                    if connected:
+                        self.circuit_breaker.failure()
+                    raise
+                except (socket.error, http_client.HTTPException) as ex:
+                    if reused and idempotent and not isinstance(ex, socket.timeout):
+                        # the server closed the idle connection, try again on a new one
+                        attempts -= 1
+                        reconnect = True
+                        continue
+
+                    self.circuit_breaker.failure()
+                    if isinstance(ex, socket.timeout):
+                        error = RequestTimeout('Timed out: %s' % ex)
+                    elif isinstance(ex, http_client.BadStatusLine):
+                        error = HttpError('The web server returned a bad status line: %s' % ex)
+                    else:
+                        error = HttpError('Socket error: %s' % ex)
+
+                    if (connected and not idempotent) or not self.retry(attempts, started):
+                        raise error
+                    continue
+
+                if response.status in self.retry_statuses:
+                    self.circuit_breaker.failure()
+                    if self.retry(attempts, started):
+                        continue
+                else:
+                    self.circuit_breaker.success()
+
+                if response.status == 401 and not challenged and self.auth and self.auth.challenge(response):
+                    # answer the challenge right away, it doesn't count as an attempt
+                    challenged = True
+                    attempts -= 1
+                    continue
 
                 if response.status != 200:
                     if response.status == 401:
-                        if attempts >= self.max_attempts:
-                            raise AuthenticationError(response.reason)
+                        raise AuthenticationError(response.reason)
 
                     if response.getheader('CIMError', None) and response.getheader('PGErrorDetail'):
                         raise CimError('%s: %s' % (
@@ -142,26 +413,311 @@ class WBEMClient(object):
                         )
 
                     raise CimError(response.reason)
-            except http_client.BadStatusLine as ex:
-                raise HttpError('The web server returned a bad status line: %s' % ex)
-            except socket.error as ex:
-                raise HttpError('Socket error: %s' % ex)
 
-            break
+                break
+        finally:
+            if trial is not None:
+                # a trial that ended without success() or failure() (certificate error, deadline, ...)
+                # mustn't keep the circuit open for good
+                self.circuit_breaker.release(trial)
 
         if self.debug:
             print(body)
 
+        timings['bytes'] = len(body)
+        timings['total'] = time.time() - started
         self.last_response = body
         return body
 
-    def imethodcall(self, method, class_or_instance_obj, xml):
+    def remaining(self, started):
+        """
+        Returns the seconds left before the deadline
+        :param started: Time the operation started
+        :return: Seconds, or None if there is no deadline. Raises RequestTimeout if the deadline has passed
+        """
+        if not self.deadline:
+            return None
+
+        remaining = self.deadline - (time.time() - started)
+        if remaining <= 0:
+            raise RequestTimeout('The deadline of %ss has passed' % self.deadline)
+        return remaining
+
+    def retry(self, attempts, started):
+        """
+        Sleeps before the next attempt, with exponential backoff and full jitter
+        :param attempts: Number of attempts made so far
+        :param started: Time the operation started
+        :return: False if no attempts are left
+        """
+        if attempts >= self.max_attempts:
+            return False
+
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempts - 1)))
+        if self.deadline and time.time() - started + delay >= self.deadline:
+            return False
+
+        time.sleep(delay)
+        return True
+
+    def connect(self, remaining=None):
+        """
+        Opens a connection to the CIMOM. HTTPS connections use the client's SSLContext (or the shared default one)
+        and resume the last TLS session to the host when possible.
+        :param remaining: Seconds left before the deadline, if any
+        :return: HTTPConnection
+        """
+        timeout = self.connect_timeout
+        if remaining is not None:
+            timeout = min(timeout, remaining) if timeout else remaining
+
+        c = http_client.HTTPConnection(self.hostname, port=self.port, timeout=timeout)
+        if not self.https:
+            c.connect()
+            return c
+
+        context = self.ssl_context or default_ssl_context()
+        with tls_lock:
+            session = tls_sessions.get(context, dict()).get((self.hostname, self.port))
+
+        sock = socket.create_connection((self.hostname, self.port), timeout)
+        # same as HTTPConnection.connect(), otherwise the body waits for the ACK of the headers
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            if session is not None:
+                c.sock = context.wrap_socket(sock, server_hostname=self.hostname, session=session)
+            else:
+                c.sock = context.wrap_socket(sock, server_hostname=self.hostname)
+        except ssl.CertificateError as ex:
+            sock.close()
+            # not a socket error, so it isn't retried: retrying won't help, and the host is up
+            raise HttpError('Certificate verification failed: %s' % ex)
+        except Exception:
+            sock.close()
+            raise
+
+        self.last_session_reused = getattr(c.sock, 'session_reused', None)
+        return c
+
+    def save_tls_session(self, c):
+        """
+        Keeps the TLS session of a connection for the next connect(). TLS 1.3 servers send session tickets after
+        the handshake, so this is called once a response was read.
+        :param c: HTTPConnection
+        :return:
+        """
+        session = getattr(c.sock, 'session', None)
+        if session is None:
+            return
+
+        with tls_lock:
+            sessions = tls_sessions.get(c.sock.context)
+            if sessions is None:
+                sessions = tls_sessions[c.sock.context] = dict()
+            sessions[(self.hostname, self.port)] = session
+
+    def send(self, c, xml, headers=None, remaining=None):
+        """
+        Sends the request on an open connection and reads the response. The request is built as bytes and written
+        with one call: scatter-gather sendmsg() on plain sockets, so the body isn't copied, or a single sendall()
+        of head and body joined together over TLS.
+        :param c: HTTPConnection
+        :param xml: The XML as bytes (or a bytes-like object). Text is encoded as UTF-8
+        :param headers: Dictionary of extra headers, a list of already quoted (name, value) pairs or an encoded
+            header block
+        :param remaining: Seconds left before the deadline, if any
+        :return: (HTTPResponse, body)
+        """
+        timeout = self.read_timeout
+        expires = None
+        if remaining is not None:
+            timeout = min(timeout, remaining) if timeout else remaining
+            expires = time.time() + remaining
+        c.sock.settimeout(timeout)
+
+        timings = self.last_timings if self.last_timings is not None else dict()
+        t = time.time()
+        if isinstance(xml, six.text_type):
+            xml = xml.encode('utf-8')
+        body = memoryview(xml)
+
+        if isinstance(headers, dict):
+            headers = self.quote_headers(headers)
+        if not isinstance(headers, bytes):
+            headers = self.header_block(headers or [])
+
+        head = [self.request_head, b'Content-length: ', str(body.nbytes).encode('ascii'), b'\r\n']
+        if self.auth:
+            head.append(self.header_block(self.auth.headers('POST', '/cimom').items()))
+        head.append(self.header_block(self.cookies.headers().items()))
+        head.append(headers)
+        head.append(b'\r\n')
+        head = b''.join(head)
+        timings['build'] = timings.get('build', 0.0) + time.time() - t
+
+        keep = False
+        try:
+            t = time.time()
+            if hasattr(c.sock, 'sendmsg') and not self.https:
+                sent = c.sock.sendmsg([head, body])
+                if sent < len(head):
+                    c.sock.sendall(head[sent:])
+                    sent = len(head)
+                if sent - len(head) < body.nbytes:
+                    c.sock.sendall(body[sent - len(head):])
+            else:
+                c.sock.sendall(head + body.tobytes() if six.PY2 else b''.join((head, body)))
+            sent = time.time()
+
+            response = http_client.HTTPResponse(c.sock, method='POST')
+            response.begin()
+            first_byte = time.time()
+            stream = response
+            if expires is not None:
+                stream = DeadlineReader(response, c.sock, expires, self.read_timeout)
+            if self.limits is None:
+                body = stream.read()
+            else:
+                # the connection is closed below when a limit stops the read
+                body = self.limits.read(stream, response.length)
+            response.close()
+
+            timings['send'] = timings.get('send', 0.0) + sent - t
+            timings['server'] = timings.get('server', 0.0) + first_byte - sent
+            timings['transfer'] = timings.get('transfer', 0.0) + time.time() - first_byte
+            self.cookies.update(response)
+            if self.https:
+                self.save_tls_session(c)
+            keep = self.keep_alive and not response.will_close
+        finally:
+            if keep and len(self._idle) < self.max_idle_connections:
+                self._idle.append(c)
+            else:
+                c.close()
+
+        return response, body
+
+    def kept_connection(self):
+        """
+        Takes the most recently used idle connection kept alive by a previous request
+        :return: HTTPConnection or None
+        """
+        try:
+            return self._idle.pop()
+        except IndexError:
+            return None
+
+    def close(self):
+        """
+        Closes the idle connections kept alive, if any
+        :return:
+        """
+        c = self.kept_connection()
+        while c is not None:
+            c.close()
+            c = self.kept_connection()
+
+    @property
+    def request_head(self):
+        """
+        The request line and the headers that are the same for every request
+        :return: bytes
+        """
+        if self._request_head is None:
+            host = self.hostname
+            if ':' in host and not host.startswith('['):
+                host = '[%s]' % host
+            self._request_head = self.header_block([
+                ('Host', '%s:%s' % (host, self.port)),
+                ('Accept-Encoding', 'identity'),
+                ('Content-type', 'application/xml; charset="utf-8"'),
+            ], 'POST /cimom HTTP/1.1')
+        return self._request_head
+
+    @staticmethod
+    def header_block(headers, first_line=None):
+        """
+        Encodes header lines
+        :param headers: List of (name, value) pairs
+        :param first_line: Optional line to put before the headers (ex: the request line)
+        :return: bytes
+        """
+        lines = ['%s: %s\r\n' % (k, v) for k, v in headers]
+        if first_line:
+            lines.insert(0, first_line + '\r\n')
+        return ''.join(lines).encode('latin-1')
+
+    def imethodcall(self, method, class_or_instance_obj, xml, parser=None, extrinsic=False):
+        """
+        Sends an intrinsic method call and parses the response. Afterwards last_timings holds the seconds spent on
+        each phase of the call (build, connect, send, server, transfer, parse and total), the response size in
+        bytes and the number of attempts.
+        :param method: The method name
+        :param class_or_instance_obj: Class or Instance object
+        :param xml: The request XML
+        :param parser: Function called with (body, namespace), defaults to Response. A parser that returns a
+            generator (see iter_instances) parses as it is consumed, so parse and total don't include that
+        :param extrinsic: The method is an extrinsic method of the class (see InvokeMethod). Those may change
+            data, so they are only retried when the connection could not be made
+        :return: The parser's result
+        """
+        started = time.time()
+        if extrinsic:
+            headers = self.method_headers(method, class_or_instance_obj)
+            idempotent = False
+        else:
+            headers = self.imethod_headers(method, class_or_instance_obj)
+            idempotent = method not in self.non_idempotent_methods
+        build = time.time() - started
+        response = self.request(xml, headers, idempotent)
+        timings = self.last_timings
+        timings['build'] += build
+
+        t = time.time()
+        namespace = class_or_instance_obj.namespace or self.default_namespace
+        if parser is None:
+            result = Response(response, namespace, self.lazy_properties, self.limits)
+        else:
+            result = parser(response, namespace)
+
+        now = time.time()
+        timings['parse'] = now - t
+        timings['total'] = now - started
+        return result
+
+    def imethod_headers(self, method, class_or_instance_obj):
+        """
+        Returns the encoded CIM headers for an intrinsic method call. They are cached per method and target, so
+        repeated calls on the same objects (ex: GetInstance in a polling loop) skip building and quoting them.
+        :param method: The method name
+        :param class_or_instance_obj: Class or Instance object
+        :return: Header block as bytes
+        """
+        if isinstance(class_or_instance_obj, Instance):
+            key = (method, class_or_instance_obj.namespace, class_or_instance_obj.classname,
+                   tuple(class_or_instance_obj.keybindings.items()))
+        elif isinstance(class_or_instance_obj, Class):
+            key = (method, class_or_instance_obj.namespace, class_or_instance_obj.name)
+        else:
+            key = (method, )
+
+        try:
+            return self.header_cache[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable keybinding values, don't cache
+            key = None
+
         headers = dict(
             CIMOperation='MethodCall',
             CIMMethod=method
         )
 
-        if isinstance(class_or_instance_obj, Class):
+        if isinstance(class_or_instance_obj, Class) and not class_or_instance_obj.name:
+            # no target class, the operation is on the namespace
+            headers['CIMObject'] = class_or_instance_obj.namespace
+        elif isinstance(class_or_instance_obj, Class):
             headers['CIMObject'] = '%s:%s' % (class_or_instance_obj.name, class_or_instance_obj.namespace)
         elif isinstance(class_or_instance_obj, Instance):
             s = '//%s/%s:%s.' % (self.hostname, class_or_instance_obj.namespace, class_or_instance_obj.classname)
@@ -174,9 +730,60 @@ class WBEMClient(object):
 
             headers['CIMObject'] = s + ','.join(kbs)
 
-        response = self.request(xml, headers)
-        namespace = class_or_instance_obj.namespace or self.default_namespace
-        return Response(response, namespace)
+        block = self.header_block(self.quote_headers(headers))
+        if key is not None:
+            if len(self.header_cache) >= self.header_cache_size:
+                self.header_cache.clear()
+            self.header_cache[key] = block
+
+        return block
+
+    def method_headers(self, method, class_or_instance_obj):
+        """
+        Returns the encoded CIM headers for an extrinsic method call. CIMObject is the local path of the target with
+        quoted string keys, which CIMOMs compare to the path in the request.
+        :param method: The method name
+        :param class_or_instance_obj: Class or Instance object
+        :return: Header block as bytes
+        """
+        if isinstance(class_or_instance_obj, Instance):
+            kbs = []
+            for k, v in sorted(class_or_instance_obj.keybindings.items()):
+                valuetype = None
+                if isinstance(v, (list, tuple)):
+                    v, valuetype = v
+                v, detected_type = Tags.autodetect_valuetype(v)
+
+                if (valuetype or detected_type) in ('string', 'datetime'):
+                    v = '"%s"' % v.replace('\\', '\\\\').replace('"', '\\"')
+                kbs.append('%s=%s' % (k, v))
+
+            path = '%s:%s.%s' % (class_or_instance_obj.namespace, class_or_instance_obj.classname, ','.join(kbs))
+        else:
+            path = '%s:%s' % (class_or_instance_obj.namespace, class_or_instance_obj.name)
+
+        return self.header_block(self.quote_headers(dict(
+            CIMOperation='MethodCall',
+            CIMMethod=method,
+            CIMObject=path
+        )))
+
+    @staticmethod
+    def quote_headers(headers):
+        """
+        URL-quotes header names and values
+        :param headers: Dictionary of headers
+        :return: List of quoted (name, value) pairs
+        """
+        quoted = []
+        for k, v in headers.items():
+            if six.PY2 and isinstance(k, six.text_type):
+                k = k.encode('utf-8')
+            if six.PY2 and isinstance(v, six.text_type):
+                v = v.encode('utf-8')
+            quoted.append((urllib_parse.quote(k), urllib_parse.quote(v)))
+
+        return quoted
 
     def GetClass(self, class_obj):
         return self.imethodcall('GetClass', class_obj, Methods.GetClass(class_obj))
@@ -184,8 +791,10 @@ class WBEMClient(object):
     def EnumerateClasses(self, class_obj):
         return self.imethodcall('EnumerateClasses', class_obj, Methods.EnumerateClasses(class_obj))
 
-    def EnumerateClassNames(self, class_obj):
-        return self.imethodcall('EnumerateClassNames', class_obj, Methods.EnumerateClassNames(class_obj))
+    def EnumerateClassNames(self, class_obj, deep_inheritance=False):
+        return self.imethodcall(
+            'EnumerateClassNames', class_obj, Methods.EnumerateClassNames(class_obj, deep_inheritance)
+        )
 
     def GetInstance(self, instance_obj):
         return self.imethodcall('GetInstance', instance_obj, Methods.GetInstance(instance_obj))
@@ -195,3 +804,63 @@ class WBEMClient(object):
 
     def EnumerateInstanceNames(self, class_obj):
         return self.imethodcall('EnumerateInstanceNames', class_obj, Methods.EnumerateInstanceNames(class_obj))
+
+    def OpenEnumerateInstances(self, class_obj, max_object_count=1000):
+        """
+        Starts a pulled enumeration, which returns large results in pages. Continue with PullInstancesWithPath()
+        while the response's end_of_sequence is False.
+        :param class_obj: Class object
+        :param max_object_count: Most instances per page
+        :return: Response with instances, enumeration_context and end_of_sequence
+        """
+        return self.imethodcall(
+            'OpenEnumerateInstances', class_obj, Methods.OpenEnumerateInstances(class_obj, max_object_count)
+        )
+
+    def PullInstancesWithPath(self, class_obj, enumeration_context, max_object_count=1000):
+        return self.imethodcall(
+            'PullInstancesWithPath', self.Class('', class_obj.namespace),
+            Methods.PullInstancesWithPath(class_obj, enumeration_context, max_object_count)
+        )
+
+    def CloseEnumeration(self, class_obj, enumeration_context):
+        return self.imethodcall(
+            'CloseEnumeration', self.Class('', class_obj.namespace),
+            Methods.CloseEnumeration(class_obj, enumeration_context)
+        )
+
+    def CreateInstance(self, instance_obj):
+        return self.imethodcall('CreateInstance', instance_obj, Methods.CreateInstance(instance_obj))
+
+    def DeleteInstance(self, instance_obj):
+        return self.imethodcall('DeleteInstance', instance_obj, Methods.DeleteInstance(instance_obj))
+
+    def InvokeMethod(self, class_or_instance_obj, method, params=None):
+        """
+        Calls an extrinsic method
+        :param class_or_instance_obj: The Instance object, or a Class object for static methods
+        :param method: The method name
+        :param params: Optional dictionary or list of (name, value) input parameters. A (value, type) tuple gives
+            the CIM type, otherwise it is auto-detected. Lists are sent as arrays and Instance values as references
+        :return: Response with return_value and the output parameters in params
+        """
+        return self.imethodcall(
+            method, class_or_instance_obj, Methods.InvokeMethod(class_or_instance_obj, method, params), extrinsic=True
+        )
+
+    def EnumerateInstanceColumns(self, class_obj, properties=None, pool=None):
+        """
+        Same as EnumerateInstances, but the response is parsed straight into columns without building
+        Instance objects
+        :param class_obj: Class object
+        :param properties: Optional list of property names to keep
+        :param pool: Optional wbem.parsing.ParserPool to parse large responses in another process
+        :return: Columns
+        """
+        max_depth = self.limits.max_depth if self.limits is not None else None
+        if pool is not None:
+            parser = lambda xml, namespace: pool.parse(xml, namespace, properties, max_depth)
+        else:
+            parser = lambda xml, namespace: Columns.fromxml(xml, namespace, properties, max_depth)
+
+        return self.imethodcall('EnumerateInstances', class_obj, Methods.EnumerateInstances(class_obj), parser=parser)
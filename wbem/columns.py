@@ -0,0 +1,326 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import array
+import datetime
+from io import BytesIO
+
+import six
+
+from .cim import ET, LimitExceeded, Response, check_declarations
+
+from .lazy import LazyModule, available
+
+# NumPy is optional, columns are plain arrays without it. It is only imported when a NumPy array is asked for.
+numpy = LazyModule('numpy')
+
+
+# array typecodes for the fixed-size CIM types, anything else is kept in a list
+typecodes = dict(
+    boolean='B',
+    uint8='B',
+    sint8='b',
+    uint16='H',
+    sint16='h',
+    uint32='I',
+    sint32='i',
+    uint64='Q',
+    sint64='q',
+    real32='f',
+    real64='d',
+)
+
+try:
+    array.array('Q')
+except ValueError:
+    # Python 2.x has no 64-bit typecodes, so those values go into lists
+    del typecodes['uint64'], typecodes['sint64']
+
+
+class Columns(object):
+    """
+    Column-oriented storage for enumerated instances. Each property becomes one typed array (or a list for strings,
+    datetimes and array values) and the instance names are kept in the keys column, in the same order. Rows where
+    a property is missing are filled with 0 (NaN for reals, None for lists) and flagged in the nulls mask for
+    that property.
+
+    Example:
+        columns = client.EnumerateInstanceColumns(client.Class('CIM_BlockStorageStatisticalData'))
+        reads = columns.array('ReadIOs')    # numpy.ndarray if NumPy is installed, array.array otherwise
+    """
+
+    def __init__(self, properties=None):
+        """
+        Initializer
+        :param properties: Optional list of property names to keep, all properties are kept by default
+        :return:
+        """
+        self.properties = set(properties) if properties else None
+        self.keys = []
+        self.columns = dict()
+        self.types = dict()
+        self.nulls = dict()
+
+    @classmethod
+    def fromxml(cls, xml_string, namespace, properties=None, max_depth=None):
+        """
+        Parses an enumeration response straight into columns. The XML is parsed incrementally and every
+        instance is discarded once its values have been copied to the columns.
+        :param xml_string: The XML string
+        :param namespace: The namespace
+        :param properties: Optional list of property names to keep
+        :param max_depth: Optional deepest element nesting, raises LimitExceeded past it (see ParserLimits)
+        :return: Columns
+        """
+        if isinstance(xml_string, six.text_type):
+            xml_string = xml_string.encode('utf-8')
+        check_declarations(xml_string)
+
+        columns = cls(properties)
+        stack = []
+        for event, elem in ET.iterparse(BytesIO(xml_string), events=('start', 'end')):
+            if event == 'start':
+                stack.append(elem)
+                if max_depth is not None and len(stack) > max_depth:
+                    raise LimitExceeded('The response is nested deeper than max_depth (%s)' % max_depth)
+                continue
+
+            stack.pop()
+            if elem.tag == 'VALUE.NAMEDINSTANCE':
+                columns.append_element(elem.find('INSTANCENAME'), elem.find('INSTANCE'), namespace)
+            elif elem.tag == 'INSTANCENAME' and stack and stack[-1].tag == 'IRETURNVALUE':
+                columns.append_element(elem, None, namespace)
+            elif elem.tag == 'ERROR':
+                Response.raise_error(elem)
+            else:
+                continue
+
+            # drop the parsed instance so memory stays flat for large enumerations
+            elem.clear()
+            stack[-1].remove(elem)
+
+        return columns
+
+    @classmethod
+    def frominstances(cls, instances, properties=None):
+        """
+        Builds columns from already parsed Instance objects. CIM types are not kept on Instance properties,
+        so the column types are guessed from the Python values.
+        :param instances: List of Instance objects
+        :param properties: Optional list of property names to keep
+        :return: Columns
+        """
+        columns = cls(properties)
+        for instance in instances:
+            columns.keys.append(instance.tostring())
+            for name, value in instance.properties.items():
+                if columns.properties is not None and name not in columns.properties:
+                    continue
+                columns.set(name, value, columns.types.get(name) or cls.guess_valuetype(value))
+            columns.fill()
+
+        return columns
+
+    @staticmethod
+    def guess_valuetype(value):
+        """
+        Guesses the CIM type of a parsed property value
+        :param value: The value
+        :return: CIM type
+        """
+        if isinstance(value, bool):
+            return 'boolean'
+        if isinstance(value, six.integer_types):
+            return 'sint64'
+        if isinstance(value, float):
+            return 'real64'
+        if isinstance(value, (datetime.datetime, datetime.timedelta)):
+            return 'datetime'
+        return 'string'
+
+    def append_element(self, instance_name_tag, instance_tag, namespace):
+        """
+        Appends one row from INSTANCENAME and INSTANCE elements
+        :param instance_name_tag: The INSTANCENAME element
+        :param instance_tag: The INSTANCE element or None
+        :param namespace: The namespace
+        :return:
+        """
+        self.append_properties(Response.parse_instance(instance_name_tag, namespace).tostring(), instance_tag)
+
+    def append_properties(self, key, instance_tag):
+        """
+        Appends one row from the properties of an INSTANCE element
+        :param key: The value for the keys column, usually Instance.tostring()
+        :param instance_tag: The INSTANCE element or None
+        :return:
+        """
+        self.keys.append(key)
+        if instance_tag is not None:
+            for p in instance_tag:
+                if p.tag != 'PROPERTY' and p.tag != 'PROPERTY.ARRAY':
+                    continue
+
+                name = p.attrib['NAME']
+                if self.properties is not None and name not in self.properties:
+                    continue
+
+                valuetype = p.attrib['TYPE']
+                value_e = p.find('VALUE')
+                if value_e is not None:
+                    if value_e.text is None:
+                        continue
+                    self.set(name, self.decode(value_e.text, valuetype), valuetype)
+                else:
+                    value_array_e = p.find('VALUE.ARRAY')
+                    if value_array_e is not None:
+                        values = [Response.parse_valuetype(v.text.strip(), valuetype)
+                                  for v in value_array_e.findall('VALUE')]
+                        self.set(name, values, valuetype)
+
+        self.fill()
+
+    @staticmethod
+    def decode(text, valuetype):
+        """
+        Decodes a VALUE text, taking a shortcut for the numeric types stored in arrays
+        :param text: The raw value
+        :param valuetype: The CIM type
+        :return: Parsed value
+        """
+        typecode = typecodes.get(valuetype)
+        if typecode is None:
+            return Response.parse_valuetype(text.strip(), valuetype)
+        if valuetype == 'boolean':
+            return 1 if text.strip().upper() == 'TRUE' else 0
+        if typecode in 'fd':
+            return float(text)
+        return int(text)
+
+    def set(self, name, value, valuetype):
+        """
+        Sets the value of a property for the current (last) row
+        :param name: Property name
+        :param value: Parsed value
+        :param valuetype: CIM type
+        :return:
+        """
+        column = self.columns.get(name)
+        if column is None:
+            typecode = typecodes.get(valuetype)
+            if typecode and not isinstance(value, (list, tuple)):
+                column = array.array(typecode)
+            else:
+                column = []
+            self.columns[name] = column
+            self.types[name] = valuetype
+            self.pad(name, len(self.keys) - 1)
+
+        try:
+            column.append(value)
+        except (TypeError, OverflowError):
+            # the value doesn't fit the typed array, fall back to a list for this column
+            column = self.columns[name] = column.tolist()
+            column.append(value)
+
+        nulls = self.nulls.get(name)
+        if nulls is not None:
+            nulls.append(0)
+
+    def pad(self, name, length):
+        """
+        Pads a column with null values up to the given length
+        :param name: Property name
+        :param length: The length to pad to
+        :return:
+        """
+        column = self.columns[name]
+        missing = length - len(column)
+        if missing <= 0:
+            return
+
+        nulls = self.nulls.get(name)
+        if nulls is None:
+            nulls = self.nulls[name] = array.array('B', [0]) * len(column)
+        nulls.extend(array.array('B', [1]) * missing)
+
+        if isinstance(column, array.array):
+            fill = float('nan') if column.typecode in 'fd' else 0
+            column.extend(array.array(column.typecode, [fill]) * missing)
+        else:
+            column.extend([None] * missing)
+
+    def fill(self):
+        """
+        Pads every column that didn't get a value in the current row
+        :return:
+        """
+        length = len(self.keys)
+        for name in self.columns:
+            self.pad(name, length)
+
+    def array(self, name):
+        """
+        Returns a column as a NumPy array if NumPy is installed, otherwise the column itself
+        :param name: Property name
+        :return: numpy.ndarray, array.array or list
+        """
+        column = self.columns[name]
+        if not available(numpy):
+            return column
+        if isinstance(column, array.array):
+            # copy so the array.array can keep growing
+            return numpy.frombuffer(column, dtype=column.typecode).copy()
+        return numpy.array(column, dtype=object)
+
+    def to_numpy(self):
+        """
+        Returns all columns as NumPy arrays
+        :return: Dictionary of property name to numpy.ndarray
+        """
+        if not available(numpy):
+            raise ImportError('NumPy is required for to_numpy()')
+
+        return dict((name, self.array(name)) for name in self.columns)
+
+    def __len__(self):
+        """
+        Number of rows
+        :return: int
+        """
+        return len(self.keys)
+
+    def __repr__(self):
+        """
+        String representation of the Columns
+        :return: string
+        """
+        return '<wbem.columns.Columns: rows: %s, columns: %s>' % (len(self.keys), len(self.columns))
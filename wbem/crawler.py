@@ -0,0 +1,370 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import json
+import os
+import threading
+import time
+import traceback
+
+from six.moves import queue
+
+from .cim import CimError, InvalidMethod, NotSupported
+from .client import AuthenticationError, HttpError
+from .snapshot import Snapshot, SnapshotWriter
+
+checkpoint_name = 'checkpoint.json'
+
+
+def load_checkpoint(path):
+    """
+    Reads the checkpoint of an inventory directory
+    :param path: The inventory directory
+    :return: Dictionary, or None if there is no checkpoint yet
+    """
+    try:
+        with open(os.path.join(path, checkpoint_name)) as f:
+            return json.load(f)
+    except (IOError, OSError):
+        return None
+
+
+class Crawler(object):
+    """
+    Takes an inventory of a namespace: the names of all classes (below root_class, if given) are listed with
+    one EnumerateClassNames call, then the instances of every class are enumerated on a pool of worker threads
+    and streamed into one snapshot file per class in the inventory directory.
+
+    Large classes are enumerated in pages with OpenEnumerateInstances/PullInstancesWithPath, so they never have
+    to fit in one response. CIMOMs that don't support pulled enumerations fall back to EnumerateInstances.
+
+    Enumerating a class also returns the instances of its subclasses, which have their own enumeration, so only
+    the instances of exactly the enumerated class are kept and every instance is stored once.
+
+    Progress is saved to a checkpoint file. Running a crawler on the same directory again skips the classes that
+    are done and retries the ones that failed, so an interrupted crawl of a large device resumes where it stopped.
+
+    Example:
+        crawler = Crawler(client, 'array-inventory', workers=8)
+        inventory = crawler.run()
+        for instance in inventory:
+            ...
+    """
+
+    def __init__(self, client, path, root_class=None, workers=4, page_size=1000, max_attempts=3,
+                 checkpoint_interval=5, progress=None):
+        """
+        Initializer
+        :param client: WBEMClient object, ideally with keep_alive=True. It is shared by the workers.
+        :param path: The inventory directory, created if needed
+        :param root_class: Only crawl this class and its subclasses, all classes of the namespace by default
+        :param workers: Number of classes enumerated at the same time
+        :param page_size: Instances per pulled page
+        :param max_attempts: Attempts per class after transport errors before it is recorded as failed
+        :param checkpoint_interval: Most seconds between checkpoint saves
+        :param progress: Optional function called with (classname, number of instances) after every class
+        :return:
+        """
+        self.client = client
+        self.path = path
+        self.root_class = root_class
+        self.workers = workers
+        self.page_size = page_size
+        self.max_attempts = max_attempts
+        self.checkpoint_interval = checkpoint_interval
+        self.progress = progress
+        self.pull = True
+        self.stopped = False
+        self.classes = []
+        self.done = dict()
+        self.failed = dict()
+        self.saved = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        checkpoint = load_checkpoint(path)
+        if checkpoint is not None:
+            if checkpoint['namespace'] != client.default_namespace or checkpoint['root_class'] != root_class:
+                raise ValueError('%s holds an inventory of another namespace or class' % path)
+            self.classes = checkpoint['classes']
+            self.done = checkpoint['done']
+
+    def snapshot_path(self, classname):
+        """
+        Returns the path of the snapshot file of a class
+        :param classname: The class name
+        :return: string
+        """
+        return os.path.join(self.path, classname + '.snap')
+
+    def list_classes(self):
+        """
+        Returns the names of the classes to crawl
+        :return: List of class names
+        """
+        class_obj = self.client.Class(self.root_class or '')
+        names = self.client.EnumerateClassNames(class_obj, deep_inheritance=True).classnames
+        if self.root_class:
+            names.insert(0, self.root_class)
+        return names
+
+    def run(self):
+        """
+        Crawls the classes that are not done yet and waits for the workers to finish
+        :return: Inventory
+        """
+        if not self.classes:
+            self.classes = self.list_classes()
+            self.save_checkpoint()
+
+        self.failed = dict()
+        pending = [c for c in self.classes if c not in self.done]
+        for classname in pending:
+            self._queue.put((classname, 1))
+
+        threads = [threading.Thread(target=self._work) for _ in range(min(self.workers, len(pending)))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+        self._queue.join()
+        for _ in threads:
+            self._queue.put(None)
+        for t in threads:
+            t.join()
+
+        self.save_checkpoint()
+        return Inventory(self.path)
+
+    def stop(self):
+        """
+        Stops the crawl after the classes that are being enumerated. Classes that weren't started stay pending
+        in the checkpoint.
+        :return:
+        """
+        self.stopped = True
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                self._queue.task_done()
+                return
+
+            classname, attempt = task
+            try:
+                if not self.stopped:
+                    self.crawl_class(classname, attempt)
+            finally:
+                self._queue.task_done()
+
+    def crawl_class(self, classname, attempt):
+        """
+        Enumerates one class into its snapshot file and records it in the checkpoint. A failed class is put back
+        in the queue until it ran out of attempts.
+        :param classname: The class name
+        :param attempt: Number of this attempt
+        :return:
+        """
+        writer = None
+        count = 0
+        try:
+            for instances in self.pages(self.client.Class(classname)):
+                for instance in instances:
+                    if instance.classname.lower() != classname.lower():
+                        # enumerated with its own class
+                        continue
+                    if writer is None:
+                        writer = SnapshotWriter(self.snapshot_path(classname))
+                    writer.append(instance)
+                    count += 1
+            if writer is not None:
+                writer.close()
+        except Exception as ex:
+            if writer is not None:
+                writer.discard()
+
+            if isinstance(ex, HttpError) and attempt < self.max_attempts:
+                # transport errors are worth another try once the other classes had their turn
+                self._queue.put((classname, attempt + 1))
+                return
+            if not isinstance(ex, (CimError, HttpError, AuthenticationError)):
+                traceback.print_exc()
+            with self._lock:
+                self.failed[classname] = str(ex)
+            return
+
+        with self._lock:
+            self.done[classname] = count
+        if self.progress is not None:
+            try:
+                self.progress(classname, count)
+            except Exception:
+                # a failing callback shouldn't take the worker thread down with it
+                traceback.print_exc()
+        if time.time() - self.saved >= self.checkpoint_interval:
+            self.save_checkpoint()
+
+    def pages(self, class_obj):
+        """
+        Yields the instances of a class a page at a time
+        :param class_obj: Class object
+        :return: Generator of lists of Instance objects
+        """
+        if self.pull:
+            try:
+                response = self.client.OpenEnumerateInstances(class_obj, self.page_size)
+            except (NotSupported, InvalidMethod):
+                response = None
+
+            if response is not None:
+                try:
+                    yield response.instances
+                    while not response.end_of_sequence:
+                        if response.end_of_sequence is None or not response.enumeration_context:
+                            # the enumeration can't be continued, and treating it as complete would write a
+                            # partial snapshot
+                            raise CimError('%s: pulled enumeration without EndOfSequence or EnumerationContext' % (
+                                class_obj.name
+                            ))
+                        response = self.client.PullInstancesWithPath(
+                            class_obj, response.enumeration_context, self.page_size
+                        )
+                        yield response.instances
+                finally:
+                    if not response.end_of_sequence and response.enumeration_context:
+                        # stopped early, let the server free the enumeration
+                        try:
+                            self.client.CloseEnumeration(class_obj, response.enumeration_context)
+                        except (CimError, HttpError):
+                            pass
+                return
+
+        response = self.client.EnumerateInstances(class_obj)
+        if self.pull:
+            # pulled enumerations aren't supported, don't try them for the other classes
+            self.pull = False
+        yield response.instances
+
+    def save_checkpoint(self):
+        """
+        Writes the classes and the progress to the checkpoint file. The file is replaced atomically, so a crash
+        leaves the previous checkpoint.
+        :return:
+        """
+        with self._lock:
+            checkpoint = dict(
+                namespace=self.client.default_namespace,
+                root_class=self.root_class,
+                classes=self.classes,
+                done=self.done,
+                failed=self.failed,
+            )
+            path = os.path.join(self.path, checkpoint_name)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(checkpoint, f, indent=1, sort_keys=True)
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(path + '.tmp', path)
+            self.saved = time.time()
+
+    def __repr__(self):
+        """
+        String representation of the Crawler
+        :return: string
+        """
+        return '<wbem.crawler.Crawler: %s, classes: %s, done: %s, failed: %s>' % (
+            self.path, len(self.classes), len(self.done), len(self.failed)
+        )
+
+
+class Inventory(object):
+    """
+    Read-only view of an inventory directory written by Crawler. Iterating it yields every instance, class by
+    class, and snapshot(classname) opens the memory mapped snapshot of one class.
+    """
+
+    def __init__(self, path):
+        """
+        Initializer
+        :param path: The inventory directory
+        :return:
+        """
+        checkpoint = load_checkpoint(path)
+        if checkpoint is None:
+            raise ValueError('%s is not an inventory' % path)
+
+        self.path = path
+        self.namespace = checkpoint['namespace']
+        self.counts = checkpoint['done']
+        self.failed = checkpoint['failed']
+        self.complete = len(self.counts) == len(checkpoint['classes'])
+
+    @property
+    def classes(self):
+        """
+        The names of the classes that have instances
+        :return: Sorted list of class names
+        """
+        return sorted(c for c, n in self.counts.items() if n)
+
+    def snapshot(self, classname):
+        """
+        Opens the snapshot of a class
+        :param classname: The class name
+        :return: Snapshot
+        """
+        return Snapshot(os.path.join(self.path, classname + '.snap'))
+
+    def __iter__(self):
+        for classname in self.classes:
+            snapshot = self.snapshot(classname)
+            try:
+                for instance in snapshot:
+                    yield instance
+            finally:
+                snapshot.close()
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def __repr__(self):
+        """
+        String representation of the Inventory
+        :return: string
+        """
+        return '<wbem.crawler.Inventory: %s, classes: %s, instances: %s%s>' % (
+            self.path, len(self.classes), len(self), '' if self.complete else ', incomplete'
+        )
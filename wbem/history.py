@@ -0,0 +1,302 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import array
+import collections
+import os
+
+from six.moves import cPickle as pickle
+
+from .columns import Columns, typecodes
+from .rates import sample_times
+
+
+class Series(object):
+    """
+    Fixed-capacity ring of (time, value) samples backed by two preallocated arrays
+    """
+
+    def __init__(self, capacity, typecode='d'):
+        """
+        Initializer
+        :param capacity: Number of samples to keep
+        :param typecode: The array typecode for the values
+        :return:
+        """
+        self.capacity = capacity
+        self.times = array.array('d', [0.0]) * capacity
+        self.values = array.array(typecode, [0]) * capacity
+        self.head = 0
+        self.count = 0
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by the sample arrays
+        :return: int
+        """
+        return self.capacity * (self.times.itemsize + self.values.itemsize)
+
+    @property
+    def last_time(self):
+        """
+        Time of the newest sample, or None if the series is empty
+        :return: float
+        """
+        if not self.count:
+            return None
+        return self.times[self.head - 1]
+
+    def append(self, t, value):
+        """
+        Adds a sample, overwriting the oldest one once the series is full
+        :param t: Sample time in seconds since the epoch
+        :param value: The value
+        :return:
+        """
+        self.times[self.head] = t
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def window(self, seconds=None, samples=None):
+        """
+        Returns the newest samples, oldest first
+        :param seconds: Only samples at most this many seconds older than the newest one
+        :param samples: Only this many of the newest samples
+        :return: List of (time, value)
+        """
+        count = self.count if samples is None else min(samples, self.count)
+        start = (self.head - count) % self.capacity
+        if start + count <= self.capacity:
+            times = self.times[start:start + count]
+            values = self.values[start:start + count]
+        else:
+            times = self.times[start:] + self.times[:self.head]
+            values = self.values[start:] + self.values[:self.head]
+
+        result = list(zip(times, values))
+        if seconds is not None and result:
+            oldest = result[-1][0] - seconds
+            result = [sample for sample in result if sample[0] >= oldest]
+        return result
+
+
+class History(object):
+    """
+    Keeps a short history of polled properties, one Series per (instance name, property). Memory is fixed by
+    max_bytes: when a new series would go over the budget, the series that was updated least recently (usually
+    an instance that disappeared) is dropped to make room.
+
+    Example:
+        history = History(capacity=360, properties=['KBytesRead', 'ReadIOs'])
+        history.append(client.EnumerateInstanceColumns(client.Class('CIM_BlockStorageStatisticalData')))
+        history.stats('$cn=CIM_BlockStorageStatisticalData;InstanceID=disk0', 'ReadIOs', seconds=600)
+    """
+
+    def __init__(self, capacity=120, max_bytes=64 * 1024 * 1024, properties=None, time_property='StatisticTime'):
+        """
+        Initializer
+        :param capacity: Number of samples kept per series
+        :param max_bytes: Memory budget for all series
+        :param properties: Optional list of property names to keep, defaults to every numeric property
+        :param time_property: The datetime property holding the sample time
+        :return:
+        """
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.properties = properties
+        self.time_property = time_property
+        # least recently updated first, so eviction takes the first item
+        self.series = collections.OrderedDict()
+        self.nbytes = 0
+        self.evicted = 0
+
+    def append(self, response):
+        """
+        Appends every numeric property of a poll
+        :param response: Columns or Response object
+        :return:
+        """
+        properties = self.properties
+        if properties is not None:
+            # keep the sample times, otherwise the local clock is used
+            properties = list(properties) + [self.time_property]
+        columns = response if isinstance(response, Columns) else response.columns(properties)
+        times = sample_times(columns, self.time_property)
+
+        for name, column in columns.columns.items():
+            if name == self.time_property or (self.properties is not None and name not in self.properties):
+                continue
+
+            typecode = typecodes.get(columns.types.get(name))
+            if typecode is None:
+                continue
+
+            nulls = columns.nulls.get(name)
+            for i, key in enumerate(columns.keys):
+                if nulls and nulls[i]:
+                    continue
+                self.add(key, name, times[i], column[i], typecode)
+
+    def add(self, key, name, t, value, typecode='d'):
+        """
+        Appends a single sample
+        :param key: Instance name (Instance.tostring())
+        :param name: Property name
+        :param t: Sample time in seconds since the epoch
+        :param value: The value
+        :param typecode: The array typecode, used if the series doesn't exist yet
+        :return:
+        """
+        series = self.series.pop((key, name), None)
+        if series is None:
+            series = Series(self.capacity, typecode)
+            while self.series and self.nbytes + series.nbytes > self.max_bytes:
+                self.evict()
+            if series.nbytes > self.max_bytes:
+                raise ValueError('A single series needs %s bytes, more than max_bytes' % series.nbytes)
+            self.nbytes += series.nbytes
+
+        # (re)inserted at the end, which keeps the least recently updated series first
+        self.series[(key, name)] = series
+        series.append(t, value)
+
+    def evict(self):
+        """
+        Drops the series that was updated least recently
+        :return:
+        """
+        _, oldest = self.series.popitem(last=False)
+        self.nbytes -= oldest.nbytes
+        self.evicted += 1
+
+    def window(self, key, name, seconds=None, samples=None):
+        """
+        Returns the newest values of a series, oldest first
+        :param key: Instance name (Instance.tostring())
+        :param name: Property name
+        :param seconds: Only values at most this many seconds older than the newest one
+        :param samples: Only this many of the newest values
+        :return: List of values
+        """
+        series = self.series.get((key, name))
+        if series is None:
+            return []
+        return [value for t, value in series.window(seconds, samples)]
+
+    def stats(self, key, name, seconds=None, samples=None):
+        """
+        Aggregates a window of a series
+        :param key: Instance name (Instance.tostring())
+        :param name: Property name
+        :param seconds: Only values at most this many seconds older than the newest one
+        :param samples: Only this many of the newest values
+        :return: Dictionary with count, min, max and avg, or None if there are no values
+        """
+        values = self.window(key, name, seconds, samples)
+        if not values:
+            return None
+
+        return dict(
+            count=len(values),
+            min=min(values),
+            max=max(values),
+            avg=float(sum(values)) / len(values),
+        )
+
+    def percentile(self, key, name, percent, seconds=None, samples=None):
+        """
+        Returns a percentile of a window of a series, interpolating between the closest values
+        :param key: Instance name (Instance.tostring())
+        :param name: Property name
+        :param percent: The percentile (0-100)
+        :param seconds: Only values at most this many seconds older than the newest one
+        :param samples: Only this many of the newest values
+        :return: float, or None if there are no values
+        """
+        values = sorted(self.window(key, name, seconds, samples))
+        if not values:
+            return None
+
+        position = (len(values) - 1) * percent / 100.0
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    def save(self, path):
+        """
+        Writes a snapshot of every series to disk. The file is replaced atomically.
+        :param path: The file path
+        :return:
+        """
+        state = dict(
+            capacity=self.capacity,
+            max_bytes=self.max_bytes,
+            properties=self.properties,
+            time_property=self.time_property,
+            series=[(k, (s.times, s.values, s.head, s.count)) for k, s in self.series.items()],
+        )
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        if os.name == 'nt' and os.path.exists(path):
+            # rename doesn't replace an existing file on Windows
+            os.remove(path)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a snapshot written by save(). Snapshots are pickles, and unpickling can run any code, so only load
+        files from a trusted source.
+        :param path: The file path
+        :return: History
+        """
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+
+        history = cls(state['capacity'], state['max_bytes'], state['properties'], state['time_property'])
+        for k, (times, values, head, count) in state['series']:
+            series = Series(history.capacity, values.typecode)
+            series.times, series.values, series.head, series.count = times, values, head, count
+            history.series[k] = series
+            history.nbytes += series.nbytes
+        return history
+
+    def __len__(self):
+        """
+        Number of series
+        :return: int
+        """
+        return len(self.series)
@@ -0,0 +1,372 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import threading
+import traceback
+import uuid
+
+from six.moves import BaseHTTPServer, queue, socketserver
+
+from .cim import ET, Instance, LimitExceeded, Response, Tags, check_declarations
+
+
+class Subscription(object):
+    """
+    The filter, handler and subscription instance names created by subscribe()
+    """
+
+    def __init__(self, client, filter_name, handler_name, subscription_name):
+        self.client = client
+        self.filter = filter_name
+        self.handler = handler_name
+        self.subscription = subscription_name
+
+    def delete(self):
+        """
+        Deletes the subscription, then the handler and filter it used
+        :return:
+        """
+        self.client.DeleteInstance(self.subscription)
+        self.client.DeleteInstance(self.handler)
+        self.client.DeleteInstance(self.filter)
+
+    def __repr__(self):
+        """
+        String representation of the Subscription
+        :return: string
+        """
+        return '<wbem.indications.Subscription: %s>' % self.subscription.tostring()
+
+
+def subscribe(client, destination, query, query_language='WQL', name=None, namespace='root/interop',
+              source_namespace=None):
+    """
+    Creates the CIM_IndicationFilter, CIM_ListenerDestinationCIMXML and CIM_IndicationSubscription instances needed
+    for the CIMOM to deliver indications matching the query to a listener.
+    :param client: WBEMClient object
+    :param destination: The listener URL as seen from the CIMOM (ex: http://10.0.0.5:5988)
+    :param query: The indication filter query (ex: SELECT * FROM CIM_AlertIndication)
+    :param query_language: The query language
+    :param name: Name of the filter and handler, a unique name is generated by default
+    :param namespace: The namespace the subscription instances are created in (usually the interop namespace)
+    :param source_namespace: The namespace the indications come from, defaults to the client's default namespace
+    :return: Subscription
+    """
+    name = name or 'wbem-%s' % uuid.uuid4()
+
+    filter_obj = client.Instance('CIM_IndicationFilter', namespace=namespace)
+    filter_obj.properties.update(
+        CreationClassName='CIM_IndicationFilter',
+        SystemCreationClassName='CIM_ComputerSystem',
+        SystemName=client.hostname,
+        Name=name,
+        Query=query,
+        QueryLanguage=query_language,
+        SourceNamespace=source_namespace or client.default_namespace,
+    )
+    filter_name = client.CreateInstance(filter_obj).instances[0]
+
+    handler_obj = client.Instance('CIM_ListenerDestinationCIMXML', namespace=namespace)
+    handler_obj.properties.update(
+        CreationClassName='CIM_ListenerDestinationCIMXML',
+        SystemCreationClassName='CIM_ComputerSystem',
+        SystemName=client.hostname,
+        Name=name,
+        Destination=destination,
+        PersistenceType=(2, 'uint16'),  # Permanent
+    )
+    handler_name = client.CreateInstance(handler_obj).instances[0]
+
+    subscription_obj = client.Instance('CIM_IndicationSubscription', namespace=namespace)
+    subscription_obj.properties.update(
+        Filter=filter_name,
+        Handler=handler_name,
+        SubscriptionState=(2, 'uint16'),  # Enabled
+    )
+    subscription_name = client.CreateInstance(subscription_obj).instances[0]
+
+    return Subscription(client, filter_name, handler_name, subscription_name)
+
+
+def parse_instance_element(instance_e):
+    """
+    Converts an INSTANCE element to an Instance, including properties that hold embedded instances
+    :param instance_e: The INSTANCE element
+    :return: Instance
+    """
+    instance = Instance(instance_e.attrib['CLASSNAME'])
+    instance.properties = Response.parse_properties(instance_e)
+
+    for p in instance_e.findall('PROPERTY'):
+        if p.attrib.get('EmbeddedObject', p.attrib.get('EMBEDDEDOBJECT')) is None:
+            continue
+
+        value = instance.properties.get(p.attrib['NAME'])
+        if value and value.startswith('<'):
+            # the value was unescaped, so it is checked on its own
+            check_declarations(value)
+            instance.properties[p.attrib['NAME']] = parse_instance_element(ET.fromstring(value))
+
+    return instance
+
+
+def parse_indications(xml_string):
+    """
+    Parses an ExportIndication request
+    :param xml_string: The XML string
+    :return: (message ID, list of Instance)
+    """
+    check_declarations(xml_string)
+    message = ET.fromstring(xml_string).find('MESSAGE')
+    indications = []
+    for expmethodcall in message.iter('EXPMETHODCALL'):
+        for param in expmethodcall.findall('EXPPARAMVALUE'):
+            instance_e = param.find('INSTANCE')
+            if instance_e is not None:
+                indications.append(parse_instance_element(instance_e))
+
+    return message.attrib.get('ID', '1001'), indications
+
+
+def export_response(message_id, error=None):
+    """
+    Generates the reply to an ExportIndication request
+    :param message_id: The ID of the request message
+    :param error: Error description, if the indications were not accepted
+    :return: XML string
+    """
+    expmethodresponse = ET.Element('EXPMETHODRESPONSE', dict(NAME='ExportIndication'))
+    if error:
+        ET.SubElement(expmethodresponse, 'ERROR', dict(CODE='1', DESCRIPTION=error))
+
+    return ET.tostring(
+        Tags.cim(
+            Tags.message(
+                Tags.append_children(ET.Element('SIMPLEEXPRSP'), [expmethodresponse]),
+                message_id=message_id
+            )
+        )
+    )
+
+
+class IndicationRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Handles CIM-XML export requests. Connections are kept alive so a CIMOM can deliver many indications over
+    one connection.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        # the TLS handshake is done here, on the connection's thread, so a slow client can't block accept()
+        if hasattr(self.request, 'do_handshake'):
+            self.request.do_handshake()
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_error(400, 'Invalid Content-Length')
+            self.close_connection = True
+            return
+        if length > self.server.listener.max_body:
+            # the body isn't read, so the connection can't be used for another request
+            self.send_error(413, 'Export request larger than %s bytes' % self.server.listener.max_body)
+            self.close_connection = True
+            return
+
+        body = self.rfile.read(length)
+        try:
+            message_id, indications = parse_indications(body)
+        except (SyntaxError, KeyError, AttributeError, ValueError, LimitExceeded):
+            # ValueError: property values that don't match their type
+            self.send_error(400, 'Invalid CIM-XML export request')
+            return
+
+        error = None
+        if not self.server.listener.put(indications):
+            error = 'Listener queue is full'
+
+        xml = export_response(message_id, error)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml; charset="utf-8"')
+        self.send_header('Content-Length', str(len(xml)))
+        self.send_header('CIMExport', 'MethodResponse')
+        self.end_headers()
+        self.wfile.write(xml)
+
+    def log_message(self, format, *args):
+        if self.server.listener.debug:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class IndicationServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class IndicationListener(object):
+    """
+    Receives indications pushed by a CIMOM. Each connection is served by its own thread and parsed indications are
+    put in a bounded queue. When the queue is full, the request is answered with an error so the CIMOM retries
+    later instead of the listener running out of memory.
+
+    Example:
+        listener = IndicationListener(port=5988)
+        listener.start()
+        subscription = subscribe(client, 'http://10.0.0.5:5988', 'SELECT * FROM CIM_AlertIndication')
+        for indication in listener:
+            print(indication.classname, indication.properties)
+    """
+
+    def __init__(self, host='', port=5988, queue_size=10000, callback=None, certfile=None, keyfile=None,
+                 ssl_context=None, debug=False, max_body=16 * 1024 * 1024):
+        """
+        Initializer
+        :param host: The address to listen on
+        :param port: The port to listen on
+        :param queue_size: Maximum number of indications waiting to be consumed
+        :param callback: Optional function called with every indication from a dispatcher thread
+        :param certfile: Certificate file, enables HTTPS
+        :param keyfile: Private key file, if not included in certfile
+        :param ssl_context: SSLContext to use for HTTPS instead of certfile/keyfile
+        :param debug: Log every request
+        :param max_body: Largest export request in bytes, larger ones are answered with 413
+        :return:
+        """
+        self.host = host
+        self.port = port
+        self.queue = queue.Queue(queue_size)
+        self.callback = callback
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.ssl_context = ssl_context
+        self.debug = debug
+        self.max_body = max_body
+        self.received = 0
+        self.dropped = 0
+        self.server = None
+        self.threads = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self):
+        """
+        Starts listening in background threads
+        :return:
+        """
+        self.server = IndicationServer((self.host, self.port), IndicationRequestHandler)
+        self.server.listener = self
+        self.port = self.server.server_address[1]
+
+        if self.certfile or self.ssl_context:
+            import ssl
+            context = self.ssl_context
+            if context is None:
+                context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_SERVER', ssl.PROTOCOL_SSLv23))
+                context.load_cert_chain(self.certfile, self.keyfile)
+            self.server.socket = context.wrap_socket(
+                self.server.socket, server_side=True, do_handshake_on_connect=False
+            )
+
+        self._stopped.clear()
+        self.threads = [threading.Thread(target=self.server.serve_forever)]
+        if self.callback:
+            self.threads.append(threading.Thread(target=self._dispatch))
+
+        for t in self.threads:
+            t.daemon = True
+            t.start()
+
+    def stop(self):
+        """
+        Stops listening and waits for the background threads
+        :return:
+        """
+        self._stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+        for t in self.threads:
+            t.join()
+        self.threads = []
+
+    def put(self, indications):
+        """
+        Queues received indications
+        :param indications: List of Instance
+        :return: False if the queue was full and some were dropped
+        """
+        for i, indication in enumerate(indications):
+            try:
+                self.queue.put_nowait(indication)
+            except queue.Full:
+                with self._lock:
+                    self.received += i
+                    self.dropped += len(indications) - i
+                return False
+
+        with self._lock:
+            self.received += len(indications)
+        return True
+
+    def get(self, block=True, timeout=None):
+        """
+        Returns the next indication
+        :param block: Wait for an indication if the queue is empty
+        :param timeout: Maximum number of seconds to wait
+        :return: Instance. Raises queue.Empty if there is none
+        """
+        return self.queue.get(block, timeout)
+
+    def __iter__(self):
+        """
+        Yields indications until the listener is stopped
+        :return: generator of Instance
+        """
+        while not self._stopped.is_set():
+            try:
+                yield self.queue.get(True, 0.5)
+            except queue.Empty:
+                continue
+
+    def _dispatch(self):
+        for indication in self:
+            try:
+                self.callback(indication)
+            except Exception:
+                # keep dispatching, a failing callback shouldn't stop the listener
+                if self.debug:
+                    traceback.print_exc()
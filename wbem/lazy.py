@@ -0,0 +1,114 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import importlib
+
+
+class LazyModule(object):
+    """
+    Stands in for a module that is imported the first time one of its attributes is used, so importing wbem
+    doesn't pay for parser backends, the HTTP/TLS stack or NumPy until they are needed. Several names can be
+    given as a fallback chain, the first one that imports is used.
+
+    Example:
+        ET = LazyModule('lxml.etree', 'xml.etree.cElementTree', 'xml.etree.ElementTree')
+        ET.fromstring(xml_string)   # imports the first available module here
+    """
+
+    def __init__(self, *names):
+        """
+        Initializer
+        :param names: Module names to try, in order
+        :return:
+        """
+        self._names = names
+        self._module = None
+        self._error = None
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            # keeps copy, pickle and friends from importing the module while probing for special methods
+            raise AttributeError(name)
+
+        value = getattr(load(self), name)
+        # cache it, so the next lookup is a plain attribute read instead of a __getattr__ call
+        setattr(self, name, value)
+        return value
+
+    def __repr__(self):
+        """
+        String representation of the LazyModule
+        :return: string
+        """
+        if self._module is None:
+            return '<wbem.lazy.LazyModule: %s (not imported)>' % ' or '.join(self._names)
+        return '<wbem.lazy.LazyModule: %s>' % self._module.__name__
+
+
+def load(module):
+    """
+    Imports the module behind a LazyModule if it wasn't yet
+    :param module: LazyModule (a regular module is returned as is)
+    :return: The module. Raises ImportError if none of the names could be imported
+    """
+    if not isinstance(module, LazyModule):
+        return module
+
+    if module._module is None:
+        if module._error is not None:
+            # don't search for a missing module again on every use
+            raise module._error
+
+        error = None
+        for name in module._names:
+            try:
+                module._module = importlib.import_module(name)
+                break
+            except ImportError as ex:
+                error = ex
+        else:
+            module._error = error
+            raise error
+
+    return module._module
+
+
+def available(module):
+    """
+    Returns whether the module behind a LazyModule can be imported, importing it if needed
+    :param module: LazyModule
+    :return: bool
+    """
+    try:
+        load(module)
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,123 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import multiprocessing
+
+import six
+
+from .columns import Columns
+
+
+def parse_columns(xml_string, namespace, properties=None, max_depth=None):
+    """
+    Parses a response into Columns. This runs in the worker processes, so it must stay a module-level function.
+    :param xml_string: The XML string
+    :param namespace: The namespace
+    :param properties: Optional list of property names to keep
+    :param max_depth: Optional deepest element nesting (see ParserLimits)
+    :return: Columns
+    """
+    return Columns.fromxml(xml_string, namespace, properties, max_depth)
+
+
+class ParserPool(object):
+    """
+    Parses large responses in a pool of worker processes, so parsing isn't limited to one core by the GIL. The
+    raw bytes are sent to a worker and a Columns object comes back: typed arrays and a keys list pickle into a few
+    large buffers, which is much cheaper than a graph of Instance objects. Responses smaller than min_size are
+    parsed in the calling thread, where the round trip would cost more than it saves.
+
+    Threads waiting on a worker release the GIL, so requests keep flowing while responses are being parsed.
+
+    Example:
+        pool = ParserPool()
+        columns = client.EnumerateInstanceColumns(client.Class('CIM_BlockStorageStatisticalData'), pool=pool)
+        ...
+        pool.close()
+    """
+
+    def __init__(self, processes=None, min_size=256 * 1024):
+        """
+        Initializer
+        :param processes: Number of worker processes, defaults to the number of CPUs
+        :param min_size: Responses smaller than this many bytes are parsed in the calling thread
+        :return:
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.min_size = min_size
+        self.pool = multiprocessing.Pool(self.processes)
+
+    def parse(self, xml_string, namespace, properties=None, max_depth=None):
+        """
+        Parses a response into Columns, waiting for the result
+        :param xml_string: The XML string
+        :param namespace: The namespace
+        :param properties: Optional list of property names to keep
+        :param max_depth: Optional deepest element nesting (see ParserLimits)
+        :return: Columns
+        """
+        if len(xml_string) < self.min_size:
+            return parse_columns(xml_string, namespace, properties, max_depth)
+        return self.parse_async(xml_string, namespace, properties, max_depth).get()
+
+    def parse_async(self, xml_string, namespace, properties=None, max_depth=None):
+        """
+        Starts parsing a response in a worker process
+        :param xml_string: The XML string
+        :param namespace: The namespace
+        :param properties: Optional list of property names to keep
+        :param max_depth: Optional deepest element nesting (see ParserLimits)
+        :return: AsyncResult, get() returns the Columns or raises the parsing error
+        """
+        if isinstance(xml_string, six.text_type):
+            xml_string = xml_string.encode('utf-8')
+        return self.pool.apply_async(parse_columns, (xml_string, namespace, properties, max_depth))
+
+    def close(self):
+        """
+        Stops the worker processes once pending work is done
+        :return:
+        """
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __repr__(self):
+        """
+        String representation of the ParserPool
+        :return: string
+        """
+        return '<wbem.parsing.ParserPool: processes: %s>' % self.processes
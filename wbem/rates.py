@@ -0,0 +1,275 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import array
+import datetime
+import time
+
+from .columns import Columns, numpy
+from .lazy import available
+
+# counters of these types wrap around at the given value
+moduli = dict(
+    uint8=2 ** 8,
+    uint16=2 ** 16,
+    uint32=2 ** 32,
+    uint64=2 ** 64,
+)
+
+counter_types = ('uint8', 'sint8', 'uint16', 'sint16', 'uint32', 'sint32', 'uint64', 'sint64')
+
+epoch = datetime.datetime(1970, 1, 1)
+
+
+def to_array(typecode, ndarray):
+    """
+    Copies a NumPy array into an array.array
+    :param typecode: The array typecode
+    :param ndarray: The NumPy array
+    :return: array.array
+    """
+    a = array.array(typecode)
+    if hasattr(a, 'frombytes'):
+        a.frombytes(ndarray.astype(typecode).tobytes())
+    else:
+        a.fromstring(ndarray.astype(typecode).tostring())
+    return a
+
+
+def sample_times(columns, time_property='StatisticTime'):
+    """
+    Returns the sample time of every row as seconds since the epoch, using the local clock for rows without
+    a time property
+    :param columns: Columns object
+    :param time_property: The datetime property holding the sample time
+    :return: array.array of floats
+    """
+    now = time.time()
+    column = columns.columns.get(time_property)
+    if column is None:
+        return array.array('d', [now]) * len(columns)
+
+    times = array.array('d')
+    for value in column:
+        if isinstance(value, datetime.datetime):
+            delta = value - epoch
+            times.append(delta.days * 86400 + delta.seconds + delta.microseconds / 1e6)
+        else:
+            times.append(now)
+    return times
+
+
+class RateEngine(object):
+    """
+    Turns successive polls of cumulative counters (KBytesRead, ReadIOs, ...) into per-instance rates. Instances are
+    matched between polls by their instance name and the interval comes from the StatisticTime property of each
+    instance, falling back to the local clock when the class doesn't have it.
+
+    Counters that went backwards are treated as a wrap when the CIM type is unsigned and the wrapped delta is less
+    than half the type's range, otherwise as a reset. Rows without a previous sample, with a reset counter or with
+    an interval that is not positive are null in the result.
+
+    Example:
+        engine = RateEngine(['KBytesRead', 'ReadIOs'])
+        while True:
+            rates = engine.update(client.EnumerateInstanceColumns(client.Class('CIM_BlockStorageStatisticalData')))
+            ...
+    """
+
+    def __init__(self, counters=None, time_property='StatisticTime', per_second=True):
+        """
+        Initializer
+        :param counters: List of counter property names, defaults to every integer property
+        :param time_property: The datetime property holding the sample time
+        :param per_second: Divide deltas by the interval in seconds. If False, the raw deltas are returned
+        :return:
+        """
+        self.counters = counters
+        self.time_property = time_property
+        self.per_second = per_second
+        self.previous = None
+        self.previous_times = None
+        self.previous_index = None
+
+    def reset(self):
+        """
+        Forgets the previous poll
+        :return:
+        """
+        self.previous = None
+        self.previous_times = None
+        self.previous_index = None
+
+    def update(self, response):
+        """
+        Feeds a new poll into the engine and returns the rates since the previous one
+        :param response: Columns or Response object
+        :return: Columns of rates (real64) with the same keys as the given poll
+        """
+        columns = response if isinstance(response, Columns) else response.columns()
+        times = self.times(columns)
+
+        result = Columns()
+        result.keys = list(columns.keys)
+
+        if self.previous is not None:
+            if columns.keys == self.previous.keys:
+                # same instances in the same order, which is the usual case
+                indexes = None
+            else:
+                if self.previous_index is None:
+                    self.previous_index = dict(zip(self.previous.keys, range(len(self.previous.keys))))
+                get = self.previous_index.get
+                indexes = array.array('l', [get(k, -1) for k in columns.keys])
+
+            for name in self.counter_names(columns):
+                if name not in self.previous.columns:
+                    continue
+
+                rate = self.rate_numpy if available(numpy) else self.rate_python
+                values, nulls = rate(columns, self.previous, name, indexes, times)
+                result.columns[name] = values
+                result.types[name] = 'real64'
+                result.nulls[name] = nulls
+
+        self.previous = columns
+        self.previous_times = times
+        self.previous_index = None
+        return result
+
+    def counter_names(self, columns):
+        """
+        Returns the names of the counter columns to compute rates for
+        :param columns: Columns object
+        :return: List of property names
+        """
+        if self.counters is not None:
+            return [name for name in self.counters if name in columns.columns]
+
+        return [name for name, valuetype in columns.types.items()
+                if valuetype in counter_types and name != self.time_property]
+
+    def times(self, columns):
+        """
+        Returns the sample time of every row as seconds since the epoch
+        :param columns: Columns object
+        :return: array.array of floats
+        """
+        return sample_times(columns, self.time_property)
+
+    def rate_python(self, columns, previous, name, indexes, times):
+        """
+        Computes the rates of one counter column without NumPy
+        :return: (values, nulls)
+        """
+        current = columns.columns[name]
+        before = previous.columns[name]
+        current_nulls = columns.nulls.get(name)
+        before_nulls = previous.nulls.get(name)
+        before_times = self.previous_times
+        modulus = moduli.get(columns.types.get(name))
+        nan = float('nan')
+
+        values = array.array('d')
+        nulls = array.array('B')
+        for i in range(len(current)):
+            j = i if indexes is None else indexes[i]
+            if j < 0 or (current_nulls and current_nulls[i]) or (before_nulls and before_nulls[j]):
+                values.append(nan)
+                nulls.append(1)
+                continue
+
+            delta = current[i] - before[j]
+            if delta < 0:
+                if modulus and delta + modulus < modulus // 2:
+                    delta += modulus
+                else:
+                    values.append(nan)
+                    nulls.append(1)
+                    continue
+
+            if self.per_second:
+                interval = times[i] - before_times[j]
+                if interval <= 0:
+                    values.append(nan)
+                    nulls.append(1)
+                    continue
+                values.append(delta / interval)
+            else:
+                values.append(float(delta))
+            nulls.append(0)
+
+        return values, nulls
+
+    def rate_numpy(self, columns, previous, name, indexes, times):
+        """
+        Computes the rates of one counter column with NumPy
+        :return: (values, nulls)
+        """
+        current = columns.columns[name]
+        before = previous.columns[name]
+        if not isinstance(current, array.array) or not isinstance(before, array.array) or not len(before):
+            return self.rate_python(columns, previous, name, indexes, times)
+
+        current = numpy.frombuffer(current, dtype=current.typecode)
+        before = numpy.frombuffer(before, dtype=before.typecode)
+        before_times = numpy.frombuffer(self.previous_times, dtype='d')
+        valid = numpy.ones(len(current), dtype=bool)
+        if indexes is not None:
+            indexes = numpy.frombuffer(indexes, dtype=indexes.typecode)
+            valid &= indexes >= 0
+            indexes = numpy.where(valid, indexes, 0)
+            before = before[indexes]
+            before_times = before_times[indexes]
+
+        if name in columns.nulls:
+            valid &= numpy.frombuffer(columns.nulls[name], dtype='B') == 0
+        if name in previous.nulls:
+            before_nulls = numpy.frombuffer(previous.nulls[name], dtype='B')
+            valid &= (before_nulls if indexes is None else before_nulls[indexes]) == 0
+
+        # unsigned subtraction already wraps around at the type's range
+        delta = current - before
+        backwards = current < before
+        modulus = moduli.get(columns.types.get(name))
+        if modulus and current.dtype == before.dtype and current.dtype.kind == 'u':
+            valid &= ~(backwards & (delta >= modulus // 2))
+        else:
+            valid &= ~backwards
+
+        values = delta.astype('d')
+        if self.per_second:
+            interval = numpy.frombuffer(times, dtype='d') - before_times
+            valid &= interval > 0
+            values /= numpy.where(valid, interval, 1.0)
+
+        values[~valid] = numpy.nan
+        return to_array('d', values), to_array('B', ~valid)
@@ -0,0 +1,343 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+import traceback
+
+from six.moves import queue
+
+from .cim import (
+    InvalidClass, InvalidMethod, InvalidNamespace, InvalidParameter, InvalidProperty, InvalidQuery, NotFound,
+    NotSupported, TypeMismatch
+)
+from .client import AuthenticationError
+
+
+class PollTask(object):
+    """
+    One (client, class, method) to poll on an interval. The scheduler adjusts current_interval from the observed
+    latency and errors, and never goes below the requested interval.
+    """
+
+    def __init__(self, client, class_obj, interval, callback, method='EnumerateInstances', errback=None):
+        """
+        Initializer
+        :param client: WBEMClient object
+        :param class_obj: Class or Instance object to pass to the method
+        :param interval: The requested poll interval in seconds
+        :param callback: Function called with (task, response) after every successful poll
+        :param method: Name of the WBEMClient method to call
+        :param errback: Optional function called with (task, exception) after every failed poll
+        :return:
+        """
+        self.client = client
+        self.class_obj = class_obj
+        self.interval = interval
+        self.current_interval = interval
+        self.callback = callback
+        self.method = method
+        self.errback = errback
+        self.next_run = None
+        self.latency = None
+        self.errors = 0
+        self.runs = 0
+        self.cancelled = False
+        # the permanent error that removed the task from its scheduler, if any
+        self.error = None
+
+    @property
+    def host(self):
+        """
+        The (hostname, port) the task polls
+        :return: tuple
+        """
+        return self.client.hostname, self.client.port
+
+    def __repr__(self):
+        """
+        String representation of the PollTask
+        :return: string
+        """
+        return '<wbem.scheduler.PollTask: %s %s on %s:%s every %.1fs>' % (
+            self.method, self.class_obj, self.client.hostname, self.client.port, self.current_interval
+        )
+
+
+class HostLimiter(object):
+    """
+    Per-host concurrency limit and token bucket for requests per second
+    """
+
+    def __init__(self, max_concurrency=2, rate=None, burst=None):
+        """
+        Initializer
+        :param max_concurrency: Maximum number of requests in flight to the host
+        :param rate: Maximum requests per second, unlimited if None
+        :param burst: Size of the token bucket, defaults to max_concurrency
+        :return:
+        """
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst or max_concurrency
+        self.active = 0
+        self.tokens = float(self.burst)
+        self.updated = time.time()
+
+    def delay(self, now):
+        """
+        Returns how long to wait before a request may start
+        :param now: The current time
+        :return: Seconds to wait, 0 if a request may start now or None if the host is at max_concurrency
+        """
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+
+        if self.active >= self.max_concurrency:
+            return None
+
+        return 0
+
+    def acquire(self):
+        self.active += 1
+        if self.rate:
+            self.tokens -= 1
+
+    def release(self):
+        self.active -= 1
+
+
+class PollScheduler(object):
+    """
+    Runs PollTasks on a pool of worker threads. Each host gets a HostLimiter, so slow CIMOMs are not flooded, and
+    first polls are spread randomly over the interval so they don't all fire at once.
+
+    Intervals adapt to the server: a task whose polls take longer than load_factor of its interval is slowed down
+    so that polling keeps the CIMOM busy at most that share of the time, and failed polls back off exponentially
+    up to max_backoff times the requested interval. A client object is never used by two workers at once.
+
+    Errors that won't go away by waiting (permanent_errors: an unknown class or namespace, an unsupported
+    operation, rejected credentials, ...) remove the task instead: task.error is set and the errback is called
+    once. Transport errors, timeouts, an open circuit and other CIM errors are retried with backoff.
+
+    Example:
+        scheduler = PollScheduler(workers=16, max_concurrency=2, rate=5)
+        scheduler.add(client, client.Class('CIM_BlockStorageStatisticalData'), 60, handle_response)
+        scheduler.start()
+    """
+
+    permanent_errors = (
+        InvalidNamespace, InvalidParameter, InvalidClass, NotFound, NotSupported, InvalidProperty, TypeMismatch,
+        InvalidQuery, InvalidMethod, AuthenticationError
+    )
+
+    def __init__(self, workers=8, max_concurrency=2, rate=None, load_factor=0.5, max_backoff=16, jitter=0.1):
+        """
+        Initializer
+        :param workers: Number of worker threads
+        :param max_concurrency: Maximum number of requests in flight per host
+        :param rate: Maximum requests per second per host, unlimited if None
+        :param load_factor: Largest share of the interval a poll may take before the interval is stretched
+        :param max_backoff: Largest multiple of the requested interval after errors or slow polls
+        :param jitter: Random +/- fraction added to every interval
+        :return:
+        """
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.load_factor = load_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.limiters = dict()
+        self.tasks = []
+        self.busy_clients = set()
+        self.threads = []
+        self.running = False
+        self._heap = []
+        # tasks waiting for a running poll to finish, per host
+        self._blocked = dict()
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._queue = queue.Queue()
+
+    def limiter(self, host):
+        """
+        Returns the HostLimiter for a host, creating it if needed
+        :param host: (hostname, port)
+        :return: HostLimiter
+        """
+        limiter = self.limiters.get(host)
+        if limiter is None:
+            limiter = self.limiters[host] = HostLimiter(self.max_concurrency, self.rate)
+        return limiter
+
+    def add(self, client, class_obj, interval, callback, method='EnumerateInstances', errback=None):
+        """
+        Adds a task. The first poll runs at a random point within the first interval.
+        :return: PollTask
+        """
+        task = PollTask(client, class_obj, interval, callback, method, errback)
+        with self._condition:
+            self.tasks.append(task)
+            self._schedule(task, time.time() + random.uniform(0, interval))
+        return task
+
+    def remove(self, task):
+        """
+        Removes a task. A poll that is already running is allowed to finish.
+        :param task: PollTask
+        :return:
+        """
+        with self._condition:
+            task.cancelled = True
+            if task in self.tasks:
+                self.tasks.remove(task)
+
+    def start(self):
+        """
+        Starts the dispatcher and worker threads
+        :return:
+        """
+        self.running = True
+        self.threads = [threading.Thread(target=self._dispatch)]
+        self.threads.extend(threading.Thread(target=self._work) for _ in range(self.workers))
+        for t in self.threads:
+            t.daemon = True
+            t.start()
+
+    def stop(self):
+        """
+        Stops the scheduler and waits for running polls to finish
+        :return:
+        """
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
+
+    def _schedule(self, task, when):
+        task.next_run = when
+        heapq.heappush(self._heap, (when, next(self._counter), task))
+        self._condition.notify()
+
+    def _dispatch(self):
+        with self._condition:
+            while self.running:
+                now = time.time()
+                if not self._heap or self._heap[0][0] > now:
+                    self._condition.wait(self._heap[0][0] - now if self._heap else None)
+                    continue
+
+                when, _, task = heapq.heappop(self._heap)
+                if task.cancelled:
+                    continue
+
+                client_id = id(task.client)
+                limiter = self.limiter(task.host)
+                delay = limiter.delay(now)
+                if delay is None or client_id in self.busy_clients:
+                    # parked until a running poll on the host finishes
+                    self._blocked.setdefault(task.host, []).append(task)
+                elif delay > 0:
+                    self._schedule(task, now + delay)
+                else:
+                    limiter.acquire()
+                    self.busy_clients.add(client_id)
+                    self._queue.put(task)
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+
+            start = time.time()
+            try:
+                response = getattr(task.client, task.method)(task.class_obj)
+            except Exception as ex:
+                # any failure, including a malformed response, must release the host
+                self._finish(task, start, ex)
+                self._call(task.errback, task, ex)
+                continue
+
+            self._finish(task, start, None)
+            self._call(task.callback, task, response)
+
+    @staticmethod
+    def _call(function, task, arg):
+        if function is None:
+            return
+        try:
+            function(task, arg)
+        except Exception:
+            # a failing callback shouldn't take the worker thread down with it
+            traceback.print_exc()
+
+    def _finish(self, task, start, error):
+        now = time.time()
+        latency = now - start
+        task.runs += 1
+        task.latency = latency if task.latency is None else task.latency * 0.8 + latency * 0.2
+
+        longest = task.interval * self.max_backoff
+        if error is None:
+            task.errors = 0
+            task.current_interval = min(longest, max(task.interval, task.latency / self.load_factor))
+        else:
+            task.errors += 1
+            task.current_interval = min(longest, task.interval * 2 ** task.errors)
+
+        interval = task.current_interval * (1 + random.uniform(-self.jitter, self.jitter))
+        with self._condition:
+            if isinstance(error, self.permanent_errors):
+                task.error = error
+                task.cancelled = True
+                if task in self.tasks:
+                    self.tasks.remove(task)
+
+            self.limiter(task.host).release()
+            self.busy_clients.discard(id(task.client))
+            if not task.cancelled and self.running:
+                self._schedule(task, start + interval)
+            # only tasks of this host waited for it, the others keep their place
+            for blocked in self._blocked.pop(task.host, []):
+                self._schedule(blocked, now)
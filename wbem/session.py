@@ -0,0 +1,219 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import threading
+import traceback
+
+from .client import WBEMClient
+
+
+class Session(object):
+    """
+    A warm WBEMClient for one URI and set of credentials. The client keeps its connections, TLS session, Digest
+    nonce and cookies between operations, so only the first operation pays for connecting and authenticating.
+    The class names of the namespace are fetched in the background when the session is created.
+    """
+
+    def __init__(self, client, prefetch=True):
+        """
+        Initializer
+        :param client: WBEMClient object, ideally with keep_alive=True
+        :param prefetch: Start fetching the class names right away
+        :return:
+        """
+        self.client = client
+        self.classnames = None
+        self.error = None
+        self.closed = False
+        self.ready = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+        if prefetch:
+            self.prefetch()
+
+    def prefetch(self):
+        """
+        Fetches the names of all classes in the client's namespace on a background thread
+        :return:
+        """
+        t = threading.Thread(target=self._fetch_classnames)
+        t.daemon = True
+        t.start()
+
+    def _fetch_classnames(self):
+        try:
+            response = self.client.EnumerateClassNames(self.client.Class(''), deep_inheritance=True)
+            self.classnames = sorted(response.classnames)
+        except Exception as ex:
+            # any failure, including a malformed response or a lost connection, ends up in error
+            self.error = ex
+        finally:
+            # whatever happened, nobody may be left waiting for the class names
+            with self._lock:
+                self.ready.set()
+                callbacks, self._callbacks = self._callbacks, []
+
+        if self.closed:
+            # closed while the request ran, its kept-alive connection went back to the idle ones after close()
+            # closed them. close() sets closed before closing, so one of the two always gets it
+            self.client.close()
+            return
+
+        for callback in callbacks:
+            self._call(callback)
+
+    def on_classnames(self, callback):
+        """
+        Calls a function with this session once the class names are fetched (or failed, see error). If they are
+        already there, the function is called right away, otherwise it is called on the prefetch thread.
+        :param callback: Function called with the Session
+        :return:
+        """
+        with self._lock:
+            if not self.ready.is_set():
+                self._callbacks.append(callback)
+                return
+
+        self._call(callback)
+
+    def _call(self, callback):
+        try:
+            callback(self)
+        except Exception:
+            # a failing callback shouldn't hide the class names from the others
+            traceback.print_exc()
+
+    def close(self):
+        """
+        Closes the client's idle connections. A prefetch that is still running won't call its callbacks, and
+        closes the connection it used once it is done.
+        :return:
+        """
+        self.closed = True
+        self.client.close()
+
+    def __repr__(self):
+        """
+        String representation of the Session
+        :return: string
+        """
+        return '<wbem.session.Session: %s:%s/%s, classes: %s>' % (
+            self.client.hostname, self.client.port, self.client.default_namespace,
+            'pending' if self.classnames is None else len(self.classnames)
+        )
+
+
+class SessionManager(object):
+    """
+    Keeps one warm Session per URI (host, port, protocol and namespace). Asking for a URI with different
+    credentials closes the old session and starts a new one, so stale authentication state is never reused.
+
+    Example:
+        sessions = SessionManager()
+        session = sessions.get('array', 5989, 'admin', 'secret', https=True)
+        session.client.EnumerateInstances(session.client.Class('CIM_StorageVolume'))
+    """
+
+    def __init__(self, prefetch=True, **client_options):
+        """
+        Initializer
+        :param prefetch: Fetch the class names of every new session in the background
+        :param client_options: Extra WBEMClient arguments (ex: ssl_context), keep_alive defaults to True
+        :return:
+        """
+        self.prefetch = prefetch
+        self.client_options = client_options
+        self.client_options.setdefault('keep_alive', True)
+        self.sessions = dict()
+        self.credentials = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(hostname, port=80, default_namespace='root/cimv2', https=False):
+        """
+        Returns the key that identifies a URI
+        :return: tuple
+        """
+        return hostname, int(port), default_namespace, bool(https)
+
+    def get(self, hostname, port=80, username=None, password=None, default_namespace='root/cimv2', https=False):
+        """
+        Returns the session for a URI, creating it if there is none or the credentials changed
+        :param hostname: The host name or address
+        :param port: The port
+        :param username: User name or None
+        :param password: Password or None
+        :param default_namespace: The namespace
+        :param https: Use HTTPS
+        :return: Session
+        """
+        key = self.key(hostname, port, default_namespace, https)
+        credentials = (username or None, password or None)
+        with self._lock:
+            session = self.sessions.get(key)
+            if session is not None and self.credentials[key] == credentials:
+                return session
+
+            if session is not None:
+                session.close()
+
+            client = WBEMClient(
+                hostname, port=int(port), username=username, password=password,
+                default_namespace=default_namespace, https=https, **self.client_options
+            )
+            session = self.sessions[key] = Session(client, self.prefetch)
+            self.credentials[key] = credentials
+            return session
+
+    def invalidate(self, hostname, port=80, default_namespace='root/cimv2', https=False):
+        """
+        Closes and forgets the session for a URI, if any
+        :return:
+        """
+        key = self.key(hostname, port, default_namespace, https)
+        with self._lock:
+            session = self.sessions.pop(key, None)
+            self.credentials.pop(key, None)
+        if session is not None:
+            session.close()
+
+    def close(self):
+        """
+        Closes every session
+        :return:
+        """
+        with self._lock:
+            sessions = list(self.sessions.values())
+            self.sessions = dict()
+            self.credentials = dict()
+        for session in sessions:
+            session.close()
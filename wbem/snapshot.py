@@ -0,0 +1,395 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import datetime
+import mmap
+import os
+import struct
+
+import six
+from six.moves import cPickle as pickle
+
+from .cim import Instance
+
+# file layout:
+#   magic, then one record per instance, then the string table, the index (one uint64 offset per record) and
+#   the footer. Records refer to class, namespace and property names by their number in the string table.
+magic = b'WBEMSNP1'
+footer = struct.Struct('<QQQ8s')        # string table offset, index offset, number of records, magic
+record_header = struct.Struct('<iiHH')  # classname, namespace (-1 for None), keybindings, properties
+name_id = struct.Struct('<i')
+length = struct.Struct('<I')
+int64 = struct.Struct('<q')
+uint64 = struct.Struct('<Q')
+real64 = struct.Struct('<d')
+
+epoch = datetime.datetime(1, 1, 1)
+
+
+def microseconds(delta):
+    """
+    Converts a timedelta to a number of microseconds without going through floats
+    :param delta: timedelta
+    :return: int
+    """
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+class SnapshotWriter(object):
+    """
+    Streams instances to a snapshot file. Records are written as they come, so memory use doesn't grow with the
+    number of instances, and the string table and index are written by close(). The file only appears under its
+    final name once it is complete.
+
+    Values keep their Python types: None, bool, int, float, string, datetime, timedelta, lists, (value, CIM type)
+    tuples and Instance references. Anything else is pickled.
+
+    Example:
+        with SnapshotWriter('disks.snap') as writer:
+            writer.extend(client.EnumerateInstances(client.Class('CIM_DiskDrive')))
+    """
+
+    def __init__(self, path):
+        """
+        Initializer
+        :param path: The file path
+        :return:
+        """
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.f = open(self.tmp_path, 'wb')
+        self.f.write(magic)
+        self.offset = len(magic)
+        self.strings = dict()
+        self.offsets = []
+
+    def string_id(self, s):
+        """
+        Returns the number of a string in the string table, adding it if needed
+        :param s: The string
+        :return: int
+        """
+        i = self.strings.get(s)
+        if i is None:
+            i = self.strings[s] = len(self.strings)
+        return i
+
+    def append(self, instance):
+        """
+        Writes one instance with its keybindings and properties
+        :param instance: Instance object
+        :return:
+        """
+        buf = bytearray()
+        self.encode_instance(buf, instance)
+        self.offsets.append(self.offset)
+        self.f.write(buf)
+        self.offset += len(buf)
+
+    def extend(self, instances):
+        """
+        Writes many instances
+        :param instances: Response object or list of Instance objects
+        :return:
+        """
+        for instance in getattr(instances, 'instances', instances):
+            self.append(instance)
+
+    def encode_instance(self, buf, instance):
+        namespace = -1 if instance.namespace is None else self.string_id(instance.namespace)
+        buf += record_header.pack(
+            self.string_id(instance.classname), namespace, len(instance.keybindings), len(instance.properties)
+        )
+        for name, value in instance.keybindings.items():
+            buf += name_id.pack(self.string_id(name))
+            self.encode_value(buf, value)
+        for name, value in instance.properties.items():
+            buf += name_id.pack(self.string_id(name))
+            self.encode_value(buf, value)
+
+    def encode_value(self, buf, value):
+        if value is None:
+            buf += b'N'
+        elif isinstance(value, bool):
+            buf += b'T' if value else b'F'
+        elif isinstance(value, six.integer_types) and -2 ** 63 <= value < 2 ** 64:
+            if value < 2 ** 63:
+                buf += b'q' + int64.pack(value)
+            else:
+                buf += b'Q' + uint64.pack(value)
+        elif isinstance(value, float):
+            buf += b'd' + real64.pack(value)
+        elif isinstance(value, six.string_types):
+            data = value.encode('utf-8') if isinstance(value, six.text_type) else value
+            buf += b's' + length.pack(len(data)) + data
+        elif isinstance(value, datetime.datetime) and value.tzinfo is None:
+            buf += b'D' + int64.pack(microseconds(value - epoch))
+        elif isinstance(value, datetime.timedelta):
+            buf += b'I' + int64.pack(microseconds(value))
+        elif isinstance(value, tuple) and len(value) == 2 and isinstance(value[1], six.string_types):
+            # (value, CIM type)
+            buf += b't' + name_id.pack(self.string_id(value[1]))
+            self.encode_value(buf, value[0])
+        elif isinstance(value, list):
+            buf += b'a' + length.pack(len(value))
+            for v in value:
+                self.encode_value(buf, v)
+        elif isinstance(value, Instance):
+            buf += b'r'
+            self.encode_instance(buf, value)
+        else:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            buf += b'p' + length.pack(len(data)) + data
+
+    def close(self):
+        """
+        Writes the string table, index and footer, then moves the file to its final name
+        :return:
+        """
+        if self.f is None:
+            return
+
+        strings_offset = self.offset
+        buf = bytearray(length.pack(len(self.strings)))
+        for s in sorted(self.strings, key=self.strings.get):
+            data = s.encode('utf-8') if isinstance(s, six.text_type) else s
+            buf += length.pack(len(data)) + data
+        self.f.write(buf)
+
+        index_offset = strings_offset + len(buf)
+        # pad so the index can be read as aligned uint64s
+        padding = -index_offset % 8
+        self.f.write(b'\0' * padding)
+        index_offset += padding
+        self.f.write(struct.pack('<%sQ' % len(self.offsets), *self.offsets))
+        self.f.write(footer.pack(strings_offset, index_offset, len(self.offsets), magic))
+        self.f.close()
+        self.f = None
+
+        if os.name == 'nt' and os.path.exists(self.path):
+            # rename doesn't replace an existing file on Windows
+            os.remove(self.path)
+        os.rename(self.tmp_path, self.path)
+
+    def discard(self):
+        """
+        Stops writing and removes the partial file
+        :return:
+        """
+        if self.f is None:
+            return
+
+        self.f.close()
+        self.f = None
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # don't leave a partial snapshot behind
+            self.discard()
+
+
+class Snapshot(object):
+    """
+    Read-only view of a snapshot file. The file is memory mapped and only the string table is read up front, so
+    opening a snapshot of 500k instances is quick and instances are decoded only when they are accessed.
+
+    Values the writer had to pickle are unpickled when they are read, and unpickling can run any code, so only
+    open snapshots from a trusted source.
+
+    Example:
+        snapshot = Snapshot('disks.snap')
+        print(len(snapshot), snapshot[1000].properties)
+        for instance in snapshot:
+            ...
+        snapshot.close()
+    """
+
+    def __init__(self, path):
+        """
+        Initializer
+        :param path: The file path
+        :return:
+        """
+        self.path = path
+        self.f = open(path, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mm[:len(magic)] != magic:
+            self.close()
+            raise ValueError('%s is not a snapshot file' % path)
+
+        strings_offset, self.index_offset, self.count, end = footer.unpack_from(self.mm, len(self.mm) - footer.size)
+        if end != magic:
+            self.close()
+            raise ValueError('%s is incomplete' % path)
+
+        count, = length.unpack_from(self.mm, strings_offset)
+        offset = strings_offset + length.size
+        self.strings = []
+        for _ in range(count):
+            n, = length.unpack_from(self.mm, offset)
+            offset += length.size
+            self.strings.append(self.mm[offset:offset + n].decode('utf-8'))
+            offset += n
+
+    def offset(self, i):
+        """
+        Returns the file offset of a record
+        :param i: Record number
+        :return: int
+        """
+        return uint64.unpack_from(self.mm, self.index_offset + i * 8)[0]
+
+    def __getitem__(self, i):
+        """
+        Decodes one instance
+        :param i: Record number, negative numbers count from the end
+        :return: Instance
+        """
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('snapshot index out of range')
+
+        return self.decode_instance(self.offset(i))[0]
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def __len__(self):
+        return self.count
+
+    def decode_instance(self, offset):
+        mm = self.mm
+        strings = self.strings
+        classname, namespace, keybindings, properties = record_header.unpack_from(mm, offset)
+        offset += record_header.size
+
+        instance = Instance(strings[classname], namespace=None if namespace < 0 else strings[namespace])
+        for _ in range(keybindings):
+            name, = name_id.unpack_from(mm, offset)
+            value, offset = self.decode_value(offset + name_id.size)
+            instance.keybindings[strings[name]] = value
+        for _ in range(properties):
+            name, = name_id.unpack_from(mm, offset)
+            value, offset = self.decode_value(offset + name_id.size)
+            instance.properties[strings[name]] = value
+
+        return instance, offset
+
+    def decode_value(self, offset):
+        mm = self.mm
+        code = mm[offset:offset + 1]
+        offset += 1
+        if code == b's':
+            n, = length.unpack_from(mm, offset)
+            offset += length.size
+            return mm[offset:offset + n].decode('utf-8'), offset + n
+        if code == b'q':
+            return int64.unpack_from(mm, offset)[0], offset + int64.size
+        if code == b'd':
+            return real64.unpack_from(mm, offset)[0], offset + real64.size
+        if code == b't':
+            valuetype, = name_id.unpack_from(mm, offset)
+            value, offset = self.decode_value(offset + name_id.size)
+            return (value, self.strings[valuetype]), offset
+        if code == b'N':
+            return None, offset
+        if code == b'T':
+            return True, offset
+        if code == b'F':
+            return False, offset
+        if code == b'Q':
+            return uint64.unpack_from(mm, offset)[0], offset + uint64.size
+        if code == b'D':
+            value, = int64.unpack_from(mm, offset)
+            return epoch + datetime.timedelta(microseconds=value), offset + int64.size
+        if code == b'I':
+            value, = int64.unpack_from(mm, offset)
+            return datetime.timedelta(microseconds=value), offset + int64.size
+        if code == b'a':
+            n, = length.unpack_from(mm, offset)
+            offset += length.size
+            values = []
+            for _ in range(n):
+                value, offset = self.decode_value(offset)
+                values.append(value)
+            return values, offset
+        if code == b'r':
+            return self.decode_instance(offset)
+        if code == b'p':
+            # unpickling runs whatever the file says, see the class docstring
+            n, = length.unpack_from(mm, offset)
+            offset += length.size
+            return pickle.loads(mm[offset:offset + n]), offset + n
+
+        raise ValueError('Unknown value code %r at offset %s' % (code, offset - 1))
+
+    def close(self):
+        """
+        Unmaps and closes the file. Instances already decoded stay valid.
+        :return:
+        """
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __repr__(self):
+        """
+        String representation of the Snapshot
+        :return: string
+        """
+        return '<wbem.snapshot.Snapshot: %s, instances: %s>' % (self.path, self.count)
+
+
+def save(path, instances):
+    """
+    Writes instances to a snapshot file
+    :param path: The file path
+    :param instances: Response object or list of Instance objects
+    :return:
+    """
+    with SnapshotWriter(path) as writer:
+        writer.extend(instances)
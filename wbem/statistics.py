@@ -0,0 +1,260 @@
+"""
+WBEM Module for Python 2.6+ and 3.3+
+------------------------------------
+This module contains the functionality to create CIM-XML requests and parse CIM-XML responses. In addition,
+HTTP(S) is used to provide the communications portion of WBEM.
+
+License
+-------
+The MIT License (MIT)
+
+Copyright (c) 2015 Ross Peoples <ross.peoples@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+from .cim import ET, CimError, Instance, check_declarations
+from .columns import Columns
+
+# StatisticsFormat of GetStatisticsCollection
+CSV = 2
+
+# GetStatisticsCollection return value when the statistics are delivered through a job instead
+job_started = 4096
+
+service_class = 'CIM_BlockStatisticsService'
+statistics_class = 'CIM_BlockStorageStatisticalData'
+manifest_class = 'CIM_BlockStatisticsManifest'
+
+# properties of CIM_BlockStorageStatisticalData with their CIM types, in the order of the class. CSV records
+# follow this order (without the properties a manifest leaves out) when the manifest has no CSVSequence.
+statistics_properties = [
+    ('InstanceID', 'string'),
+    ('ElementType', 'uint16'),
+    ('StartStatisticTime', 'datetime'),
+    ('StatisticTime', 'datetime'),
+    ('TotalIOs', 'uint64'),
+    ('KBytesTransferred', 'uint64'),
+    ('IOTimeCounter', 'uint64'),
+    ('ReadIOs', 'uint64'),
+    ('ReadHitIOs', 'uint64'),
+    ('ReadIOTimeCounter', 'uint64'),
+    ('ReadHitIOTimeCounter', 'uint64'),
+    ('KBytesRead', 'uint64'),
+    ('WriteIOs', 'uint64'),
+    ('WriteHitIOs', 'uint64'),
+    ('WriteIOTimeCounter', 'uint64'),
+    ('WriteHitIOTimeCounter', 'uint64'),
+    ('KBytesWritten', 'uint64'),
+    ('IdleTimeCounter', 'uint64'),
+    ('MaintOp', 'uint64'),
+    ('MaintTimeCounter', 'uint64'),
+]
+statistics_types = dict(statistics_properties)
+default_sequence = [name for name, _ in statistics_properties]
+
+
+def manifest_sequence(manifest):
+    """
+    Returns the CSV field names described by a CIM_BlockStatisticsManifest instance: its CSVSequence, or the
+    properties it includes in the order of the class
+    :param manifest: Instance with properties
+    :return: List of property names
+    """
+    sequence = manifest.properties.get('CSVSequence')
+    if sequence:
+        return list(sequence)
+
+    return default_sequence[:2] + [
+        name for name in default_sequence[2:] if manifest.properties.get('Include' + name)
+    ]
+
+
+def parse_statistics(statistics, manifests=None, namespace=None, properties=None, separator=';'):
+    """
+    Decodes the Statistics output of GetStatisticsCollection into columns. Each string holds either CSV records
+    (one per line) or embedded INSTANCE elements. The keys are instance names built from InstanceID, so an element
+    keeps its key from one collection to the next and RateEngine and History can match them.
+    :param statistics: List of strings
+    :param manifests: Dictionary of ElementType to the list of CSV field names, every field is named in the order
+        of the class by default
+    :param namespace: The namespace for the instance names
+    :param properties: Optional list of property names to keep
+    :param separator: The CSV field separator
+    :return: Columns
+    """
+    manifests = manifests or dict()
+    columns = Columns(properties)
+    for text in statistics:
+        if text.lstrip().startswith('<'):
+            parse_instances(columns, text, namespace)
+            continue
+
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+
+            # SMI-S records start with InstanceID and ElementType, whatever the manifest includes
+            fields = line.split(separator)
+            try:
+                sequence = manifests.get(int(fields[1]), default_sequence)
+            except (IndexError, ValueError):
+                sequence = default_sequence
+
+            columns.keys.append(Instance(statistics_class, dict(InstanceID=fields[0]), namespace).tostring())
+            for name, field in zip(sequence, fields):
+                if not field or (columns.properties is not None and name not in columns.properties):
+                    continue
+                valuetype = statistics_types.get(name, 'string')
+                columns.set(name, columns.decode(field, valuetype), valuetype)
+            columns.fill()
+
+    return columns
+
+
+def parse_instances(columns, text, namespace=None):
+    """
+    Appends the embedded INSTANCE elements of a string to columns
+    :param columns: Columns object
+    :param text: One or more INSTANCE elements
+    :param namespace: The namespace for the instance names
+    :return:
+    """
+    check_declarations(text)
+    for instance_e in ET.fromstring('<INSTANCES>%s</INSTANCES>' % text).iter('INSTANCE'):
+        instance_id = None
+        for p in instance_e.findall('PROPERTY'):
+            if p.attrib['NAME'] == 'InstanceID' and p.find('VALUE') is not None:
+                instance_id = p.find('VALUE').text
+        # keyed like the CSV records, so rates match whichever form (or vendor subclass) the array returns
+        key = Instance(statistics_class, dict(InstanceID=instance_id), namespace).tostring()
+        columns.append_properties(key, instance_e)
+
+
+class BlockStatistics(object):
+    """
+    Retrieves the block statistics of an SMI-S array (volumes, disks, ports, ...) with one GetStatisticsCollection
+    call on its CIM_BlockStatisticsService, instead of enumerating thousands of CIM_BlockStorageStatisticalData
+    instances. The CSV records are decoded straight into columns using the manifests of the array, which tell
+    the fields of each element type.
+
+    The service and the manifests are looked up on the first collect() and kept for the next ones.
+
+    Example:
+        statistics = BlockStatistics(client)
+        engine = RateEngine(['KBytesRead', 'ReadIOs'])
+        while True:
+            rates = engine.update(statistics.collect())
+            ...
+    """
+
+    def __init__(self, client, service=None, element_types=None, manifests=None, manifest_collection=None,
+                 namespace=None):
+        """
+        Initializer
+        :param client: WBEMClient object
+        :param service: Instance of the CIM_BlockStatisticsService, found in the namespace by default
+        :param element_types: Optional list of ElementType values to collect, all by default
+        :param manifests: Dictionary of ElementType to CSV field names or a list of CIM_BlockStatisticsManifest
+            instances. By default every manifest of the namespace is loaded, pass the ones of manifest_collection
+            when the array has several collections
+        :param manifest_collection: Optional Instance of the CIM_BlockStatisticsManifestCollection to use
+        :param namespace: The namespace, defaults to the client's
+        :return:
+        """
+        self.client = client
+        self.namespace = namespace or client.default_namespace
+        self.service = service
+        self.element_types = element_types
+        self.manifest_collection = manifest_collection
+        self.manifests = None
+        if manifests is not None:
+            self.manifests = self.load_manifests(manifests)
+
+    @staticmethod
+    def load_manifests(manifests):
+        """
+        Converts manifest instances to a dictionary of ElementType to CSV field names
+        :param manifests: List of CIM_BlockStatisticsManifest instances, or a dictionary that is returned as is
+        :return: Dictionary
+        """
+        if isinstance(manifests, dict):
+            return manifests
+        return dict((m.properties['ElementType'], manifest_sequence(m)) for m in manifests
+                    if m.properties.get('ElementType') is not None)
+
+    def find_service(self):
+        """
+        Returns the CIM_BlockStatisticsService of the namespace
+        :return: Instance
+        """
+        response = self.client.EnumerateInstanceNames(self.client.Class(service_class, self.namespace))
+        if not response.instances:
+            raise CimError('No %s found in %s' % (service_class, self.namespace))
+        return response.instances[0]
+
+    def find_manifests(self):
+        """
+        Loads every CIM_BlockStatisticsManifest of the namespace
+        :return: Dictionary of ElementType to CSV field names
+        """
+        try:
+            response = self.client.EnumerateInstances(self.client.Class(manifest_class, self.namespace))
+        except CimError:
+            # no manifests, the fields are named in the order of the class
+            return dict()
+        return self.load_manifests(response.instances)
+
+    def collect(self, properties=None):
+        """
+        Calls GetStatisticsCollection and decodes the statistics
+        :param properties: Optional list of property names to keep
+        :return: Columns
+        """
+        if self.service is None:
+            self.service = self.find_service()
+        if self.manifests is None:
+            self.manifests = self.find_manifests()
+
+        params = [('StatisticsFormat', (CSV, 'uint16'))]
+        if self.element_types:
+            params.append(('ElementTypes', (list(self.element_types), 'uint16')))
+        if self.manifest_collection is not None:
+            params.append(('ManifestCollection', self.manifest_collection))
+
+        response = self.client.InvokeMethod(self.service, 'GetStatisticsCollection', params)
+        if response.return_value == job_started:
+            raise CimError('GetStatisticsCollection started a job, collections through jobs are not supported')
+        if response.return_value:
+            raise CimError('GetStatisticsCollection failed with return value %s' % response.return_value)
+
+        return parse_statistics(
+            response.params.get('Statistics') or [], self.manifests, self.service.namespace or self.namespace,
+            properties
+        )
+
+    def __repr__(self):
+        """
+        String representation of the BlockStatistics
+        :return: string
+        """
+        return '<wbem.statistics.BlockStatistics: %s on %s:%s>' % (
+            self.service or service_class, self.client.hostname, self.client.port
+        )